@@ -0,0 +1,73 @@
+"""Compare the memory of a `FleetStateTable` with plain device objects.
+
+Run with `python benchmarks/bench_fleet_memory.py [devices ...]`.
+Defaults to 10,000 and 100,000 devices, each with a decoded status.
+It exits with a non-zero status if the table is not smaller.
+"""
+
+import sys
+import tracemalloc
+import uuid
+
+from pysesame3.auth import WebAPIAuth
+from pysesame3.chsesame2 import CHSesame2
+from pysesame3.const import CHSesame2ShadowStatus, StateSource
+from pysesame3.fleetstate import FleetStateTable
+from pysesame3.helper import CHSesame2MechStatus
+
+SIZES = [10_000, 100_000]
+SECRET_KEY = "0b3e5f1665e143b59180c915fa4b06d9"
+MECHST = ["60030080f3ff0002", "5c030503e3020004", "3003000000000122"]
+
+
+def build_devices(uuids):
+    auth = WebAPIAuth(apikey="FAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKE")
+    devices = []
+    for i, device_uuid in enumerate(uuids):
+        device = CHSesame2(auth, device_uuid, SECRET_KEY, initial_sync=False)
+        device.state.update(
+            StateSource.IoT,
+            shadowStatus=CHSesame2ShadowStatus.LockedWm,
+            mechStatus=CHSesame2MechStatus.from_hex(MECHST[i % len(MECHST)]),
+        )
+        devices.append(device)
+    return devices
+
+
+def build_table(uuids):
+    table = FleetStateTable()
+    for i, device_uuid in enumerate(uuids):
+        table.add(device_uuid, SECRET_KEY)
+        table.applyMechst(device_uuid, MECHST[i % len(MECHST)])
+    return table
+
+
+def memory_per_device(factory, uuids):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    fleet = factory(uuids)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    stats = after.compare_to(before, "filename")
+    size = sum(stat.size_diff for stat in stats)
+    del fleet
+    return size / len(uuids)
+
+
+def main(argv):
+    sizes = [int(arg) for arg in argv] or SIZES
+    ok = True
+    for size in sizes:
+        uuids = [str(uuid.uuid4()) for _ in range(size)]
+        devices = memory_per_device(build_devices, uuids)
+        table = memory_per_device(build_table, uuids)
+        print("{:>10,} devices".format(size))
+        print("{:>16}: {:>12,.0f} bytes/device".format("CHSesame2", devices))
+        print("{:>16}: {:>12,.0f} bytes/device".format("FleetStateTable", table))
+        ok = ok and table < devices
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
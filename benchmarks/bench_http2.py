@@ -0,0 +1,210 @@
+"""Compare `requests` with `HTTP2Transport` against local stand-in servers.
+
+Run with `python benchmarks/bench_http2.py [requests]`.
+Needs `pip install pysesame3[http2]`. Each server answers `getMechStatus`
+after a fixed delay, like a busy cloud; the HTTP/2 one speaks cleartext
+HTTP/2 with prior knowledge, since the benchmark has no certificate.
+It exits with a non-zero status if HTTP/2 used more than one connection
+or was slower than `requests`.
+"""
+
+import asyncio
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import h2.config
+import h2.connection
+import h2.events
+import h2.settings
+
+import pysesame3.cloud
+from pysesame3.auth import WebAPIAuth
+from pysesame3.chsesame2 import CHSesame2
+from pysesame3.transport import HTTP2Transport
+
+REQUESTS = 200
+CONCURRENCY = 50
+DELAY = 0.05
+UUID = "126D3D66-9222-4E5A-BCDE-0C6629D48D43"
+SECRET_KEY = "0b3e5f1665e143b59180c915fa4b06d9"
+BODY = json.dumps(
+    {
+        "batteryPercentage": 94,
+        "batteryVoltage": 5.869794721407625,
+        "position": 11,
+        "CHSesame2Status": "locked",
+        "timestamp": 1598523693,
+    }
+).encode()
+
+
+class H2Protocol(asyncio.Protocol):
+    connections = 0
+
+    def connection_made(self, transport):
+        H2Protocol.connections += 1
+        self.transport = transport
+        self.conn = h2.connection.H2Connection(
+            config=h2.config.H2Configuration(client_side=False)
+        )
+        self.conn.local_settings = h2.settings.Settings(
+            client=False,
+            initial_values={h2.settings.SettingCodes.MAX_CONCURRENT_STREAMS: 1000},
+        )
+        self.conn.initiate_connection()
+        self.transport.write(self.conn.data_to_send())
+
+    def data_received(self, data):
+        loop = asyncio.get_running_loop()
+        for event in self.conn.receive_data(data):
+            if isinstance(event, h2.events.RequestReceived):
+                loop.call_later(DELAY, self.respond, event.stream_id)
+            elif isinstance(event, h2.events.DataReceived):
+                self.conn.acknowledge_received_data(
+                    event.flow_controlled_length, event.stream_id
+                )
+            elif isinstance(event, h2.events.ConnectionTerminated):
+                self.transport.close()
+        self.transport.write(self.conn.data_to_send())
+
+    def respond(self, stream_id):
+        if self.transport.is_closing():
+            return
+        self.conn.send_headers(
+            stream_id,
+            [
+                (":status", "200"),
+                ("content-type", "application/json"),
+                ("content-length", str(len(BODY))),
+            ],
+        )
+        self.conn.send_data(stream_id, BODY, end_stream=True)
+        self.transport.write(self.conn.data_to_send())
+
+
+class H1Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    connections = 0
+
+    def setup(self):
+        H1Handler.connections += 1
+        super().setup()
+
+    def do_GET(self):
+        time.sleep(DELAY)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, *_):
+        pass
+
+
+def start_h2_server():
+    loop = asyncio.new_event_loop()
+    server = loop.run_until_complete(loop.create_server(H2Protocol, "127.0.0.1", 0))
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return server.sockets[0].getsockname()[1]
+
+
+def start_h1_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), H1Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server.server_address[1]
+
+
+def use_server(port):
+    # `SesameCloud` builds its URLs from this constant
+    pysesame3.cloud.OFFICIALAPI_URL = "http://127.0.0.1:{}/api/sesame2".format(port)
+
+
+def run_requests(device, count):
+    cloud = device.authenticator.sesame_cloud
+    with ThreadPoolExecutor(max_workers=CONCURRENCY) as executor:
+        list(executor.map(lambda _: cloud.getMechStatus(device), range(count)))
+
+
+def run_transport(device, count, transport):
+    cloud = device.authenticator.sesame_cloud
+    cloud.setTransport(transport)
+
+    async def _run():
+        semaphore = asyncio.Semaphore(CONCURRENCY)
+
+        async def _one():
+            async with semaphore:
+                await cloud.getMechStatusAsync(device)
+
+        async with transport:
+            await asyncio.gather(*[_one() for _ in range(count)])
+
+    try:
+        asyncio.run(_run())
+    finally:
+        cloud.setTransport(None)
+
+
+def measure(run, counter, *args):
+    before = counter.connections
+    start = time.perf_counter()
+    run(*args)
+    elapsed = time.perf_counter() - start
+    return elapsed, counter.connections - before
+
+
+def main(argv):
+    count = int(argv[0]) if argv else REQUESTS
+    device = CHSesame2(
+        WebAPIAuth(apikey="FAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKE"),
+        UUID,
+        SECRET_KEY,
+        initial_sync=False,
+    )
+    h1_port = start_h1_server()
+    h2_port = start_h2_server()
+
+    use_server(h1_port)
+    baseline = measure(run_requests, H1Handler, device, count)
+    http1 = measure(
+        run_transport,
+        H1Handler,
+        device,
+        count,
+        HTTP2Transport(http2=False, max_connections=CONCURRENCY),
+    )
+    use_server(h2_port)
+    http2 = measure(
+        run_transport,
+        H2Protocol,
+        device,
+        count,
+        HTTP2Transport(prior_knowledge=True, max_connections=CONCURRENCY),
+    )
+
+    print(
+        "{:,} getMechStatus, {} in flight, {:.0f} ms server delay".format(
+            count, CONCURRENCY, DELAY * 1000
+        )
+    )
+    for name, (elapsed, connections) in [
+        ("requests", baseline),
+        ("httpx HTTP/1.1", http1),
+        ("httpx HTTP/2", http2),
+    ]:
+        print(
+            "{:>16}: {:>8.3f} s {:>10,.0f} req/s {:>6} connections".format(
+                name, elapsed, count / elapsed, connections
+            )
+        )
+    return 0 if http2[1] == 1 and http2[0] < baseline[0] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,96 @@
+"""Compare the `mechst` decoder with the implementation it replaced.
+
+Run with `python benchmarks/bench_mechstatus.py`.
+It exits with a non-zero status if the decoder got slower or bigger.
+"""
+
+import sys
+import timeit
+import tracemalloc
+
+from pysesame3.helper import CHSesame2MechStatus
+
+SAMPLES = ["60030080f3ff0002", "5c030503e3020004", "3003000000000122"]
+NUMBER = 100_000
+OBJECTS = 10_000
+
+
+class LegacyProtocolMechStatus:
+    """The decoder as of pysesame3 0.6.0, kept for comparison."""
+
+    def __init__(self, rawdata):
+        if isinstance(rawdata, str):
+            rawdata = bytes.fromhex(rawdata)
+
+        if isinstance(rawdata, bytes):
+            self._isInLockRange = rawdata[7] & 2 > 0
+            self._isInUnlockRange = rawdata[7] & 4 > 0
+            self._isBatteryCritical = rawdata[7] & 32 > 0
+        else:
+            raise TypeError("Invalid input type")
+
+
+class LegacyMechStatus(LegacyProtocolMechStatus):
+    def __init__(self, rawdata):
+        if isinstance(rawdata, str):
+            rawdata = bytes.fromhex(rawdata)
+
+        if isinstance(rawdata, bytes):
+            super().__init__(rawdata)
+
+            self._batteryVoltage = int.from_bytes(rawdata[0:2], "little") * 7.2 / 1023
+            self._target = int.from_bytes(rawdata[2:4], "little", signed=True)
+            self._position = int.from_bytes(rawdata[4:6], "little", signed=True)
+            self._retcode = rawdata[6]
+        else:
+            raise TypeError("Invalid input type")
+
+
+def throughput(factory, data):
+    seconds = min(
+        timeit.repeat(
+            lambda: [factory(d) for d in data], number=NUMBER // len(data), repeat=5
+        )
+    )
+    return NUMBER / seconds
+
+
+def memory_per_object(factory):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    objects = [factory(SAMPLES[i % len(SAMPLES)]) for i in range(OBJECTS)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    stats = after.compare_to(before, "filename")
+    size = sum(stat.size_diff for stat in stats)
+    del objects
+    return size / OBJECTS
+
+
+def main():
+    raw = [bytes.fromhex(s) for s in SAMPLES]
+    results = {
+        "legacy (hex)": throughput(LegacyMechStatus, SAMPLES),
+        "from_hex": throughput(CHSesame2MechStatus.from_hex, SAMPLES),
+        "legacy (bytes)": throughput(LegacyMechStatus, raw),
+        "from_bytes": throughput(CHSesame2MechStatus.from_bytes, raw),
+    }
+    for name, rate in results.items():
+        print("{:>16}: {:>12,.0f} decodes/s".format(name, rate))
+
+    legacy_size = memory_per_object(LegacyMechStatus)
+    size = memory_per_object(CHSesame2MechStatus.from_hex)
+    print("{:>16}: {:>12,.0f} bytes/object".format("legacy", legacy_size))
+    print("{:>16}: {:>12,.0f} bytes/object".format("slots", size))
+
+    ok = (
+        results["from_hex"] >= results["legacy (hex)"]
+        and results["from_bytes"] >= results["legacy (bytes)"]
+        and size < legacy_size
+    )
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
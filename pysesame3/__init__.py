@@ -1,4 +1,5 @@
 """Top-level package for pysesame3."""
+
 try:
     import importlib.metadata as importlib_metadata
 except ModuleNotFoundError:  # pragma: no cover
@@ -1,5 +1,5 @@
 import sys
-from typing import TYPE_CHECKING, Tuple
+from typing import TYPE_CHECKING, Tuple, Union
 
 try:
     import boto3
@@ -9,7 +9,7 @@ except ImportError:  # pragma: no cover
     pass
 import requests
 
-from .cloud import AWSIoT, SesameCloud
+from .cloud import AWSIoT, AWSIoTPool, SesameCloud
 from .const import CLIENT_ID, IOT_EP, AuthType
 from .helper import RegexHelper
 
@@ -50,6 +50,19 @@ class WebAPIAuth(requests.auth.AuthBase):
     def aws_iot(self):
         raise NotImplementedError("Not supported with WebAPI.")
 
+    def close(self) -> None:
+        """Release resources held by this authenticator.
+
+        `WebAPIAuth` holds no connection, this exists for symmetry with `CognitoAuth`.
+        """
+        pass
+
+    def __enter__(self) -> "WebAPIAuth":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
     def __call__(
         self, request: requests.models.PreparedRequest
     ) -> requests.models.PreparedRequest:
@@ -65,15 +78,20 @@ class WebAPIAuth(requests.auth.AuthBase):
 
 
 class CognitoAuth:
-    def __init__(self, apikey: str, client_id: str = CLIENT_ID):
+    def __init__(
+        self, apikey: str, client_id: str = CLIENT_ID, iot_connections: int = 1
+    ):
         """Generic Implementation for Cognito Authentication.
 
         Args:
             apikey (str): API Key
             client_id (str): Client ID (Optional)
+            iot_connections (int): The number of connections to the AWS IoT. Subscriptions are sharded by device UUID when more than 1. Defaults to `1`.
         """
         if len(apikey) != 40:
             raise ValueError("Invalid API Key - length should be 40.")
+        if iot_connections < 1:
+            raise ValueError("Invalid iot_connections - should be 1 or more.")
 
         if (
             "awsiot" not in sys.modules or "certifi" not in sys.modules
@@ -86,7 +104,11 @@ class CognitoAuth:
         self._client_id = client_id
 
         self._sesame_cloud = SesameCloud(self)
-        self._aws_iot = AWSIoT(self)
+        self._aws_iot: Union[AWSIoT, AWSIoTPool]
+        if iot_connections == 1:
+            self._aws_iot = AWSIoT(self)
+        else:
+            self._aws_iot = AWSIoTPool(self, iot_connections)
 
     @property
     def login_method(self) -> AuthType:
@@ -102,9 +124,19 @@ class CognitoAuth:
         return self._sesame_cloud
 
     @property
-    def aws_iot(self) -> AWSIoT:
+    def aws_iot(self) -> Union[AWSIoT, AWSIoTPool]:
         return self._aws_iot
 
+    def close(self) -> None:
+        """Close the connection to the AWS IoT."""
+        self._aws_iot.close()
+
+    def __enter__(self) -> "CognitoAuth":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
     @property
     def client_id(self) -> str:
         """Return a client id.
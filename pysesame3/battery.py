@@ -0,0 +1,331 @@
+import logging
+import threading
+import time
+from collections import deque
+from typing import TYPE_CHECKING, Callable, Deque, Dict, List, Optional, Tuple
+
+from .helper import (
+    BATTERY_CURVES,
+    SESAME2_BATTERY_CURVE,
+    SESAMEBOT_WEBAPI_VOLTAGE_THRESHOLD,
+    CHProductModel,
+)
+
+if TYPE_CHECKING:
+    from .device import SesameLocker
+    from .helper import CHSesameProtocolMechStatus
+
+logger = logging.getLogger(__name__)
+
+SECONDS_PER_DAY = 86400
+
+
+def critical_voltage(model: Optional[CHProductModel], voltage: float) -> float:
+    """Return the voltage at which the battery of a device is considered empty.
+
+    This is the voltage at which the battery curve of the model reaches 0%.
+
+    Args:
+        model (Optional[CHProductModel]): The product model of the device.
+        voltage (float): A voltage reported by the device.
+
+    Returns:
+        float: The critical voltage.
+    """
+    # The Web API reports SESAME bot voltages on the SESAME 3 scale,
+    # see `CHSesameBotMechStatus.getBatteryPercentage`.
+    if (
+        model == CHProductModel.SesameBot1
+        and voltage <= SESAMEBOT_WEBAPI_VOLTAGE_THRESHOLD
+    ):
+        return BATTERY_CURVES[model].voltages[0]
+    return SESAME2_BATTERY_CURVE.voltages[0]
+
+
+class BatteryHistory:
+    def __init__(
+        self,
+        maxlen: int = 288,
+        critical_voltage: float = SESAME2_BATTERY_CURVE.voltages[0],
+    ) -> None:
+        """A fixed-size ring buffer of battery samples of a device.
+
+        A least-squares line through the buffered samples is maintained with
+        running sums, so every sample costs O(1) regardless of `maxlen`.
+
+        Args:
+            maxlen (int, optional): The number of samples to keep. Defaults to `288`.
+            critical_voltage (float, optional): The voltage to forecast. Defaults to `4.6`.
+
+        Raises:
+            ValueError: If `maxlen` is less than 2.
+        """
+        if maxlen < 2:
+            raise ValueError("maxlen should be 2 or more.")
+        self._samples: Deque[Tuple[float, float]] = deque(maxlen=maxlen)
+        self._critical_voltage = critical_voltage
+        self._lock = threading.Lock()
+
+        # Timestamps are relative to the first sample to keep the sums precise.
+        self._origin: Optional[float] = None
+        self._evictions = 0
+        self._sum_x = 0.0
+        self._sum_y = 0.0
+        self._sum_xx = 0.0
+        self._sum_xy = 0.0
+
+    @property
+    def criticalVoltage(self) -> float:
+        return self._critical_voltage
+
+    @property
+    def samples(self) -> List[Tuple[float, float]]:
+        """Return the buffered samples, oldest first.
+
+        Returns:
+            List[Tuple[float, float]]: Pairs of a UNIX timestamp and a voltage.
+        """
+        with self._lock:
+            return list(self._samples)
+
+    @property
+    def latest(self) -> Optional[Tuple[float, float]]:
+        """Return the latest sample.
+
+        Returns:
+            Optional[Tuple[float, float]]: A UNIX timestamp and a voltage, `None` if empty.
+        """
+        with self._lock:
+            return self._samples[-1] if self._samples else None
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def append(self, voltage: float, timestamp: Optional[float] = None) -> None:
+        """Add a sample, evicting the oldest one when the buffer is full.
+
+        Args:
+            voltage (float): The battery voltage.
+            timestamp (Optional[float], optional): UNIX timestamp of the sample. Defaults to now.
+        """
+        if timestamp is None:
+            timestamp = time.time()
+
+        with self._lock:
+            if self._origin is None:
+                self._origin = timestamp
+            if len(self._samples) == self._samples.maxlen:
+                self._add(*self._samples[0], sign=-1.0)
+                self._evictions += 1
+            self._samples.append((timestamp, voltage))
+            self._add(timestamp, voltage, sign=1.0)
+
+            # Subtracting evicted samples accumulates rounding errors, so the
+            # sums are rebuilt once per `maxlen` evictions; O(1) amortized.
+            if self._evictions >= len(self._samples):
+                self._rebuild()
+
+    def _add(self, timestamp: float, voltage: float, sign: float) -> None:
+        x = timestamp - self._origin
+        self._sum_x += sign * x
+        self._sum_y += sign * voltage
+        self._sum_xx += sign * x * x
+        self._sum_xy += sign * x * voltage
+
+    def _rebuild(self) -> None:
+        self._origin = self._samples[0][0]
+        self._evictions = 0
+        self._sum_x = self._sum_y = self._sum_xx = self._sum_xy = 0.0
+        for timestamp, voltage in self._samples:
+            self._add(timestamp, voltage, sign=1.0)
+
+    def getSlope(self) -> Optional[float]:
+        """Return the trend of the battery voltage.
+
+        Returns:
+            Optional[float]: Volts per day, `None` if there are not enough samples.
+        """
+        with self._lock:
+            return self._slope()
+
+    def _slope(self) -> Optional[float]:
+        n = len(self._samples)
+        denominator = n * self._sum_xx - self._sum_x * self._sum_x
+        if n < 2 or denominator <= 0:
+            return None
+        slope = (n * self._sum_xy - self._sum_x * self._sum_y) / denominator
+        return slope * SECONDS_PER_DAY
+
+    def getDaysUntilCritical(self) -> Optional[float]:
+        """Forecast the number of days until the battery reaches the critical voltage.
+
+        Returns:
+            Optional[float]: Days from the latest sample, `0` if already critical,
+                `None` if the voltage is not decreasing or there are not enough samples.
+        """
+        with self._lock:
+            slope = self._slope()
+            if slope is None:
+                return None
+
+            n = len(self._samples)
+            slope_per_sec = slope / SECONDS_PER_DAY
+            intercept = (self._sum_y - slope_per_sec * self._sum_x) / n
+            latest = self._samples[-1][0] - self._origin
+            estimated = intercept + slope_per_sec * latest
+
+        if estimated <= self._critical_voltage:
+            return 0.0
+        if slope >= 0:
+            return None
+        return (self._critical_voltage - estimated) / slope
+
+
+class BatteryForecast:
+    """The battery forecast of a device.
+
+    Attributes:
+        device (SesameLocker): The device.
+        voltage (Optional[float]): The latest voltage.
+        slope (Optional[float]): The voltage trend, in volts per day.
+        daysUntilCritical (Optional[float]): The forecast, `None` if unknown.
+    """
+
+    def __init__(
+        self,
+        device: "SesameLocker",
+        voltage: Optional[float],
+        slope: Optional[float],
+        daysUntilCritical: Optional[float],
+    ) -> None:
+        self.device = device
+        self.voltage = voltage
+        self.slope = slope
+        self.daysUntilCritical = daysUntilCritical
+
+    def __str__(self) -> str:
+        return f"BatteryForecast(deviceUUID={self.device.getDeviceUUID()}, voltage={self.voltage}, slope={self.slope}, daysUntilCritical={self.daysUntilCritical})"
+
+
+class BatteryMonitor:
+    def __init__(
+        self, maxlen: int = 288, clock: Callable[[], float] = time.time
+    ) -> None:
+        """Collect battery samples of devices and forecast their depletion.
+
+        Tracked devices are sampled whenever a status is fetched with
+        `fetchMechStatus`, loaded from a shadow or reported by AWS IoT.
+
+        Args:
+            maxlen (int, optional): The number of samples kept per device. Defaults to `288`.
+            clock (Callable[[], float], optional): Returns the current UNIX timestamp. Defaults to `time.time`.
+        """
+        self._maxlen = maxlen
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._devices: Dict[str, "SesameLocker"] = {}
+        self._histories: Dict[str, BatteryHistory] = {}
+
+    def track(self, device: "SesameLocker") -> None:
+        """Start sampling the battery of a device.
+
+        The last known status of the device, if any, is recorded immediately.
+
+        Args:
+            device (SesameLocker): The device.
+        """
+        with self._lock:
+            if device.getDeviceUUID() in self._devices:
+                return
+            self._devices[device.getDeviceUUID()] = device
+        device.addStatusListener(self._on_status)
+        if device.lastMechStatus is not None:
+            self.record(device, device.lastMechStatus)
+
+    def untrack(self, device: "SesameLocker") -> None:
+        """Stop sampling the battery of a device and forget its samples.
+
+        Args:
+            device (SesameLocker): The device.
+        """
+        device.removeStatusListener(self._on_status)
+        with self._lock:
+            self._devices.pop(device.getDeviceUUID(), None)
+            self._histories.pop(device.getDeviceUUID(), None)
+
+    def _on_status(
+        self, device: "SesameLocker", status: "CHSesameProtocolMechStatus"
+    ) -> None:
+        self.record(device, status)
+
+    def record(
+        self,
+        device: "SesameLocker",
+        status: "CHSesameProtocolMechStatus",
+        timestamp: Optional[float] = None,
+    ) -> None:
+        """Add a battery sample of a device.
+
+        Args:
+            device (SesameLocker): The device.
+            status (CHSesameProtocolMechStatus): A status of the device.
+            timestamp (Optional[float], optional): UNIX timestamp of the status. Defaults to now.
+        """
+        voltage = status.getBatteryVoltage()
+        if timestamp is None:
+            timestamp = self._clock()
+
+        with self._lock:
+            history = self._histories.get(device.getDeviceUUID())
+            if history is None:
+                history = BatteryHistory(
+                    self._maxlen, critical_voltage(device.productModel, voltage)
+                )
+                self._histories[device.getDeviceUUID()] = history
+                self._devices.setdefault(device.getDeviceUUID(), device)
+        history.append(voltage, timestamp)
+
+    def getHistory(self, device: "SesameLocker") -> Optional[BatteryHistory]:
+        """Return the samples of a device.
+
+        Args:
+            device (SesameLocker): The device.
+
+        Returns:
+            Optional[BatteryHistory]: The samples, `None` if there are none yet.
+        """
+        with self._lock:
+            return self._histories.get(device.getDeviceUUID())
+
+    def report(self) -> List[BatteryForecast]:
+        """Forecast the depletion of every device with samples.
+
+        Returns:
+            List[BatteryForecast]: Forecasts, soonest depletion first.
+                Devices without a forecast come last.
+        """
+        with self._lock:
+            entries = [
+                (self._devices[uuid], history)
+                for uuid, history in self._histories.items()
+            ]
+
+        forecasts = []
+        for device, history in entries:
+            latest = history.latest
+            forecasts.append(
+                BatteryForecast(
+                    device,
+                    latest[1] if latest is not None else None,
+                    history.getSlope(),
+                    history.getDaysUntilCritical(),
+                )
+            )
+        forecasts.sort(
+            key=lambda f: (
+                f.daysUntilCritical is None,
+                f.daysUntilCritical or 0.0,
+                f.device.getDeviceUUID() or "",
+            )
+        )
+        return forecasts
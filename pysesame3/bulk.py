@@ -0,0 +1,212 @@
+import logging
+import sys
+from typing import TYPE_CHECKING, Iterable, List, Sequence, Union
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    pass
+
+from pysesame3.helper import (
+    BATTERY_CURVES,
+    SESAME2_BATTERY_CURVE,
+    SESAMEBOT_WEBAPI_VOLTAGE_THRESHOLD,
+    BatteryCurve,
+    CHProductModel,
+    CHSesame2MechStatus,
+    CHSesameBotMechStatus,
+    CHSesameProtocolMechStatus,
+)
+
+if TYPE_CHECKING:
+    try:
+        import numpy.typing as npt
+    except ImportError:  # pragma: no cover
+        pass
+
+logger = logging.getLogger(__name__)
+
+# Layout of `mechst`, see `pysesame3.helper`
+_RAW_DTYPE = [
+    ("battery", "<u2"),
+    ("target", "<i2"),
+    ("position", "<i2"),
+    ("retcode", "u1"),
+    ("flags", "u1"),
+]
+
+MECHST_DTYPE = [
+    ("batteryVoltage", "f8"),
+    ("target", "i2"),
+    ("position", "i2"),
+    ("retcode", "u1"),
+    ("isInLockRange", "?"),
+    ("isInUnlockRange", "?"),
+    ("isBatteryCritical", "?"),
+]
+
+_BATTERY_SCALE = {
+    CHProductModel.SS2: 7.2,
+    CHProductModel.SS4: 7.2,
+    CHProductModel.SesameBot1: 3.6,
+}
+
+
+def _require_numpy() -> None:
+    if "numpy" not in sys.modules:  # pragma: no cover
+        raise RuntimeError(
+            "Failed to load numpy. Did you run `pip install pysesame3[bulk]`?"
+        )
+
+
+def _battery_scale(model: CHProductModel) -> float:
+    try:
+        return _BATTERY_SCALE[model]
+    except KeyError:
+        raise NotImplementedError("This device type is not supported.")
+
+
+def decode_mechst(
+    rawdata: Sequence[Union[str, bytes]], model: CHProductModel = CHProductModel.SS2
+) -> "npt.NDArray":
+    """Decode many `mechst` at once into a NumPy structured array.
+
+    All entries are concatenated into one buffer and decoded with vectorized
+    operations, instead of building one status object per entry.
+
+    Args:
+        rawdata (Sequence[Union[str, bytes]]): Hex-encoded or binary `mechst` data, 8 bytes each.
+        model (CHProductModel, optional): The product model of the devices. Defaults to `CHProductModel.SS2`.
+
+    Raises:
+        ValueError: If an entry is not 8 bytes long.
+
+    Returns:
+        numpy.ndarray: One row per entry, with the fields of `MECHST_DTYPE`.
+    """
+    _require_numpy()
+    scale = _battery_scale(model)
+
+    if all(isinstance(entry, str) for entry in rawdata):
+        if any(len(entry) != 16 for entry in rawdata):
+            raise ValueError("Invalid mechst - length should be 8.")
+        buf = bytes.fromhex("".join(rawdata))  # type: ignore
+    else:
+        chunks = [
+            bytes.fromhex(entry) if isinstance(entry, str) else bytes(entry)
+            for entry in rawdata
+        ]
+        if any(len(chunk) != 8 for chunk in chunks):
+            raise ValueError("Invalid mechst - length should be 8.")
+        buf = b"".join(chunks)
+
+    raw = np.frombuffer(buf, dtype=_RAW_DTYPE)
+    decoded = np.empty(len(raw), dtype=MECHST_DTYPE)
+    decoded["batteryVoltage"] = raw["battery"] * scale / 1023
+    decoded["target"] = raw["target"]
+    decoded["position"] = raw["position"]
+    decoded["retcode"] = raw["retcode"]
+    decoded["isInLockRange"] = raw["flags"] & 2 > 0
+    decoded["isInUnlockRange"] = raw["flags"] & 4 > 0
+    decoded["isBatteryCritical"] = raw["flags"] & 32 > 0
+    return decoded
+
+
+def to_status(
+    row, model: CHProductModel = CHProductModel.SS2
+) -> CHSesameProtocolMechStatus:
+    """Turn a row of `decode_mechst` back into a status object.
+
+    Args:
+        row (numpy.void): A row of the array returned by `decode_mechst`.
+        model (CHProductModel, optional): The product model of the device. Defaults to `CHProductModel.SS2`.
+
+    Returns:
+        CHSesameProtocolMechStatus: `CHSesame2MechStatus` or `CHSesameBotMechStatus`, depending on `model`.
+    """
+    _battery_scale(model)
+
+    status: CHSesameProtocolMechStatus
+    if model == CHProductModel.SesameBot1:
+        status = CHSesameBotMechStatus.__new__(CHSesameBotMechStatus)
+        # The motor status is the lower byte of the position field
+        status._motorStatus = int(row["position"]) & 0xFF
+    else:
+        status = CHSesame2MechStatus.__new__(CHSesame2MechStatus)
+        status._target = int(row["target"])
+        status._position = int(row["position"])
+        status._retcode = int(row["retcode"])
+
+    status._batteryVoltage = float(row["batteryVoltage"])
+    status._isInLockRange = bool(row["isInLockRange"])
+    status._isInUnlockRange = bool(row["isInUnlockRange"])
+    status._isBatteryCritical = bool(row["isBatteryCritical"])
+    return status
+
+
+def to_statuses(
+    decoded: "npt.NDArray", model: CHProductModel = CHProductModel.SS2
+) -> List[CHSesameProtocolMechStatus]:
+    """Turn the rows of `decode_mechst` back into status objects.
+
+    Args:
+        decoded (numpy.ndarray): The array returned by `decode_mechst`.
+        model (CHProductModel, optional): The product model of the devices. Defaults to `CHProductModel.SS2`.
+
+    Returns:
+        List[CHSesameProtocolMechStatus]: One status object per row.
+    """
+    return [to_status(row, model) for row in decoded]
+
+
+def _curve_percentages(voltages: "npt.NDArray", curve: BatteryCurve) -> "npt.NDArray":
+    table_vol = np.asarray(curve.voltages, dtype="f8")
+    table_pct = np.asarray(curve.percentages, dtype="f8")
+
+    # table_vol[i - 1] < voltage <= table_vol[i], as in `BatteryCurve.getPercentage`
+    i = np.clip(
+        np.searchsorted(table_vol, voltages, side="left"), 1, len(table_vol) - 1
+    )
+    lower = table_vol[i - 1]
+    f = (voltages - lower) / (table_vol[i] - lower)
+    f3 = table_pct[i]
+    f4 = table_pct[i - 1]
+    percentages = (f4 + (f * (f3 - f4))).astype("i8")
+
+    percentages[voltages >= table_vol[-1]] = 100
+    percentages[voltages <= table_vol[0]] = 0
+    return percentages
+
+
+def battery_percentages(
+    voltages: Union[Iterable[float], "npt.NDArray"],
+    model: CHProductModel = CHProductModel.SS2,
+) -> "npt.NDArray":
+    """Compute the battery percentages of many devices at once.
+
+    The results are identical to `getBatteryPercentage` of the status classes.
+
+    Args:
+        voltages (Union[Iterable[float], numpy.ndarray]): Battery voltages.
+        model (CHProductModel, optional): The product model of the devices. Defaults to `CHProductModel.SS2`.
+
+    Returns:
+        numpy.ndarray: Battery power left as percentages, as integers.
+    """
+    _require_numpy()
+    try:
+        curve = BATTERY_CURVES[model]
+    except KeyError:
+        raise NotImplementedError("This device type is not supported.")
+
+    voltages = np.asarray(
+        voltages if isinstance(voltages, np.ndarray) else list(voltages), dtype="f8"
+    )
+    percentages = _curve_percentages(voltages, curve)
+    if model == CHProductModel.SesameBot1:
+        # See `CHSesameBotMechStatus.getBatteryPercentage`
+        webapi = voltages > SESAMEBOT_WEBAPI_VOLTAGE_THRESHOLD
+        percentages[webapi] = _curve_percentages(
+            voltages[webapi], SESAME2_BATTERY_CURVE
+        )
+    return percentages
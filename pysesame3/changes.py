@@ -0,0 +1,198 @@
+import logging
+import threading
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    FrozenSet,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+)
+
+from .const import CHSesame2ShadowStatus, StatusField
+
+if TYPE_CHECKING:
+    from .device import SesameLocker
+    from .helper import CHSesameProtocolMechStatus
+
+logger = logging.getLogger(__name__)
+
+
+def _lock_state(
+    status: "CHSesameProtocolMechStatus",
+) -> Optional[CHSesame2ShadowStatus]:
+    # Both ranges can be true while the key is rotating; that is not a change.
+    if status.isInLockRange() and not status.isInUnlockRange():
+        return CHSesame2ShadowStatus.LockedWm
+    if not status.isInLockRange() and status.isInUnlockRange():
+        return CHSesame2ShadowStatus.UnlockedWm
+    return None
+
+
+_READERS: Dict[StatusField, Callable[["CHSesameProtocolMechStatus"], Any]] = {
+    StatusField.LockState: _lock_state,
+    StatusField.Position: lambda status: status.getPosition(),
+    StatusField.Battery: lambda status: status.getBatteryPercentage(),
+    StatusField.RetCode: lambda status: status.getRetCode(),
+    StatusField.MotorStatus: lambda status: status.getMotorStatus(),
+}
+
+
+def _read(field: StatusField, status: "CHSesameProtocolMechStatus") -> Any:
+    try:
+        return _READERS[field](status)
+    except (AttributeError, NotImplementedError):
+        # The field is not reported by this device or by the Web API
+        return None
+
+
+class StatusChange:
+    """A change of a field of the mechanical status of a device.
+
+    Attributes:
+        device (SesameLocker): The device.
+        field (StatusField): The changed field.
+        old (Any): The previously reported value.
+        new (Any): The new value.
+        status (CHSesameProtocolMechStatus): The status that carried the change.
+    """
+
+    def __init__(
+        self,
+        device: "SesameLocker",
+        field: StatusField,
+        old: Any,
+        new: Any,
+        status: "CHSesameProtocolMechStatus",
+    ) -> None:
+        self.device = device
+        self.field = field
+        self.old = old
+        self.new = new
+        self.status = status
+
+    def __str__(self) -> str:
+        return f"StatusChange(deviceUUID={self.device.getDeviceUUID()}, field={self.field}, old={self.old}, new={self.new})"
+
+
+class ChangeDetector:
+    def __init__(self, position_threshold: int = 10, battery_step: int = 5) -> None:
+        """Compare status updates of devices and report the fields that changed.
+
+        The first value of each field becomes its baseline and is not reported.
+        Changes are measured against the last reported value, so a slow drift
+        is reported once it adds up to the threshold.
+
+        Args:
+            position_threshold (int, optional): The smallest position delta to report. Defaults to `10`.
+            battery_step (int, optional): The smallest battery percentage delta to report. Defaults to `5`.
+        """
+        self._thresholds = {
+            StatusField.Position: position_threshold,
+            StatusField.Battery: battery_step,
+        }
+        self._lock = threading.Lock()
+        self._baselines: Dict[str, Dict[StatusField, Any]] = {}
+        self._subscribers: List[
+            Tuple[FrozenSet[StatusField], Callable[[StatusChange], None]]
+        ] = []
+
+    def subscribe(
+        self,
+        callback: Callable[[StatusChange], None],
+        fields: Optional[Iterable[StatusField]] = None,
+    ) -> None:
+        """Register a callback for changes of some fields.
+
+        Callbacks may run on the AWS IoT event-loop thread and must not block.
+
+        Args:
+            callback (Callable[[StatusChange], None]): Called with each change.
+            fields (Optional[Iterable[StatusField]], optional): The fields to watch. Defaults to all fields.
+
+        Raises:
+            TypeError: If `callback` is not callable.
+        """
+        if not callable(callback):
+            raise TypeError("callback should be callable.")
+        watched = frozenset(StatusField if fields is None else fields)
+        with self._lock:
+            self._subscribers.append((watched, callback))
+
+    def unsubscribe(self, callback: Callable[[StatusChange], None]) -> None:
+        """Unregister a callback added by `subscribe`.
+
+        Args:
+            callback (Callable[[StatusChange], None]): The callback.
+        """
+        with self._lock:
+            self._subscribers = [s for s in self._subscribers if s[1] != callback]
+
+    def attach(self, device: "SesameLocker") -> None:
+        """Start comparing the statuses of a device.
+
+        The last known status of the device, if any, becomes the baseline.
+
+        Args:
+            device (SesameLocker): The device.
+        """
+        device.addStatusListener(self.update)
+        if device.lastMechStatus is not None:
+            self.update(device, device.lastMechStatus)
+
+    def detach(self, device: "SesameLocker") -> None:
+        """Stop comparing the statuses of a device and forget its baseline.
+
+        Args:
+            device (SesameLocker): The device.
+        """
+        device.removeStatusListener(self.update)
+        with self._lock:
+            self._baselines.pop(device.getDeviceUUID(), None)
+
+    def update(
+        self, device: "SesameLocker", status: "CHSesameProtocolMechStatus"
+    ) -> List[StatusChange]:
+        """Compare a new status with the baseline of a device and report the changes.
+
+        Args:
+            device (SesameLocker): The device.
+            status (CHSesameProtocolMechStatus): The new status.
+
+        Returns:
+            List[StatusChange]: The changes, already sent to the subscribers.
+        """
+        changes = []
+        with self._lock:
+            baseline = self._baselines.setdefault(device.getDeviceUUID(), {})
+            for field in StatusField:
+                new = _read(field, status)
+                if new is None:
+                    continue
+                old = baseline.get(field)
+                if old is None:
+                    # The first value of a field is the baseline
+                    baseline[field] = new
+                elif self._changed(field, old, new):
+                    baseline[field] = new
+                    changes.append(StatusChange(device, field, old, new, status))
+            subscribers = list(self._subscribers)
+
+        for change in changes:
+            logger.debug(str(change))
+            for fields, callback in subscribers:
+                if change.field in fields:
+                    try:
+                        callback(change)
+                    except Exception as err:
+                        logger.exception(err)
+        return changes
+
+    def _changed(self, field: StatusField, old: Any, new: Any) -> bool:
+        threshold = self._thresholds.get(field)
+        if threshold is None:
+            return old != new
+        return old != new and abs(new - old) >= threshold
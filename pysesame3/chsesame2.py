@@ -2,13 +2,9 @@ import json
 import logging
 from typing import TYPE_CHECKING, Callable, List, Optional, Union
 
-try:
-    from awscrt import mqtt
-except ImportError:  # pragma: no cover
-    pass
-
 from pysesame3.auth import CognitoAuth
-from pysesame3.const import AuthType, CHSesame2CMD, CHSesame2ShadowStatus
+from pysesame3.confirm import CommandConfirmation, send_and_confirm
+from pysesame3.const import AuthType, CHSesame2CMD, CHSesame2ShadowStatus, StateSource
 from pysesame3.device import SesameLocker
 from pysesame3.helper import CHProductModel, CHSesame2MechStatus
 
@@ -25,6 +21,7 @@ class CHSesame2(SesameLocker):
         authenticator: Union["WebAPIAuth", "CognitoAuth"],
         device_uuid: str,
         secret_key: str,
+        initial_sync: bool = True,
     ) -> None:
         """SESAME3 Device Specific Implementation.
 
@@ -32,36 +29,88 @@ class CHSesame2(SesameLocker):
             authenticator (Union[WebAPIAuth, CognitoAuth]):
             device_uuid (str): The UUID of the device
             secret_key (str): The secret key of the device
+            initial_sync (bool): Fetch the status over HTTP right away. With `False`, construction does no I/O; the status is fetched on first use, or in bulk with `SesameCloud.syncMechStatuses` or `AWSIoT.syncShadows`. Defaults to `True`.
         """
         super().__init__(authenticator)
 
         self.setDeviceUUID(device_uuid)
         self.setSecretKey(secret_key)
         self.setProductModel(CHProductModel.SS2)
-        self._callback: Optional[
-            Callable[[CHSesame2, CHSesame2MechStatus], None]
-        ] = None
+        self._callback: Optional[Callable[[CHSesame2, CHSesame2MechStatus], None]] = (
+            None
+        )
 
-        # Initial sync of `self._deviceShadowStatus`
-        self.mechStatus
-        logger.debug("Initialized={}".format(str(self)))
+        if initial_sync:
+            # Initial sync of the device state
+            status = self.fetchMechStatus()
+            logger.debug(
+                "Initialized={}, mechStatus={}".format(self.getDeviceUUID(), status)
+            )
+        else:
+            logger.debug("Initialized={}, not synced yet".format(self.getDeviceUUID()))
 
-    @property
-    def mechStatus(self) -> CHSesame2MechStatus:
-        """Return a mechanical status of a device.
+    def fetchMechStatus(self) -> CHSesame2MechStatus:
+        """Retrieve a mechanical status of a device from the cloud.
 
         Returns:
             CHSesame2MechStatus: Current mechanical status of the device.
         """
+        # A response to a request sent before a newer update must not win
+        observed = self._state.now()
         status = CHSesame2MechStatus(
             self.authenticator.sesame_cloud.getMechStatus(self)
         )
         logger.debug("UUID={}, mechStatus={}".format(self.getDeviceUUID(), str(status)))
 
         if status.isInLockRange():
-            self.setDeviceShadowStatus(CHSesame2ShadowStatus.LockedWm)
+            shadow_status = CHSesame2ShadowStatus.LockedWm
         else:
-            self.setDeviceShadowStatus(CHSesame2ShadowStatus.UnlockedWm)
+            shadow_status = CHSesame2ShadowStatus.UnlockedWm
+        if self._state.update(
+            StateSource.HTTP,
+            shadowStatus=shadow_status,
+            mechStatus=status,
+            observedAt=observed,
+        ):
+            self._notifyStatusListeners(status)
+
+        return status
+
+    @property
+    def mechStatus(self) -> CHSesame2MechStatus:
+        """Return a mechanical status of a device.
+
+        This always queries the cloud; it is the same as `fetchMechStatus`.
+
+        Returns:
+            CHSesame2MechStatus: Current mechanical status of the device.
+        """
+        return self.fetchMechStatus()
+
+    def applyShadowDocument(self, shadow: dict) -> CHSesame2MechStatus:
+        """Update the device from a shadow document retrieved from AWS IoT.
+
+        Args:
+            shadow (dict): The shadow document, as returned by `AWSIoT.getShadows`.
+
+        Returns:
+            CHSesame2MechStatus: The mechanical status reported in the shadow.
+        """
+        status = CHSesame2MechStatus.from_hex(shadow["state"]["reported"]["mechst"])
+        logger.debug(
+            "UUID={}, shadow mechst={}".format(self.getDeviceUUID(), str(status))
+        )
+
+        if status.isInLockRange():
+            shadow_status = CHSesame2ShadowStatus.LockedWm
+        else:
+            shadow_status = CHSesame2ShadowStatus.UnlockedWm
+        if self._state.update(
+            StateSource.Shadow,
+            shadowStatus=shadow_status,
+            mechStatus=status,
+        ):
+            self._notifyStatusListeners(status)
 
         return status
 
@@ -75,23 +124,32 @@ class CHSesame2(SesameLocker):
         try:
             logger.info("UUID={}, Shadow updated".format(self.getDeviceUUID()))
             shadow = json.loads(payload.decode("utf-8"))
-            status = CHSesame2MechStatus(rawdata=shadow["state"]["reported"]["mechst"])
+            status = CHSesame2MechStatus.from_hex(shadow["state"]["reported"]["mechst"])
             logger.debug(
                 "UUID={}, reported mechst={}".format(self.getDeviceUUID(), str(status))
             )
 
-            original_status = self.getDeviceShadowStatus()
-
             # It is possible that both isInLockRange and isInUnlockRange are true.
             # This probably indicates that the key is rotating.
             # We have to carefully check the status just to make sure that
             # it has been definitely toggled.
             if not status.isInLockRange() and status.isInUnlockRange():
-                self.setDeviceShadowStatus(CHSesame2ShadowStatus.UnlockedWm)
-            if status.isInLockRange() and not status.isInUnlockRange():
-                self.setDeviceShadowStatus(CHSesame2ShadowStatus.LockedWm)
+                shadow_status = CHSesame2ShadowStatus.UnlockedWm
+            elif status.isInLockRange() and not status.isInUnlockRange():
+                shadow_status = CHSesame2ShadowStatus.LockedWm
+            else:
+                shadow_status = self._state.snapshot.shadowStatus
+
+            # Never blocks nor queries the cloud on the AWS IoT thread
+            written = self._state.update(
+                StateSource.IoT, shadowStatus=shadow_status, mechStatus=status
+            )
+            if written is None:
+                return
+            previous, current = written
+            self._notifyStatusListeners(status)
 
-            if original_status != self.getDeviceShadowStatus():
+            if previous.shadowStatus != current.shadowStatus:
                 if self._callback is not None and callable(self._callback):
                     logger.debug(
                         "UUID={}, Custom callback is triggered".format(
@@ -116,47 +174,6 @@ class CHSesame2(SesameLocker):
             logger.exception(err)
             pass
 
-    def subscribeMechStatus(
-        self,
-        callback: Optional[Callable[["CHSesame2", CHSesame2MechStatus], None]] = None,
-    ) -> None:
-        """Subscribe to a topic at AWS IoT
-
-        Args:
-            callback (Callable[[CHSesame2, CHSesame2MechStatus], None], optional): The registered callback will be executed once an update is delivered. Defaults to `None`.
-
-        Raises:
-            NotImplementedError: If the authenticator is not `AuthType.SDK`.
-        """
-        if not isinstance(self.authenticator, CognitoAuth):
-            raise NotImplementedError("This feature is not suppoted by the Web API.")
-
-        logger.info("UUID={}, Subscribe to the topic...".format(self.getDeviceUUID()))
-        if callable(callback) or callback is None:
-            self._callback = callback
-        else:
-            raise TypeError("callback should be callable.")
-
-        aws_iot = self.authenticator.aws_iot
-        try:
-            aws_iot.connect()
-        except RuntimeError as e:
-            if "AWS_ERROR_MQTT_ALREADY_CONNECTED" in str(e):
-                logger.debug("The connection to AWS IoT is already open")
-                pass
-            else:
-                raise e
-
-        subscribe_future, _ = aws_iot.mqtt_connection.subscribe(
-            topic="$aws/things/sesame2/shadow/name/{}/update/accepted".format(
-                self.getDeviceUUID()
-            ),
-            qos=mqtt.QoS.AT_LEAST_ONCE,
-            callback=self._iot_shadow_callback,
-        )
-        subscribe_future.result()
-        logger.info("UUID={}, Subscription established".format(self.getDeviceUUID()))
-
     @property
     def historyEntries(self) -> List["CHSesame2History"]:
         """Return the history of all events with a device.
@@ -168,12 +185,15 @@ class CHSesame2(SesameLocker):
 
     def getDeviceShadowStatus(self) -> CHSesame2ShadowStatus:
         """Return a cached shadow status of a device.
-        In order to refresh the shadow, run `mechStatus`.
+        In order to refresh the shadow, run `fetchMechStatus`.
+        If the device has never been synced, the status is fetched first.
 
         Returns:
             CHSesame2ShadowStatus: Shadow (assumed) status of the device.
         """
-        return self._deviceShadowStatus
+        if self._state.snapshot.shadowStatus is None:
+            self.fetchMechStatus()
+        return self._state.snapshot.shadowStatus  # type: ignore
 
     def setDeviceShadowStatus(self, status: CHSesame2ShadowStatus) -> None:
         """Set a shadow status of a device.
@@ -187,60 +207,132 @@ class CHSesame2(SesameLocker):
         if not isinstance(status, CHSesame2ShadowStatus):
             raise ValueError("Invalid CHSesame2ShadowStatus")
         logger.debug("UUID={}, set={}".format(self.getDeviceUUID(), status))
-        self._deviceShadowStatus = status
+        self._state.update(StateSource.Command, shadowStatus=status)
+
+    def sendCommand(self, cmd: CHSesame2CMD, history_tag: str = "pysesame3") -> bool:
+        """Send `LOCK` or `UNLOCK` to the cloud right away, bypassing `commandQueue`.
+
+        Args:
+            cmd (CHSesame2CMD): The command.
+            history_tag (str, optional): The key tag to sent with the command. Defaults to `pysesame3`.
+
+        Raises:
+            NotImplementedError: If `cmd` is neither `LOCK` nor `UNLOCK`.
+
+        Returns:
+            bool: `True` if the cloud accepted the command, `False` if not.
+        """
+        if cmd not in (CHSesame2CMD.LOCK, CHSesame2CMD.UNLOCK):
+            return super().sendCommand(cmd, history_tag)
+        result = self.authenticator.sesame_cloud.sendCmd(self, cmd, history_tag)
+        if result and self._authenticator.login_method == AuthType.WebAPI:
+            self.setDeviceShadowStatus(
+                CHSesame2ShadowStatus.LockedWm
+                if cmd == CHSesame2CMD.LOCK
+                else CHSesame2ShadowStatus.UnlockedWm
+            )
+        return result
 
     def lock(self, history_tag: str = "pysesame3") -> bool:
         """Locking.
 
+        The command is sent through `commandQueue`, after the commands of
+        the device already in flight.
+
         Args:
             history_tag (str): The key tag to sent when locking and unlocking. Defaults to `pysesame3`.
 
         Returns:
-            bool: `True` if it is successfully locked, `False` if not.
+            bool: `True` if it is successfully locked, `False` if not or if a newer command replaced it before it was sent.
         """
         logger.info("UUID={}, Locking...".format(self.getDeviceUUID()))
-        result = self.authenticator.sesame_cloud.sendCmd(
-            self, CHSesame2CMD.LOCK, history_tag
-        )
-        if result and self._authenticator.login_method == AuthType.WebAPI:
-            self.setDeviceShadowStatus(CHSesame2ShadowStatus.LockedWm)
-        return result
+        return self._sendQueued(CHSesame2CMD.LOCK, history_tag)
 
     def unlock(self, history_tag: str = "pysesame3") -> bool:
         """Unlocking.
 
+        The command is sent through `commandQueue`, after the commands of
+        the device already in flight.
+
         Args:
             history_tag (str): The key tag to sent when locking and unlocking. Defaults to `pysesame3`.
 
         Returns:
-            bool: `True` if it is successfully unlocked, `False` if not.
+            bool: `True` if it is successfully unlocked, `False` if not or if a newer command replaced it before it was sent.
         """
         logger.info("UUID={}, Unlocking...".format(self.getDeviceUUID()))
-        result = self.authenticator.sesame_cloud.sendCmd(
-            self, CHSesame2CMD.UNLOCK, history_tag
+        return self._sendQueued(CHSesame2CMD.UNLOCK, history_tag)
+
+    def lock_and_wait(
+        self, history_tag: str = "pysesame3", timeout: float = 10.0, **kwargs
+    ) -> CommandConfirmation:
+        """Lock, then wait until the device reports that it is locked.
+
+        The device confirms through AWS IoT when it is subscribed with
+        `subscribeMechStatus`; otherwise its status is polled with backoff.
+
+        Args:
+            history_tag (str): The key tag to sent when locking and unlocking. Defaults to `pysesame3`.
+            timeout (float, optional): Seconds to wait for the confirmation. Defaults to `10.0`.
+            **kwargs: Passed to `pysesame3.confirm.send_and_confirm`.
+
+        Returns:
+            CommandConfirmation: The confirmed status and the timing breakdown.
+        """
+        return send_and_confirm(
+            self,
+            lambda: self.lock(history_tag),
+            lambda status: status.isInLockRange() and not status.isInUnlockRange(),
+            timeout,
+            **kwargs,
+        )
+
+    def unlock_and_wait(
+        self, history_tag: str = "pysesame3", timeout: float = 10.0, **kwargs
+    ) -> CommandConfirmation:
+        """Unlock, then wait until the device reports that it is unlocked.
+
+        The device confirms through AWS IoT when it is subscribed with
+        `subscribeMechStatus`; otherwise its status is polled with backoff.
+
+        Args:
+            history_tag (str): The key tag to sent when locking and unlocking. Defaults to `pysesame3`.
+            timeout (float, optional): Seconds to wait for the confirmation. Defaults to `10.0`.
+            **kwargs: Passed to `pysesame3.confirm.send_and_confirm`.
+
+        Returns:
+            CommandConfirmation: The confirmed status and the timing breakdown.
+        """
+        return send_and_confirm(
+            self,
+            lambda: self.unlock(history_tag),
+            lambda status: status.isInUnlockRange() and not status.isInLockRange(),
+            timeout,
+            **kwargs,
         )
-        if result and self._authenticator.login_method == AuthType.WebAPI:
-            self.setDeviceShadowStatus(CHSesame2ShadowStatus.UnlockedWm)
-        return result
 
     def toggle(self, history_tag: str = "pysesame3") -> bool:
         """Toggle.
 
+        The command is resolved against the commands in flight, or else the
+        latest status reported by the device; see `CommandQueue`.
+
         Args:
             history_tag (str): The key tag to sent when locking and unlocking. Defaults to `pysesame3`.
 
         Returns:
-            bool: `True` if it is successfully toggled, `False` if not.
+            bool: `True` if it is successfully toggled, `False` if not or if a newer command replaced it before it was sent.
         """
-        if self.getDeviceShadowStatus() == CHSesame2ShadowStatus.LockedWm:
-            return self.unlock(history_tag)
-        else:
-            return self.lock(history_tag)
+        logger.info("UUID={}, Toggling...".format(self.getDeviceUUID()))
+        return self._sendQueued(CHSesame2CMD.TOGGLE, history_tag)
 
     def __str__(self) -> str:
         """Return a string representation of an object.
 
+        Only the last known status is used, formatting never queries the cloud.
+
         Returns:
             str: The string representation of the object.
         """
-        return f"CHSesame2(deviceUUID={self.getDeviceUUID()}, deviceModel={self.productModel}, mechStatus={self.mechStatus})"
+        snapshot = self._state.snapshot
+        return f"CHSesame2(deviceUUID={self.getDeviceUUID()}, deviceModel={self.productModel}, mechStatus={snapshot.mechStatus}, shadowStatus={snapshot.shadowStatus})"
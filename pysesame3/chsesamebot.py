@@ -2,13 +2,8 @@ import json
 import logging
 from typing import TYPE_CHECKING, Callable, List, Optional, Union
 
-try:
-    from awscrt import mqtt
-except ImportError:  # pragma: no cover
-    pass
-
 from pysesame3.auth import CognitoAuth
-from pysesame3.const import CHSesame2CMD, CHSesame2ShadowStatus
+from pysesame3.const import CHSesame2CMD, CHSesame2ShadowStatus, StateSource
 from pysesame3.device import SesameLocker
 from pysesame3.helper import CHProductModel, CHSesameBotMechStatus
 
@@ -25,6 +20,7 @@ class CHSesameBot(SesameLocker):
         authenticator: Union["WebAPIAuth", "CognitoAuth"],
         device_uuid: str,
         secret_key: str,
+        initial_sync: bool = True,
     ) -> None:
         """SESAME bot Device Specific Implementation.
 
@@ -32,6 +28,7 @@ class CHSesameBot(SesameLocker):
             authenticator (Union[WebAPIAuth, CognitoAuth]):
             device_uuid (str): The UUID of the device
             secret_key (str): The secret key of the device
+            initial_sync (bool): Fetch the status over HTTP right away. With `False`, construction does no I/O; the status is fetched on first use, or in bulk with `SesameCloud.syncMechStatuses` or `AWSIoT.syncShadows`. Defaults to `True`.
         """
         super().__init__(authenticator)
 
@@ -42,26 +39,77 @@ class CHSesameBot(SesameLocker):
             Callable[[CHSesameBot, CHSesameBotMechStatus], None]
         ] = None
 
-        # Initial sync of `self._deviceShadowStatus`
-        self.mechStatus
-        logger.debug("Initialized={}".format(str(self)))
+        if initial_sync:
+            # Initial sync of the device state
+            status = self.fetchMechStatus()
+            logger.debug(
+                "Initialized={}, mechStatus={}".format(self.getDeviceUUID(), status)
+            )
+        else:
+            logger.debug("Initialized={}, not synced yet".format(self.getDeviceUUID()))
 
-    @property
-    def mechStatus(self) -> CHSesameBotMechStatus:
-        """Return a mechanical status of a device.
+    def fetchMechStatus(self) -> CHSesameBotMechStatus:
+        """Retrieve a mechanical status of a device from the cloud.
 
         Returns:
             CHSesameBotMechStatus: Current mechanical status of the device.
         """
+        # A response to a request sent before a newer update must not win
+        observed = self._state.now()
         status = CHSesameBotMechStatus(
             self.authenticator.sesame_cloud.getMechStatus(self)
         )
         logger.debug("UUID={}, mechStatus={}".format(self.getDeviceUUID(), str(status)))
 
         if status.isInLockRange():
-            self.setDeviceShadowStatus(CHSesame2ShadowStatus.LockedWm)
+            shadow_status = CHSesame2ShadowStatus.LockedWm
+        else:
+            shadow_status = CHSesame2ShadowStatus.UnlockedWm
+        if self._state.update(
+            StateSource.HTTP,
+            shadowStatus=shadow_status,
+            mechStatus=status,
+            observedAt=observed,
+        ):
+            self._notifyStatusListeners(status)
+
+        return status
+
+    @property
+    def mechStatus(self) -> CHSesameBotMechStatus:
+        """Return a mechanical status of a device.
+
+        This always queries the cloud; it is the same as `fetchMechStatus`.
+
+        Returns:
+            CHSesameBotMechStatus: Current mechanical status of the device.
+        """
+        return self.fetchMechStatus()
+
+    def applyShadowDocument(self, shadow: dict) -> CHSesameBotMechStatus:
+        """Update the device from a shadow document retrieved from AWS IoT.
+
+        Args:
+            shadow (dict): The shadow document, as returned by `AWSIoT.getShadows`.
+
+        Returns:
+            CHSesameBotMechStatus: The mechanical status reported in the shadow.
+        """
+        status = CHSesameBotMechStatus.from_hex(shadow["state"]["reported"]["mechst"])
+        logger.debug(
+            "UUID={}, shadow mechst={}".format(self.getDeviceUUID(), str(status))
+        )
+
+        if status.isInLockRange():
+            shadow_status = CHSesame2ShadowStatus.LockedWm
         else:
-            self.setDeviceShadowStatus(CHSesame2ShadowStatus.UnlockedWm)
+            shadow_status = CHSesame2ShadowStatus.UnlockedWm
+        if self._state.update(
+            StateSource.Shadow,
+            shadowStatus=shadow_status,
+            mechStatus=status,
+        ):
+            self._notifyStatusListeners(status)
 
         return status
 
@@ -75,25 +123,34 @@ class CHSesameBot(SesameLocker):
         try:
             logger.info("UUID={}, Shadow updated".format(self.getDeviceUUID()))
             shadow = json.loads(payload.decode("utf-8"))
-            status = CHSesameBotMechStatus(
-                rawdata=shadow["state"]["reported"]["mechst"]
+            status = CHSesameBotMechStatus.from_hex(
+                shadow["state"]["reported"]["mechst"]
             )
             logger.debug(
                 "UUID={}, reported mechst={}".format(self.getDeviceUUID(), str(status))
             )
 
-            original_status = self.getDeviceShadowStatus()
-
             # It is possible that both isInLockRange and isInUnlockRange are true.
             # This probably indicates that the key is rotating.
             # We have to carefully check the status just to make sure that
             # it has been definitely toggled.
             if not status.isInLockRange() and status.isInUnlockRange():
-                self.setDeviceShadowStatus(CHSesame2ShadowStatus.UnlockedWm)
-            if status.isInLockRange() and not status.isInUnlockRange():
-                self.setDeviceShadowStatus(CHSesame2ShadowStatus.LockedWm)
+                shadow_status = CHSesame2ShadowStatus.UnlockedWm
+            elif status.isInLockRange() and not status.isInUnlockRange():
+                shadow_status = CHSesame2ShadowStatus.LockedWm
+            else:
+                shadow_status = self._state.snapshot.shadowStatus
+
+            # Never blocks nor queries the cloud on the AWS IoT thread
+            written = self._state.update(
+                StateSource.IoT, shadowStatus=shadow_status, mechStatus=status
+            )
+            if written is None:
+                return
+            previous, current = written
+            self._notifyStatusListeners(status)
 
-            if original_status != self.getDeviceShadowStatus():
+            if previous.shadowStatus != current.shadowStatus:
                 if self._callback is not None and callable(self._callback):
                     logger.debug(
                         "UUID={}, Custom callback is triggered".format(
@@ -118,49 +175,6 @@ class CHSesameBot(SesameLocker):
             logger.exception(err)
             pass
 
-    def subscribeMechStatus(
-        self,
-        callback: Optional[
-            Callable[["CHSesameBot", CHSesameBotMechStatus], None]
-        ] = None,
-    ) -> None:
-        """Subscribe to a topic at AWS IoT
-
-        Args:
-            callback (Callable[[CHSesameBot, CHSesameBotMechStatus], None], optional): The registered callback will be executed once an update is delivered. Defaults to `None`.
-
-        Raises:
-            NotImplementedError: If the authenticator is not `AuthType.SDK`.
-        """
-        if not isinstance(self.authenticator, CognitoAuth):
-            raise NotImplementedError("This feature is not suppoted by the Web API.")
-
-        logger.info("UUID={}, Subscribe to the topic...".format(self.getDeviceUUID()))
-        if callable(callback) or callback is None:
-            self._callback = callback
-        else:
-            raise TypeError("callback should be callable.")
-
-        aws_iot = self.authenticator.aws_iot
-        try:
-            aws_iot.connect()
-        except RuntimeError as e:
-            if "AWS_ERROR_MQTT_ALREADY_CONNECTED" in str(e):
-                logger.debug("The connection to AWS IoT is already open")
-                pass
-            else:
-                raise e
-
-        subscribe_future, _ = aws_iot.mqtt_connection.subscribe(
-            topic="$aws/things/sesame2/shadow/name/{}/update/accepted".format(
-                self.getDeviceUUID()
-            ),
-            qos=mqtt.QoS.AT_LEAST_ONCE,
-            callback=self._iot_shadow_callback,
-        )
-        subscribe_future.result()
-        logger.info("UUID={}, Subscription established".format(self.getDeviceUUID()))
-
     @property
     def historyEntries(self) -> List["CHSesame2History"]:
         """Return the history of all events with a device.
@@ -172,12 +186,15 @@ class CHSesameBot(SesameLocker):
 
     def getDeviceShadowStatus(self) -> CHSesame2ShadowStatus:
         """Return a cached shadow status of a device.
-        In order to refresh the shadow, run `mechStatus`.
+        In order to refresh the shadow, run `fetchMechStatus`.
+        If the device has never been synced, the status is fetched first.
 
         Returns:
             CHSesame2ShadowStatus: Shadow (assumed) status of the device.
         """
-        return self._deviceShadowStatus
+        if self._state.snapshot.shadowStatus is None:
+            self.fetchMechStatus()
+        return self._state.snapshot.shadowStatus  # type: ignore
 
     def setDeviceShadowStatus(self, status: CHSesame2ShadowStatus) -> None:
         """Set a shadow status of a device.
@@ -191,29 +208,50 @@ class CHSesameBot(SesameLocker):
         if not isinstance(status, CHSesame2ShadowStatus):
             raise ValueError("Invalid CHSesame2ShadowStatus")
         logger.debug("UUID={}, set={}".format(self.getDeviceUUID(), status))
-        self._deviceShadowStatus = status
+        self._state.update(StateSource.Command, shadowStatus=status)
+
+    def sendCommand(self, cmd: CHSesame2CMD, history_tag: str = "pysesame3") -> bool:
+        """Send `CLICK` to the cloud right away, bypassing `commandQueue`.
+
+        Args:
+            cmd (CHSesame2CMD): The command.
+            history_tag (str, optional): The key tag to sent with the command. Defaults to `pysesame3`.
+
+        Raises:
+            NotImplementedError: If `cmd` is not `CLICK`.
+
+        Returns:
+            bool: `True` if the cloud accepted the command, `False` if not.
+        """
+        if cmd != CHSesame2CMD.CLICK:
+            return super().sendCommand(cmd, history_tag)
+        result = self.authenticator.sesame_cloud.sendCmd(self, cmd, history_tag)
+        if result:
+            self.setDeviceShadowStatus(CHSesame2ShadowStatus.LockedWm)
+        return result
 
     def click(self, history_tag: str = "pysesame3") -> bool:
         """Locking.
 
+        The command is sent through `commandQueue`, after the commands of
+        the device already in flight.
+
         Args:
             history_tag (str): The key tag to sent when locking and unlocking. Defaults to `pysesame3`.
 
         Returns:
-            bool: `True` if it is successfully locked, `False` if not.
+            bool: `True` if it is successfully locked, `False` if not or if a newer command replaced it before it was sent.
         """
         logger.info("UUID={}, Clicking...".format(self.getDeviceUUID()))
-        result = self.authenticator.sesame_cloud.sendCmd(
-            self, CHSesame2CMD.CLICK, history_tag
-        )
-        if result:
-            self.setDeviceShadowStatus(CHSesame2ShadowStatus.LockedWm)
-        return result
+        return self._sendQueued(CHSesame2CMD.CLICK, history_tag)
 
     def __str__(self) -> str:
         """Return a string representation of an object.
 
+        Only the last known status is used, formatting never queries the cloud.
+
         Returns:
             str: The string representation of the object.
         """
-        return f"CHSesameBot(deviceUUID={self.getDeviceUUID()}, deviceModel={self.productModel}, mechStatus={self.mechStatus})"
+        snapshot = self._state.snapshot
+        return f"CHSesameBot(deviceUUID={self.getDeviceUUID()}, deviceModel={self.productModel}, mechStatus={snapshot.mechStatus}, shadowStatus={snapshot.shadowStatus})"
@@ -1,9 +1,17 @@
+import asyncio
 import base64
+import bisect
+import functools
+import hashlib
+import json
 import logging
+import random
 import sys
+import threading
 import time
 import uuid
-from typing import TYPE_CHECKING, Dict, List, Optional, Union
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Set, Tuple, Union
 
 try:
     import certifi
@@ -26,10 +34,33 @@ if TYPE_CHECKING:
     from .auth import CognitoAuth, WebAPIAuth
     from .const import CHSesame2CMD
     from .device import SesameLocker
+    from .hedging import ReadHedger
+    from .polling import TokenBucket
+    from .transport import HTTP2Transport
 
 
 logger = logging.getLogger(__name__)
 
+SHADOW_TOPIC = "$aws/things/sesame2/shadow/name/{}/{}"
+
+
+def _apply_shadows(
+    devices: List["SesameLocker"], shadows: Dict[str, dict]
+) -> List["SesameLocker"]:
+    """Apply shadow documents to devices and return the devices left without one."""
+    missing = []
+    for device in devices:
+        shadow = shadows.get(str(device.getDeviceUUID()))
+        if shadow is None:
+            missing.append(device)
+            continue
+        try:
+            device.applyShadowDocument(shadow)
+        except Exception as err:
+            logger.exception(err)
+            missing.append(device)
+    return missing
+
 
 class SesameCloud:
     def __init__(self, authenticator: Union["WebAPIAuth", "CognitoAuth"]) -> None:
@@ -39,6 +70,64 @@ class SesameCloud:
             authenticator (Union[WebAPIAuth, CognitoAuth]): The authenticator
         """
         self._authenticator = authenticator
+        self._rateLimiter: Optional["TokenBucket"] = None
+        self._rateLimitTimeout: Optional[float] = None
+        self._responseListeners: List[Callable[[requests.Response], None]] = []
+        self._transport: Optional["HTTP2Transport"] = None
+        self._hedger: Optional["ReadHedger"] = None
+
+    @property
+    def transport(self) -> Optional["HTTP2Transport"]:
+        return self._transport
+
+    def setTransport(self, transport: Optional["HTTP2Transport"]) -> None:
+        """Send requests with `transport` instead of `requests`.
+
+        Args:
+            transport (Optional[HTTP2Transport]): The transport, `None` to use `requests` again.
+        """
+        self._transport = transport
+
+    @property
+    def hedger(self) -> Optional["ReadHedger"]:
+        return self._hedger
+
+    def setHedger(self, hedger: Optional["ReadHedger"]) -> None:
+        """Hedge slow `getMechStatus` and `getHistoryEntries` requests with `hedger`.
+
+        Commands are never hedged.
+
+        Args:
+            hedger (Optional[ReadHedger]): The hedger, `None` to stop hedging.
+        """
+        self._hedger = hedger
+
+    def setRateLimiter(
+        self, limiter: Optional["TokenBucket"], timeout: Optional[float] = None
+    ) -> None:
+        """Take a token from `limiter` before every request.
+
+        Args:
+            limiter (Optional[TokenBucket]): The budget of the API key, `None` to remove it.
+            timeout (Optional[float], optional): Seconds to wait for a token. Defaults to no limit.
+        """
+        self._rateLimiter = limiter
+        self._rateLimitTimeout = timeout
+
+    def addResponseListener(
+        self, listener: Callable[[requests.Response], None]
+    ) -> None:
+        """Register a listener called with every response, including errors.
+
+        Args:
+            listener (Callable[[requests.Response], None]): The listener.
+
+        Raises:
+            TypeError: If `listener` is not callable.
+        """
+        if not callable(listener):
+            raise TypeError("listener should be callable.")
+        self._responseListeners.append(listener)
 
     def requestAPI(
         self, method: str, url: str, json: Optional[dict] = None
@@ -51,19 +140,89 @@ class SesameCloud:
             json (Optional[dict], optional): JSON data for the body to attach to the request. Defaults to `None`.
 
         Raises:
-            RuntimeError: An HTTP error occurred.
+            RuntimeError: An HTTP error occurred, or no token of the rate limiter was available in time.
 
         Returns:
             requests.Response: The server's response to an HTTP request.
         """
-        try:
-            logger.debug("requestAPI method={}, url={}".format(method, url))
+        limiter = self._rateLimiter
+        if limiter is not None and not limiter.acquire(timeout=self._rateLimitTimeout):
+            raise RuntimeError("The request budget of the API key is exhausted.")
+        logger.debug("requestAPI method={}, url={}".format(method, url))
+        if self._transport is not None:
+            response = self._transport.send(self._prepareRequest(method, url, json))
+        else:
             response = requests.request(
                 method,
                 url,
                 json=json,
                 auth=self._authenticator,
             )
+        return self._handleResponse(response)
+
+    async def requestAPIAsync(
+        self, method: str, url: str, json: Optional[dict] = None
+    ) -> requests.Response:
+        """Send a request without blocking the event loop.
+
+        With a transport, concurrent requests share its connections;
+        otherwise `requestAPI` runs in the default executor.
+
+        Args:
+            method (str): HTTP method to use: `GET`, `OPTIONS`, `HEAD`, `POST`, `PUT`, `PATCH`, or `DELETE`.
+            url (str): URL to send.
+            json (Optional[dict], optional): JSON data for the body to attach to the request. Defaults to `None`.
+
+        Raises:
+            RuntimeError: An HTTP error occurred, or no token of the rate limiter was available in time.
+
+        Returns:
+            requests.Response: The server's response to an HTTP request.
+        """
+        transport = self._transport
+        if transport is None:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                None, functools.partial(self.requestAPI, method, url, json)
+            )
+
+        limiter = self._rateLimiter
+        if limiter is not None and not await limiter.acquireAsync(
+            timeout=self._rateLimitTimeout
+        ):
+            raise RuntimeError("The request budget of the API key is exhausted.")
+        logger.debug("requestAPIAsync method={}, url={}".format(method, url))
+        response = await transport.sendAsync(self._prepareRequest(method, url, json))
+        return self._handleResponse(response)
+
+    def _read(self, url: str) -> requests.Response:
+        hedger = self._hedger
+        if hedger is None:
+            return self.requestAPI("GET", url)
+        return hedger.run(functools.partial(self.requestAPI, "GET", url))
+
+    async def _readAsync(self, url: str) -> requests.Response:
+        hedger = self._hedger
+        if hedger is None:
+            return await self.requestAPIAsync("GET", url)
+        return await hedger.runAsync(
+            functools.partial(self.requestAPIAsync, "GET", url)
+        )
+
+    def _prepareRequest(
+        self, method: str, url: str, json: Optional[dict]
+    ) -> requests.PreparedRequest:
+        return requests.Request(
+            method, url, json=json, auth=self._authenticator
+        ).prepare()
+
+    def _handleResponse(self, response: requests.Response) -> requests.Response:
+        for listener in self._responseListeners:
+            try:
+                listener(response)
+            except Exception as err:
+                logger.exception(err)
+        try:
             response.raise_for_status()
         except requests.exceptions.HTTPError as e:
             logger.exception("requestAPI exeption raised")
@@ -96,10 +255,23 @@ class SesameCloud:
             Union[Dict, str]: Current mechanical status of the device. `Dict` if using WebAPIAuth, and `str` if using CognitoAuth.
         """
         url = "{}/{}".format(OFFICIALAPI_URL, device.getDeviceUUID())
-        response = self.requestAPI("GET", url)
+        response = self._read(url)
         r_json = response.json()
         return r_json
 
+    async def getMechStatusAsync(self, device: "SesameLocker") -> Union[Dict, str]:
+        """Retrive a mechanical status of a device without blocking the event loop.
+
+        Args:
+            device (SesameLocker): The device for which you want to query.
+
+        Returns:
+            Union[Dict, str]: Current mechanical status of the device. `Dict` if using WebAPIAuth, and `str` if using CognitoAuth.
+        """
+        url = "{}/{}".format(OFFICIALAPI_URL, device.getDeviceUUID())
+        response = await self._readAsync(url)
+        return response.json()
+
     def sendCmd(
         self,
         device: "SesameLocker",
@@ -121,6 +293,52 @@ class SesameCloud:
                 device.getDeviceUUID(), cmd, history_tag
             )
         )
+        url, payload = self._cmdRequest(device, cmd, history_tag)
+
+        try:
+            response = self.requestAPI("POST", url, payload)
+
+            logger.debug("sendCmd result={}".format(response.ok))
+            return response.ok
+        except RuntimeError:
+            logger.debug("sendCmd result=exception raised")
+            return False
+
+    async def sendCmdAsync(
+        self,
+        device: "SesameLocker",
+        cmd: "CHSesame2CMD",
+        history_tag: str = "pysesame3",
+    ) -> bool:
+        """Send a locking/unlocking command without blocking the event loop.
+
+        Args:
+            device (SesameLocker): The device for which you want to query.
+            cmd (CHSesame2CMD): Lock, Unlock and Toggle.
+            history_tag (CHSesame2CMD): The key tag to sent when locking and unlocking.
+
+        Returns:
+            bool: `True` if success, `False` if not.
+        """
+        logger.debug(
+            "sendCmdAsync UUID={}, cmd={}, history_tag={}".format(
+                device.getDeviceUUID(), cmd, history_tag
+            )
+        )
+        url, payload = self._cmdRequest(device, cmd, history_tag)
+
+        try:
+            response = await self.requestAPIAsync("POST", url, payload)
+
+            logger.debug("sendCmdAsync result={}".format(response.ok))
+            return response.ok
+        except RuntimeError:
+            logger.debug("sendCmdAsync result=exception raised")
+            return False
+
+    def _cmdRequest(
+        self, device: "SesameLocker", cmd: "CHSesame2CMD", history_tag: str
+    ) -> Tuple[str, dict]:
         url = "{}/{}/cmd".format(OFFICIALAPI_URL, device.getDeviceUUID())
         sign = self.getSign(device)
 
@@ -129,15 +347,38 @@ class SesameCloud:
             "history": base64.b64encode(history_tag.encode()).decode(),
             "sign": sign,
         }
+        return url, payload
 
-        try:
-            response = self.requestAPI("POST", url, payload)
+    def syncMechStatuses(
+        self, devices: List["SesameLocker"], max_workers: int = 8
+    ) -> List["SesameLocker"]:
+        """Fetch the mechanical status of many devices concurrently.
 
-            logger.debug("sendCmd result={}".format(response.ok))
-            return response.ok
-        except RuntimeError:
-            logger.debug("sendCmd result=exception raised")
-            return False
+        Args:
+            devices (List[SesameLocker]): The devices to update.
+            max_workers (int, optional): The maximum number of requests in flight. Defaults to `8`.
+
+        Returns:
+            List[SesameLocker]: The devices which could not be updated.
+        """
+
+        def _sync(device: "SesameLocker") -> bool:
+            try:
+                device.fetchMechStatus()
+                return True
+            except Exception as err:
+                logger.debug(
+                    "syncMechStatuses UUID={} failed: {}".format(
+                        device.getDeviceUUID(), err
+                    )
+                )
+                return False
+
+        if not devices:
+            return []
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(_sync, devices))
+        return [device for device, ok in zip(devices, results) if not ok]
 
     def getHistoryEntries(self, device: "SesameLocker") -> List[CHSesame2History]:
         """Retrieve the history of all events with a device.
@@ -155,19 +396,60 @@ class SesameCloud:
 
         ret = []
 
-        response = self.requestAPI("GET", url)
+        response = self._read(url)
         for entry in response.json():
             ret.append(CHSesame2History(**entry))
 
         return ret
 
 
+class ResubscribeReport:
+    """The outcome of resubscribing to topics after a session was lost.
+
+    Attributes:
+        accepted (List[str]): Topics the server accepted.
+        rejected (Dict[str, str]): Topics the server rejected, and why.
+    """
+
+    def __init__(self, accepted: List[str], rejected: Dict[str, str]) -> None:
+        self.accepted = accepted
+        self.rejected = rejected
+
+    def __str__(self) -> str:
+        return f"ResubscribeReport(accepted={len(self.accepted)}, rejected={sorted(self.rejected)})"
+
+
 class AWSIoT:
-    def __init__(self, authenticator: "CognitoAuth") -> None:
+    # The CRT event-loop group, host resolver and client bootstrap are shared
+    # by every connection in the process, so their threads do not pile up
+    # with the number of authenticators.
+    _bootstrap_lock = threading.Lock()
+    _client_bootstrap: Optional["io.ClientBootstrap"] = None
+    _event_loop_group_threads: int = 1
+
+    def __init__(
+        self,
+        authenticator: "CognitoAuth",
+        reconnect_min_timeout_secs: int = 5,
+        reconnect_max_timeout_secs: int = 60,
+        resubscribe_batch_size: int = 8,
+        resubscribe_interval_secs: float = 0.5,
+        resubscribe_jitter_secs: float = 5.0,
+    ) -> None:
         """Construct and send a request to the AWS IoT.
 
+        Many clients dropped by the same outage would otherwise reconnect and
+        resubscribe in lockstep, so the reconnect backoff of each connection is
+        jittered, and resubscription starts after a random delay and proceeds
+        in small batches.
+
         Args:
             authenticator (CognitoAuth): The authenticator
+            reconnect_min_timeout_secs (int, optional): The base of the reconnect backoff, jittered by ±50% per connection. Defaults to `5`.
+            reconnect_max_timeout_secs (int, optional): The upper bound of the reconnect backoff. Defaults to `60`.
+            resubscribe_batch_size (int, optional): The number of topics resubscribed, or shadows requested, at once. Defaults to `8`.
+            resubscribe_interval_secs (float, optional): The pause between two batches. Defaults to `0.5`.
+            resubscribe_jitter_secs (float, optional): The upper bound of the random delay before resubscribing. Defaults to `5.0`.
         """
         if (
             "awsiot" not in sys.modules or "certifi" not in sys.modules
@@ -179,6 +461,95 @@ class AWSIoT:
         self._authenticator = authenticator
         self.mqtt_connection: mqtt.Connection
 
+        self._subscriptions: Dict[str, Callable] = {}
+        self._connection_listeners: List[Callable[["AWSIoT", bool], None]] = []
+
+        self._reconnect_min_timeout_secs = reconnect_min_timeout_secs
+        self._reconnect_max_timeout_secs = reconnect_max_timeout_secs
+        self._resubscribe_batch_size = max(1, resubscribe_batch_size)
+        self._resubscribe_interval_secs = resubscribe_interval_secs
+        self._resubscribe_jitter_secs = resubscribe_jitter_secs
+        self._resubscribe_listeners: List[
+            Callable[["AWSIoT", ResubscribeReport], None]
+        ] = []
+        self._rejected_topics: Dict[str, str] = {}
+
+        # The reply subscriptions of `getShadows`, shared by the calls in flight
+        self._shadow_lock = threading.Lock()
+        self._shadow_waiters: List[Callable[[str, bytes], None]] = []
+        self._shadow_subscriptions: Optional[List["Future"]] = None
+
+    @staticmethod
+    def setEventLoopGroupThreads(num_threads: int) -> None:
+        """Set the number of threads of the process-wide CRT event-loop group.
+
+        This has to be called before the first connection is opened.
+
+        Args:
+            num_threads (int): The number of event-loop threads.
+
+        Raises:
+            ValueError: If `num_threads` is less than 1.
+            RuntimeError: If the event-loop group is already running with another size.
+        """
+        if num_threads < 1:
+            raise ValueError("Invalid num_threads - should be 1 or more.")
+        with AWSIoT._bootstrap_lock:
+            if (
+                AWSIoT._client_bootstrap is not None
+                and AWSIoT._event_loop_group_threads != num_threads
+            ):
+                raise RuntimeError("The event-loop group is already running.")
+            AWSIoT._event_loop_group_threads = num_threads
+
+    @staticmethod
+    def getClientBootstrap() -> "io.ClientBootstrap":
+        """Return the process-wide CRT client bootstrap, creating it if needed.
+
+        Returns:
+            io.ClientBootstrap: The client bootstrap shared by all connections.
+        """
+        with AWSIoT._bootstrap_lock:
+            if AWSIoT._client_bootstrap is None:
+                event_loop_group = io.EventLoopGroup(AWSIoT._event_loop_group_threads)
+                host_resolver = io.DefaultHostResolver(event_loop_group)
+                AWSIoT._client_bootstrap = io.ClientBootstrap(
+                    event_loop_group, host_resolver
+                )
+            return AWSIoT._client_bootstrap
+
+    @property
+    def subscriptions(self) -> Dict[str, Callable]:
+        """Return the topics subscribed through this connection.
+
+        Returns:
+            Dict[str, Callable]: Topic names and their message callbacks.
+        """
+        return dict(self._subscriptions)
+
+    def addConnectionListener(self, listener: Callable[["AWSIoT", bool], None]) -> None:
+        """Register a listener for connection state changes.
+
+        The listener is called on the connection's event-loop thread,
+        so it must not block.
+
+        Args:
+            listener (Callable[[AWSIoT, bool], None]): Called with this connection and `True` once it is resumed, `False` once it is interrupted.
+
+        Raises:
+            TypeError: If `listener` is not callable.
+        """
+        if not callable(listener):
+            raise TypeError("listener should be callable.")
+        self._connection_listeners.append(listener)
+
+    def _notify_connection_listeners(self, connected: bool) -> None:
+        for listener in self._connection_listeners:
+            try:
+                listener(self, connected)
+            except Exception as err:
+                logger.exception(err)
+
     def _on_connection_interrupted(
         self, connection: mqtt.Connection, error: AwsCrtError
     ) -> None:
@@ -188,7 +559,8 @@ class AWSIoT:
             connection (mqtt.Connection): Connection this callback is for.
             error (AwsCrtError): Exception which caused connection loss.
         """
-        logger.warn("AWS IoT connection interrupted. error: {}".format(error))
+        logger.warning("AWS IoT connection interrupted. error: {}".format(error))
+        self._notify_connection_listeners(False)
 
     def _on_connection_resumed(
         self,
@@ -203,54 +575,124 @@ class AWSIoT:
             return_code (mqtt.ConnectReturnCode): Connect return code received from the server.
             session_present (bool): `True` if resuming existing session. `False` if new session.
         """
-        logger.warn(
+        logger.warning(
             "AWS IoT connection resumed. return_code: {} session_present: {}".format(
                 return_code, session_present
             )
         )
 
         if return_code == mqtt.ConnectReturnCode.ACCEPTED and not session_present:
-            logger.warn(
-                "AWS IoT session did not persist. Resubscribing to existing topics..."
+            delay = random.uniform(0, self._resubscribe_jitter_secs)
+            logger.warning(
+                "AWS IoT session did not persist. Resubscribing to existing topics in {:.1f}s...".format(
+                    delay
+                )
             )
-            resubscribe_future, _ = connection.resubscribe_existing_topics()
 
-            # Cannot synchronously wait for resubscribe result because we're on the connection's event-loop thread,
-            # evaluate result with a callback instead.
-            resubscribe_future.add_done_callback(self._on_resubscribe_complete)
+            # Cannot synchronously wait for resubscribe results because we're on the connection's event-loop thread,
+            # resubscribe from a timer thread instead.
+            self._schedule_resubscribe(list(self._subscriptions), delay)
 
-    def _on_resubscribe_complete(self, resubscribe_future: "Future") -> None:
-        """Callback when resubscribing to existing topics is done.
+        if return_code == mqtt.ConnectReturnCode.ACCEPTED:
+            self._notify_connection_listeners(True)
+
+    @property
+    def rejectedTopics(self) -> Dict[str, str]:
+        """Return the topics the server rejected on the last resubscription.
+
+        Returns:
+            Dict[str, str]: Topic names and the reason of the rejection.
+        """
+        return dict(self._rejected_topics)
+
+    def addResubscribeListener(
+        self, listener: Callable[["AWSIoT", ResubscribeReport], None]
+    ) -> None:
+        """Register a listener called once a resubscription has finished.
 
         Args:
-            resubscribe_future (concurrent.futures.Future): Future which completes when resubscribing succeeds or fails.
+            listener (Callable[[AWSIoT, ResubscribeReport], None]): The listener.
 
         Raises:
-            ConnectionRefusedError: If the server rejected resubscribe to a topic.
+            TypeError: If `listener` is not callable.
         """
-        resubscribe_results = resubscribe_future.result()
-        logger.debug("AWS IoT resubscribe results: {}".format(resubscribe_results))
+        if not callable(listener):
+            raise TypeError("listener should be callable.")
+        self._resubscribe_listeners.append(listener)
 
-        for topic, qos in resubscribe_results["topics"]:
-            if qos is None:
-                raise ConnectionRefusedError(
-                    "Server rejected resubscribe to topic: {}".format(topic)
-                )
+    def retryRejectedTopics(self) -> None:
+        """Resubscribe, in batches, to the topics rejected last time."""
+        self._schedule_resubscribe(list(self._rejected_topics), 0)
 
-    def connect(self) -> None:
-        """Open the actual connection to the server."""
-        if hasattr(self, "mqtt_connection"):
-            connect_future = self.mqtt_connection.connect()
-            return connect_future.result()
+    def _schedule_resubscribe(self, topics: List[str], delay: float) -> None:
+        timer = threading.Timer(delay, self._resubscribe, args=(topics,))
+        timer.daemon = True
+        timer.start()
 
-        event_loop_group = io.EventLoopGroup(1)
-        host_resolver = io.DefaultHostResolver(event_loop_group)
-        client_bootstrap = io.ClientBootstrap(event_loop_group, host_resolver)
+    def _resubscribe(self, topics: List[str]) -> None:
+        """Resubscribe to `topics` in rate-limited batches.
 
+        This runs on a timer thread, so waiting for the server is fine.
+        """
+        accepted: List[str] = []
+        rejected: Dict[str, str] = {}
+
+        for start in range(0, len(topics), self._resubscribe_batch_size):
+            if start > 0:
+                time.sleep(self._resubscribe_interval_secs)
+
+            batch = []
+            for topic in topics[start : start + self._resubscribe_batch_size]:
+                callback = self._subscriptions.get(topic)
+                if callback is None:
+                    # Unsubscribed in the meantime
+                    continue
+                try:
+                    batch.append((topic, self._subscribe(topic, callback)))
+                except Exception as err:
+                    rejected[topic] = str(err)
+
+            for topic, subscribe_future in batch:
+                try:
+                    if subscribe_future.result().get("qos") is None:
+                        rejected[topic] = "Rejected by the server"
+                    else:
+                        accepted.append(topic)
+                except Exception as err:
+                    rejected[topic] = str(err)
+
+        self._on_resubscribe_complete(ResubscribeReport(accepted, rejected))
+
+    def _on_resubscribe_complete(self, report: ResubscribeReport) -> None:
+        """Callback when resubscribing to existing topics is done.
+
+        Rejected topics are recorded rather than raised, so that they can be
+        retried with `retryRejectedTopics`.
+
+        Args:
+            report (ResubscribeReport): Accepted and rejected topics.
+        """
+        logger.debug("AWS IoT resubscribe results: {}".format(report))
+        for topic in report.accepted:
+            self._rejected_topics.pop(topic, None)
+        for topic, reason in report.rejected.items():
+            logger.warning(
+                "Server rejected resubscribe to topic: {} ({})".format(topic, reason)
+            )
+            self._rejected_topics[topic] = reason
+
+        for listener in self._resubscribe_listeners:
+            try:
+                listener(self, report)
+            except Exception as err:
+                logger.exception(err)
+
+    def _build_connection(self) -> None:
+        """Create the MQTT connection object without opening it."""
         logger.debug("Start connecting AWS IoT....")
         self.mqtt_connection = mqtt_connection_builder.websockets_with_custom_handshake(
             endpoint=IOT_EP,
-            client_bootstrap=client_bootstrap,
+            client_bootstrap=self.getClientBootstrap(),
             websocket_handshake_transform=self._authenticator.iot_websocket_handshake_transform,
             ca_filepath=certifi.where(),
             on_connection_interrupted=self._on_connection_interrupted,
@@ -258,8 +700,606 @@ class AWSIoT:
             client_id=str(uuid.uuid4()),
             clean_session=False,
             keep_alive_secs=6,
+            reconnect_min_timeout_secs=max(
+                1, round(self._reconnect_min_timeout_secs * random.uniform(0.5, 1.5))
+            ),
+            reconnect_max_timeout_secs=self._reconnect_max_timeout_secs,
         )
 
+    def connect(self) -> None:
+        """Open the actual connection to the server."""
+        if hasattr(self, "mqtt_connection"):
+            connect_future = self.mqtt_connection.connect()
+            return connect_future.result()
+
+        self._build_connection()
+
         connect_future = self.mqtt_connection.connect()
         connect_future.result()
         logger.debug("Connection established to AWS IoT")
+
+    async def connectAsync(self) -> None:
+        """Open the actual connection to the server without blocking the event loop."""
+        if not hasattr(self, "mqtt_connection"):
+            self._build_connection()
+
+        await asyncio.wrap_future(self.mqtt_connection.connect())
+        logger.debug("Connection established to AWS IoT")
+
+    def close(self) -> None:
+        """Close the connection to the server and forget its subscriptions."""
+        if not hasattr(self, "mqtt_connection"):
+            return
+
+        logger.debug("Disconnecting AWS IoT....")
+        try:
+            self.mqtt_connection.disconnect().result()
+        except Exception as err:
+            logger.debug("AWS IoT disconnect failed: {}".format(err))
+        del self.mqtt_connection
+        self._subscriptions.clear()
+        with self._shadow_lock:
+            self._shadow_subscriptions = None
+
+    def __enter__(self) -> "AWSIoT":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    def _ensure_connected(self) -> None:
+        """Open the connection unless it is already open."""
+        try:
+            self.connect()
+        except RuntimeError as e:
+            if "AWS_ERROR_MQTT_ALREADY_CONNECTED" in str(e):
+                logger.debug("The connection to AWS IoT is already open")
+            else:
+                raise e
+
+    async def _ensure_connected_async(self) -> None:
+        """Open the connection unless it is already open."""
+        try:
+            await self.connectAsync()
+        except RuntimeError as e:
+            if "AWS_ERROR_MQTT_ALREADY_CONNECTED" in str(e):
+                logger.debug("The connection to AWS IoT is already open")
+            else:
+                raise e
+
+    def _subscribe(self, topic: str, callback: Callable) -> "Future":
+        """Subscribe to a topic without waiting for the server to acknowledge.
+
+        Args:
+            topic (str): The topic to subscribe to.
+            callback (Callable): Called with `topic` and `payload` for each message.
+
+        Returns:
+            concurrent.futures.Future: Completes when the subscription is acknowledged.
+        """
+        subscribe_future, _ = self.mqtt_connection.subscribe(
+            topic=topic,
+            qos=mqtt.QoS.AT_LEAST_ONCE,
+            callback=callback,
+        )
+        self._subscriptions[topic] = callback
+        return subscribe_future
+
+    def _unsubscribe(self, topic: str) -> "Future":
+        """Unsubscribe from a topic without waiting for the server to acknowledge.
+
+        Args:
+            topic (str): The topic to unsubscribe from.
+
+        Returns:
+            concurrent.futures.Future: Completes when the unsubscription is acknowledged.
+        """
+        self._subscriptions.pop(topic, None)
+        unsubscribe_future, _ = self.mqtt_connection.unsubscribe(topic)
+        return unsubscribe_future
+
+    def _forget(self, topic: str) -> None:
+        """Stop resubscribing to a topic without a round trip to the server.
+
+        Args:
+            topic (str): The topic to forget.
+        """
+        self._subscriptions.pop(topic, None)
+
+    def subscribe(
+        self, topic: str, callback: Callable, key: Optional[str] = None
+    ) -> None:
+        """Subscribe to a topic, opening the connection if needed.
+
+        Args:
+            topic (str): The topic to subscribe to.
+            callback (Callable): Called with `topic` and `payload` for each message.
+            key (Optional[str], optional): Unused by a single connection. `AWSIoTPool` places topics sharing a key on the same connection. Defaults to `None`.
+        """
+        self._ensure_connected()
+        self._subscribe(topic, callback).result()
+
+    async def subscribeAsync(
+        self, topic: str, callback: Callable, key: Optional[str] = None
+    ) -> None:
+        """Subscribe to a topic without blocking the event loop.
+
+        Args:
+            topic (str): The topic to subscribe to.
+            callback (Callable): Called with `topic` and `payload` for each message.
+            key (Optional[str], optional): Unused by a single connection. Defaults to `None`.
+        """
+        await self._ensure_connected_async()
+        await asyncio.wrap_future(self._subscribe(topic, callback))
+
+    def unsubscribe(self, topic: str) -> None:
+        """Unsubscribe from a topic.
+
+        Args:
+            topic (str): The topic to unsubscribe from.
+        """
+        if topic not in self._subscriptions:
+            return
+        self._unsubscribe(topic).result()
+
+    def getShadows(
+        self, device_uuids: List[str], timeout: float = 10.0
+    ) -> Dict[str, dict]:
+        """Retrieve the named shadows of many devices at once.
+
+        Wildcard subscriptions collect the replies to a `get` request
+        published for every device, instead of one HTTP request per device.
+        The requests are published in batches, paced like resubscriptions.
+        A device without a shadow is answered with a rejection, so the call
+        returns as soon as every device has answered either way. Concurrent
+        calls share the subscriptions, which are dropped when the last of
+        them returns.
+
+        Args:
+            device_uuids (List[str]): The UUIDs of the devices.
+            timeout (float, optional): Seconds to wait for the replies. Defaults to `10.0`.
+
+        Returns:
+            Dict[str, dict]: Shadow documents by UUID. Devices without a shadow, or that did not answer in time, are missing.
+        """
+        wanted = {str(u).upper() for u in device_uuids}
+        shadows: Dict[str, dict] = {}
+        missing: Set[str] = set()
+        done = threading.Event()
+        lock = threading.Lock()
+
+        def _on_reply(topic: str, payload: bytes, *_) -> None:
+            levels = topic.split("/")
+            device_uuid = levels[5].upper()
+            if device_uuid not in wanted:
+                return
+            if levels[-1] == "rejected":
+                logger.debug(
+                    "No shadow UUID={}: {!r}".format(device_uuid, payload[:200])
+                )
+                with lock:
+                    missing.add(device_uuid)
+                    if len(shadows) + len(missing) >= len(wanted):
+                        done.set()
+                return
+            try:
+                shadow = json.loads(payload.decode("utf-8"))
+            except ValueError as err:
+                logger.debug("Broken shadow UUID={}: {}".format(device_uuid, err))
+                return
+            with lock:
+                shadows[device_uuid] = shadow
+                missing.discard(device_uuid)
+                if len(shadows) + len(missing) >= len(wanted):
+                    done.set()
+
+        if not wanted:
+            return shadows
+
+        self._ensure_connected()
+        reply_topics = [
+            SHADOW_TOPIC.format("+", "get/accepted"),
+            SHADOW_TOPIC.format("+", "get/rejected"),
+        ]
+        with self._shadow_lock:
+            self._shadow_waiters.append(_on_reply)
+            if self._shadow_subscriptions is None:
+                self._shadow_subscriptions = [
+                    self._subscribe(topic, self._on_shadow_reply)
+                    for topic in reply_topics
+                ]
+            subscriptions = self._shadow_subscriptions
+        try:
+            for subscription in subscriptions:
+                subscription.result()
+            requests = sorted(wanted)
+            for start in range(0, len(requests), self._resubscribe_batch_size):
+                if start > 0:
+                    time.sleep(self._resubscribe_interval_secs)
+                for device_uuid in requests[
+                    start : start + self._resubscribe_batch_size
+                ]:
+                    self.mqtt_connection.publish(
+                        topic=SHADOW_TOPIC.format(device_uuid, "get"),
+                        payload="{}",
+                        qos=mqtt.QoS.AT_MOST_ONCE,
+                    )
+            if not done.wait(timeout):
+                logger.warning(
+                    "No shadow received for {} of {} devices".format(
+                        len(wanted) - len(shadows), len(wanted)
+                    )
+                )
+        finally:
+            with self._shadow_lock:
+                self._shadow_waiters.remove(_on_reply)
+                # Unless another call still waits, or `close` dropped them
+                if (
+                    not self._shadow_waiters
+                    and self._shadow_subscriptions is subscriptions
+                ):
+                    self._shadow_subscriptions = None
+                    for topic in reply_topics:
+                        self._unsubscribe(topic)
+
+        with lock:
+            return dict(shadows)
+
+    def _on_shadow_reply(self, topic: str, payload: bytes, *_) -> None:
+        with self._shadow_lock:
+            waiters = list(self._shadow_waiters)
+        for waiter in waiters:
+            waiter(topic, payload)
+
+    def syncShadows(
+        self, devices: List["SesameLocker"], timeout: float = 10.0
+    ) -> List["SesameLocker"]:
+        """Update the status of many devices from their shadows at once.
+
+        Args:
+            devices (List[SesameLocker]): The devices to update.
+            timeout (float, optional): Seconds to wait for the replies. Defaults to `10.0`.
+
+        Returns:
+            List[SesameLocker]: The devices which could not be updated.
+        """
+        shadows = self.getShadows([d.getDeviceUUID() for d in devices], timeout)
+        return _apply_shadows(devices, shadows)
+
+
+class AWSIoTPool:
+    def __init__(
+        self,
+        authenticator: "CognitoAuth",
+        size: int,
+        replicas: int = 64,
+        **kwargs,
+    ) -> None:
+        """Spread subscriptions across several connections to the AWS IoT.
+
+        Topics are placed on a connection by consistent hashing of their key
+        (usually the device UUID), so adding or losing a connection moves only
+        the topics that belonged to it.
+        While a connection is interrupted, its topics are subscribed on the
+        next live connection on the ring, and moved back once it resumes. A
+        moved topic stays subscribed on its old connection until the server
+        acknowledged it on the new one, so no update is missed in between.
+
+        Args:
+            authenticator (CognitoAuth): The authenticator
+            size (int): The number of connections.
+            replicas (int, optional): Virtual nodes per connection on the hash ring. Defaults to `64`.
+            **kwargs: Passed to each `AWSIoT`.
+
+        Raises:
+            ValueError: If `size` or `replicas` is less than 1.
+        """
+        if size < 1:
+            raise ValueError("Invalid size - should be 1 or more.")
+        if replicas < 1:
+            raise ValueError("Invalid replicas - should be 1 or more.")
+
+        self._authenticator = authenticator
+        self._shards = [AWSIoT(authenticator, **kwargs) for _ in range(size)]
+        self._alive = set(range(size))
+        self._connected = False
+        self._lock = threading.RLock()
+
+        # topic -> (key, callback)
+        self._subscriptions: Dict[str, Tuple[str, Callable]] = {}
+        # topic -> index of the connection the topic is currently subscribed on
+        self._placement: Dict[str, int] = {}
+        # index -> topics moved off that connection while it was down, which
+        # the server may still hold for it
+        self._stale: Dict[int, Set[str]] = {}
+
+        ring = []
+        for index in range(size):
+            for replica in range(replicas):
+                ring.append((self._hash("{}-{}".format(index, replica)), index))
+        ring.sort()
+        self._ring_hashes = [h for h, _ in ring]
+        self._ring_shards = [i for _, i in ring]
+
+        for shard in self._shards:
+            shard.addConnectionListener(self._on_shard_state_changed)
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+    @property
+    def shards(self) -> List[AWSIoT]:
+        """Return the connections in this pool.
+
+        Returns:
+            List[AWSIoT]: The connections.
+        """
+        return list(self._shards)
+
+    def _owner(self, key: str) -> int:
+        """Return the index of the live connection responsible for `key`.
+
+        Raises:
+            ConnectionError: If no connection is alive.
+        """
+        if not self._alive:
+            raise ConnectionError("No AWS IoT connection is available.")
+
+        start = bisect.bisect(self._ring_hashes, self._hash(key))
+        for offset in range(len(self._ring_shards)):
+            index = self._ring_shards[(start + offset) % len(self._ring_shards)]
+            if index in self._alive:
+                return index
+        raise ConnectionError("No AWS IoT connection is available.")  # pragma: no cover
+
+    def getShard(self, key: str) -> AWSIoT:
+        """Return the connection responsible for `key`.
+
+        Args:
+            key (str): The key, usually the device UUID.
+
+        Returns:
+            AWSIoT: The connection.
+        """
+        with self._lock:
+            return self._shards[self._owner(key)]
+
+    def connect(self) -> None:
+        """Open the actual connections to the server."""
+        for shard in self._shards:
+            shard._ensure_connected()
+        self._connected = True
+
+    async def connectAsync(self) -> None:
+        """Open the actual connections to the server without blocking the event loop."""
+        await asyncio.gather(
+            *[shard._ensure_connected_async() for shard in self._shards]
+        )
+        self._connected = True
+
+    def close(self) -> None:
+        """Close all connections to the server and forget their subscriptions."""
+        with self._lock:
+            self._subscriptions.clear()
+            self._placement.clear()
+            self._stale.clear()
+        for shard in self._shards:
+            shard.close()
+        self._connected = False
+
+    def __enter__(self) -> "AWSIoTPool":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    def subscribe(
+        self, topic: str, callback: Callable, key: Optional[str] = None
+    ) -> None:
+        """Subscribe to a topic on the connection responsible for `key`.
+
+        Args:
+            topic (str): The topic to subscribe to.
+            callback (Callable): Called with `topic` and `payload` for each message.
+            key (Optional[str], optional): Topics sharing a key share a connection. Defaults to the topic itself.
+        """
+        if not self._connected:
+            # Every connection has to be open to take over topics on failover.
+            self.connect()
+
+        self._shards[self._place(topic, callback, key)]._subscribe(
+            topic, callback
+        ).result()
+
+    async def subscribeAsync(
+        self, topic: str, callback: Callable, key: Optional[str] = None
+    ) -> None:
+        """Subscribe to a topic without blocking the event loop.
+
+        Args:
+            topic (str): The topic to subscribe to.
+            callback (Callable): Called with `topic` and `payload` for each message.
+            key (Optional[str], optional): Topics sharing a key share a connection. Defaults to the topic itself.
+        """
+        if not self._connected:
+            await self.connectAsync()
+
+        await asyncio.wrap_future(
+            self._shards[self._place(topic, callback, key)]._subscribe(topic, callback)
+        )
+
+    def getShadows(
+        self, device_uuids: List[str], timeout: float = 10.0
+    ) -> Dict[str, dict]:
+        """Retrieve the named shadows of many devices at once.
+
+        The requests are spread over the connections responsible for each device.
+
+        Args:
+            device_uuids (List[str]): The UUIDs of the devices.
+            timeout (float, optional): Seconds to wait for the replies. Defaults to `10.0`.
+
+        Returns:
+            Dict[str, dict]: Shadow documents by UUID. Devices that did not answer in time are missing.
+        """
+        if not self._connected:
+            self.connect()
+
+        groups: Dict[int, List[str]] = {}
+        with self._lock:
+            for device_uuid in device_uuids:
+                key = str(device_uuid).upper()
+                groups.setdefault(self._owner(key), []).append(key)
+
+        shadows: Dict[str, dict] = {}
+        if not groups:
+            return shadows
+        with ThreadPoolExecutor(max_workers=len(groups)) as executor:
+            for result in executor.map(
+                lambda item: self._shards[item[0]].getShadows(item[1], timeout),
+                groups.items(),
+            ):
+                shadows.update(result)
+        return shadows
+
+    def syncShadows(
+        self, devices: List["SesameLocker"], timeout: float = 10.0
+    ) -> List["SesameLocker"]:
+        """Update the status of many devices from their shadows at once.
+
+        Args:
+            devices (List[SesameLocker]): The devices to update.
+            timeout (float, optional): Seconds to wait for the replies. Defaults to `10.0`.
+
+        Returns:
+            List[SesameLocker]: The devices which could not be updated.
+        """
+        shadows = self.getShadows([d.getDeviceUUID() for d in devices], timeout)
+        return _apply_shadows(devices, shadows)
+
+    def _place(self, topic: str, callback: Callable, key: Optional[str]) -> int:
+        """Record a subscription and return the index of its connection."""
+        key = topic if key is None else key
+        with self._lock:
+            index = self._owner(key)
+            self._subscriptions[topic] = (key, callback)
+            self._placement[topic] = index
+        return index
+
+    def unsubscribe(self, topic: str) -> None:
+        """Unsubscribe from a topic.
+
+        Args:
+            topic (str): The topic to unsubscribe from.
+        """
+        with self._lock:
+            if topic not in self._subscriptions:
+                return
+            del self._subscriptions[topic]
+            index = self._placement.pop(topic)
+        self._shards[index]._unsubscribe(topic).result()
+
+    def _on_shard_state_changed(self, shard: AWSIoT, connected: bool) -> None:
+        """Rebalance topics when a connection is interrupted or resumed.
+
+        This runs on the event-loop thread of `shard`, so it never waits
+        for the server to acknowledge (un)subscriptions.
+        """
+        index = self._shards.index(shard)
+        with self._lock:
+            if connected:
+                self._alive.add(index)
+            else:
+                self._alive.discard(index)
+            if not self._alive:
+                logger.warning("AWS IoT pool has no live connection.")
+                return
+
+            if connected:
+                for topic in self._stale.pop(index, ()):
+                    entry = self._subscriptions.get(topic)
+                    if entry is None or self._owner(entry[0]) != index:
+                        # Owned elsewhere now, even if its session kept it
+                        self._unsubscribe_from(index, topic)
+
+            for topic, (key, callback) in self._subscriptions.items():
+                current = self._placement[topic]
+                owner = self._owner(key)
+                if current == owner:
+                    continue
+
+                logger.info(
+                    "AWS IoT pool moves topic={} from connection {} to {}".format(
+                        topic, current, owner
+                    )
+                )
+                # Subscribed on the new connection right away, even when it is
+                # coming back and would resubscribe after its jitter: updates
+                # keep arriving on the old one until the server acknowledges.
+                try:
+                    subscribe_future = self._shards[owner]._subscribe(topic, callback)
+                except Exception as err:
+                    logger.warning(
+                        "AWS IoT pool failed to move topic={}: {}".format(topic, err)
+                    )
+                    continue
+                subscribe_future.add_done_callback(
+                    functools.partial(self._on_moved, topic, current, owner)
+                )
+
+    def _on_moved(
+        self, topic: str, current: int, owner: int, subscribe_future: "Future"
+    ) -> None:
+        """Drop the old subscription of a topic once the new one is acknowledged."""
+        try:
+            if subscribe_future.result().get("qos") is None:
+                raise RuntimeError("Rejected by the server")
+        except Exception as err:
+            # It stays where it was, and is moved again on the next change
+            logger.warning(
+                "AWS IoT pool failed to move topic={} to connection {}: {}".format(
+                    topic, owner, err
+                )
+            )
+            return
+
+        with self._lock:
+            entry = self._subscriptions.get(topic)
+            if (
+                entry is None
+                or self._placement.get(topic) != current
+                or owner not in self._alive
+                or self._owner(entry[0]) != owner
+            ):
+                # Unsubscribed or moved elsewhere in the meantime
+                if self._placement.get(topic) != owner and owner in self._alive:
+                    self._unsubscribe_from(owner, topic)
+                return
+            self._placement[topic] = owner
+            if current in self._alive:
+                self._unsubscribe_from(current, topic)
+            else:
+                # Not resubscribed when it comes back, and unsubscribed then
+                self._shards[current]._forget(topic)
+                self._stale.setdefault(current, set()).add(topic)
+
+    def _unsubscribe_from(self, index: int, topic: str) -> None:
+        """Unsubscribe from a topic on a connection, logging failures."""
+
+        def _on_done(unsubscribe_future: "Future") -> None:
+            if unsubscribe_future.exception() is not None:
+                logger.warning(
+                    "AWS IoT pool failed to unsubscribe topic={} on connection {}: {}".format(
+                        topic, index, unsubscribe_future.exception()
+                    )
+                )
+
+        try:
+            self._shards[index]._unsubscribe(topic).add_done_callback(_on_done)
+        except Exception as err:
+            logger.warning(
+                "AWS IoT pool failed to unsubscribe topic={} on connection {}: {}".format(
+                    topic, index, err
+                )
+            )
@@ -0,0 +1,165 @@
+import logging
+import threading
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+from .const import CHSesame2CMD, CHSesame2ShadowStatus
+
+if TYPE_CHECKING:
+    from .device import SesameLocker
+    from .helper import CHSesameProtocolMechStatus
+
+logger = logging.getLogger(__name__)
+
+# Queues of all devices are drained by a shared pool, so the number of
+# threads does not grow with the number of devices.
+_executor_lock = threading.Lock()
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _shared_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=16, thread_name_prefix="pysesame3-commands"
+            )
+        return _executor
+
+
+class CommandQueue:
+    def __init__(
+        self, device: "SesameLocker", executor: Optional[Executor] = None
+    ) -> None:
+        """Send the commands of a device one at a time.
+
+        While a command is in flight, at most one command waits behind it.
+        A newer command replaces the waiting one, whose futures are cancelled,
+        so a lock that was already overridden by an unlock never reaches the
+        cloud. Identical waiting commands are merged and share their result.
+
+        Args:
+            device (SesameLocker): The device.
+            executor (Optional[Executor], optional): Runs the commands. Defaults to a pool shared by all devices.
+        """
+        self._device = device
+        self._executor = executor
+        self._lock = threading.Lock()
+        self._draining = False
+        self._inflight: Optional[CHSesame2CMD] = None
+        self._pending: Optional[Tuple[CHSesame2CMD, str, List[Future]]] = None
+        self._lastSent: Optional[
+            Tuple[CHSesame2CMD, Optional["CHSesameProtocolMechStatus"]]
+        ] = None
+        self.sent = 0
+        self.collapsed = 0
+
+    @property
+    def busy(self) -> bool:
+        """Return whether a command is in flight or waiting.
+
+        Returns:
+            bool: `True` if the queue is not empty.
+        """
+        with self._lock:
+            return self._draining
+
+    def submit(
+        self, cmd: CHSesame2CMD, history_tag: str = "pysesame3"
+    ) -> "Future[bool]":
+        """Queue a command.
+
+        `TOGGLE` is resolved when it is queued: against the command waiting
+        or in flight if any, otherwise against the latest status reported by
+        the device.
+
+        Args:
+            cmd (CHSesame2CMD): The command.
+            history_tag (str, optional): The key tag to sent with the command. Defaults to `pysesame3`.
+
+        Returns:
+            Future[bool]: `True` if the cloud accepted the command. It is
+                cancelled if a newer command replaces it before it is sent.
+        """
+        future: "Future[bool]" = Future()
+        status = shadow_status = None
+        if cmd == CHSesame2CMD.TOGGLE:
+            # Read outside the lock, since the shadow status may need a fetch
+            status = self._device.lastMechStatus
+            if not self._isDecisive(status):
+                shadow_status = self._device.getDeviceShadowStatus()
+
+        with self._lock:
+            if cmd == CHSesame2CMD.TOGGLE:
+                # Resolved and queued at once, so that concurrent toggles alternate
+                cmd = self._resolveToggleLocked(status, shadow_status)
+            if self._pending is not None:
+                pending_cmd, pending_tag, futures = self._pending
+                if pending_cmd == cmd and pending_tag == history_tag:
+                    futures.append(future)
+                    self.collapsed += 1
+                    return future
+                for superseded in futures:
+                    superseded.cancel()
+                self.collapsed += len(futures)
+                logger.debug(
+                    "UUID={}, {} superseded by {}".format(
+                        self._device.getDeviceUUID(), pending_cmd, cmd
+                    )
+                )
+            self._pending = (cmd, history_tag, [future])
+            if not self._draining:
+                self._draining = True
+                (self._executor or _shared_executor()).submit(self._drain)
+        return future
+
+    @staticmethod
+    def _isDecisive(status: Optional["CHSesameProtocolMechStatus"]) -> bool:
+        return status is not None and status.isInLockRange() != status.isInUnlockRange()
+
+    def _resolveToggleLocked(
+        self,
+        status: Optional["CHSesameProtocolMechStatus"],
+        shadow_status: Optional[CHSesame2ShadowStatus],
+    ) -> CHSesame2CMD:
+        intent = self._pending[0] if self._pending is not None else self._inflight
+        last_sent = self._lastSent
+        if intent is None and last_sent is not None and last_sent[1] is status:
+            # The device has not reported anything since the last command
+            intent = last_sent[0]
+        if intent is not None:
+            locked = intent == CHSesame2CMD.LOCK
+        elif status is not None and self._isDecisive(status):
+            locked = status.isInLockRange()
+        else:
+            locked = shadow_status == CHSesame2ShadowStatus.LockedWm
+        return CHSesame2CMD.UNLOCK if locked else CHSesame2CMD.LOCK
+
+    def _drain(self) -> None:
+        while True:
+            with self._lock:
+                if self._pending is None:
+                    self._inflight = None
+                    self._draining = False
+                    return
+                cmd, history_tag, futures = self._pending
+                self._pending = None
+                self._inflight = cmd
+
+            futures = [f for f in futures if f.set_running_or_notify_cancel()]
+            if not futures:
+                continue
+            status = self._device.lastMechStatus
+            try:
+                result = self._device.sendCommand(cmd, history_tag)
+            except Exception as err:
+                for future in futures:
+                    future.set_exception(err)
+                continue
+
+            with self._lock:
+                self.sent += 1
+                if result:
+                    self._lastSent = (cmd, status)
+            for future in futures:
+                future.set_result(result)
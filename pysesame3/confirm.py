@@ -0,0 +1,172 @@
+import logging
+import threading
+import time
+from typing import TYPE_CHECKING, Callable, Optional
+
+if TYPE_CHECKING:
+    from .device import SesameLocker
+    from .helper import CHSesameProtocolMechStatus
+
+logger = logging.getLogger(__name__)
+
+
+class CommandConfirmation:
+    """The result of a command whose effect was awaited.
+
+    The latencies split the time between sending the command and observing
+    its effect: the cloud accepting the request, the lock moving until a
+    status showing it was produced (a shadow update, or the start of the
+    poll that saw it), and that status reaching the caller.
+
+    Attributes:
+        accepted (bool): `True` if the cloud accepted the command.
+        confirmed (bool): `True` if the device reported the expected status in time.
+        status (Optional[CHSesameProtocolMechStatus]): The confirming status, or the last one seen.
+        acceptLatency (float): Seconds until the cloud accepted the command.
+        actuationLatency (Optional[float]): Seconds from the acceptance until the confirming status was produced.
+        confirmLatency (Optional[float]): Seconds from then until the status was received.
+        polls (int): The number of statuses fetched over HTTP.
+    """
+
+    def __init__(
+        self,
+        accepted: bool,
+        confirmed: bool,
+        status: Optional["CHSesameProtocolMechStatus"],
+        acceptLatency: float,
+        actuationLatency: Optional[float] = None,
+        confirmLatency: Optional[float] = None,
+        polls: int = 0,
+    ) -> None:
+        self.accepted = accepted
+        self.confirmed = confirmed
+        self.status = status
+        self.acceptLatency = acceptLatency
+        self.actuationLatency = actuationLatency
+        self.confirmLatency = confirmLatency
+        self.polls = polls
+
+    @property
+    def totalLatency(self) -> Optional[float]:
+        """Return seconds from sending the command to receiving the confirmation.
+
+        Returns:
+            Optional[float]: The sum of all latencies, `None` if not confirmed.
+        """
+        if not self.confirmed:
+            return None
+        return self.acceptLatency + self.actuationLatency + self.confirmLatency  # type: ignore
+
+    def __bool__(self) -> bool:
+        return self.confirmed
+
+    def __str__(self) -> str:
+        return f"CommandConfirmation(accepted={self.accepted}, confirmed={self.confirmed}, acceptLatency={self.acceptLatency}, actuationLatency={self.actuationLatency}, confirmLatency={self.confirmLatency}, polls={self.polls})"
+
+
+def send_and_confirm(
+    device: "SesameLocker",
+    send: Callable[[], bool],
+    expected: Callable[["CHSesameProtocolMechStatus"], bool],
+    timeout: float = 10.0,
+    push_grace: float = 3.0,
+    poll_interval: float = 1.0,
+    max_poll_interval: float = 4.0,
+    backoff: float = 1.5,
+    clock: Callable[[], float] = time.monotonic,
+) -> CommandConfirmation:
+    """Send a command and wait until the device reports its effect.
+
+    A subscribed device is expected to report through AWS IoT; polling only
+    starts after `push_grace` seconds without a matching update.
+    Otherwise the status is polled, first after the `actuationLatency` of
+    the device (or `poll_interval`), then backing off up to `max_poll_interval`.
+
+    The confirmation is recorded with `recordActuation` when its time was
+    observed: the arrival of a pushed status, or a poll of a device that is
+    not subscribed. A subscribed device is only polled after waiting for a
+    push, so such a poll only shows the lock had moved by then and would
+    drag the estimate up to `push_grace`.
+
+    Args:
+        device (SesameLocker): The device.
+        send (Callable[[], bool]): Sends the command, returns `True` if the cloud accepted it.
+        expected (Callable[[CHSesameProtocolMechStatus], bool]): Whether a status confirms the command.
+        timeout (float, optional): Seconds to wait after sending. Defaults to `10.0`.
+        push_grace (float, optional): Seconds to wait for AWS IoT before polling. Defaults to `3.0`.
+        poll_interval (float, optional): The first poll delay without history. Defaults to `1.0`.
+        max_poll_interval (float, optional): The longest poll delay. Defaults to `4.0`.
+        backoff (float, optional): The growth factor of poll delays. Defaults to `1.5`.
+        clock (Callable[[], float], optional): Measures latencies. Defaults to `time.monotonic`.
+
+    Returns:
+        CommandConfirmation: The result and its timing breakdown.
+    """
+    confirmed = threading.Event()
+    waiter = threading.get_ident()
+    state = {"status": None, "observed": None, "poll_started": None, "pushed": False}
+
+    def _listener(_, status: "CHSesameProtocolMechStatus") -> None:
+        if confirmed.is_set():
+            return
+        state["status"] = status
+        if not expected(status):
+            return
+        if threading.get_ident() == waiter and state["poll_started"] is not None:
+            # Fetched by our own poll: the lock had moved before the request
+            state["observed"] = state["poll_started"]
+        else:
+            state["observed"] = clock()
+            state["pushed"] = True
+        confirmed.set()
+
+    # Listen before sending, so that a fast update is not missed
+    device.addStatusListener(_listener)
+    try:
+        started = clock()
+        accepted = send()
+        accepted_at = clock()
+        if not accepted:
+            return CommandConfirmation(False, False, None, accepted_at - started)
+
+        estimate = device.actuationLatency or poll_interval
+        subscribed = device.isSubscribed
+        delay = max(push_grace, estimate) if subscribed else estimate
+        deadline = accepted_at + timeout
+        polls = 0
+        while not confirmed.is_set():
+            remaining = deadline - clock()
+            if remaining <= 0 or confirmed.wait(min(delay, remaining)):
+                break
+            state["poll_started"] = clock()
+            polls += 1
+            try:
+                device.fetchMechStatus()
+            except Exception as err:
+                logger.debug(
+                    "UUID={}, poll failed: {}".format(device.getDeviceUUID(), err)
+                )
+            state["poll_started"] = None
+            delay = min(delay * backoff, max_poll_interval)
+
+        if not confirmed.is_set():
+            logger.debug("UUID={}, not confirmed".format(device.getDeviceUUID()))
+            return CommandConfirmation(
+                True, False, state["status"], accepted_at - started, polls=polls
+            )
+        received_at = clock()
+    finally:
+        device.removeStatusListener(_listener)
+
+    actuation = max(state["observed"] - accepted_at, 0.0)
+    if state["pushed"] or not subscribed:
+        device.recordActuation(actuation)
+    return CommandConfirmation(
+        True,
+        True,
+        state["status"],
+        accepted_at - started,
+        actuation,
+        received_at - state["observed"],
+        polls,
+    )
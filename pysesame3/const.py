@@ -21,3 +21,23 @@ class CHSesame2ShadowStatus(Enum):
     LockedWm = auto()
     UnlockedWm = auto()
     MovedWm = auto()
+
+
+class StatusField(Enum):
+    LockState = auto()
+    Position = auto()
+    Battery = auto()
+    RetCode = auto()
+    MotorStatus = auto()
+
+
+class StateSource(Enum):
+    HTTP = auto()
+    Shadow = auto()
+    IoT = auto()
+    Command = auto()
+
+
+class UpdateChannel(Enum):
+    Push = auto()
+    Poll = auto()
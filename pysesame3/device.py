@@ -1,15 +1,24 @@
+import asyncio
 import logging
 import uuid
-from typing import TYPE_CHECKING, Optional, Union
+from concurrent.futures import CancelledError
+from typing import TYPE_CHECKING, AsyncIterator, Callable, List, Optional, Union
 
-from pysesame3.helper import CHSesame2MechStatus
+from pysesame3.commands import CommandQueue
+from pysesame3.const import AuthType, CHSesame2CMD
+from pysesame3.state import DeviceSnapshot, DeviceState
 
 if TYPE_CHECKING:
+    from concurrent.futures import Future
+
     from pysesame3.auth import CognitoAuth, WebAPIAuth
-    from pysesame3.helper import CHProductModel
+    from pysesame3.helper import CHProductModel, CHSesameProtocolMechStatus
 
 logger = logging.getLogger(__name__)
 
+# Weight of the latest actuation in `SesameLocker.actuationLatency`
+ACTUATION_SMOOTHING = 0.3
+
 
 class CHDevices:
     def __init__(self, authenticator: Union["WebAPIAuth", "CognitoAuth"]):
@@ -86,9 +95,14 @@ class SesameLocker(CHDevices):
             authenticator (Union[WebAPIAuth, CognitoAuth]): The authenticator for the device
         """
         super().__init__(authenticator)
-        self._mechStatus: Optional[CHSesame2MechStatus] = None
+        self._state = DeviceState()
         self._secretKey: Optional[bytes] = None
         self._sesame2PublicKey: Optional[bytes] = None
+        self._subscribedTopics: List[str] = []
+        self._callback: Optional[Callable] = None
+        self._statusListeners: List[Callable] = []
+        self._actuationLatency: Optional[float] = None
+        self._commandQueue = CommandQueue(self)
 
     def getDeviceUUID(self) -> Optional[str]:
         """Get a device UUID of a specific device.
@@ -132,6 +146,301 @@ class SesameLocker(CHDevices):
         logger.debug("setSecretKey=*******")
         self._secretKey = key
 
+    def addStatusListener(
+        self,
+        listener: Callable[["SesameLocker", "CHSesameProtocolMechStatus"], None],
+    ) -> None:
+        """Register a listener called with every status of the device.
+
+        Listeners are called for statuses reported by AWS IoT, fetched by
+        `fetchMechStatus` and loaded by `applyShadowDocument`.
+        Unlike the callback of `subscribeMechStatus`, they are called for
+        every update, not only when the shadow status changes.
+        They may run on the AWS IoT event-loop thread and must not block.
+
+        Args:
+            listener (Callable[[SesameLocker, CHSesameProtocolMechStatus], None]): The listener.
+
+        Raises:
+            TypeError: If `listener` is not callable.
+        """
+        if not callable(listener):
+            raise TypeError("listener should be callable.")
+        self._statusListeners.append(listener)
+
+    def removeStatusListener(
+        self,
+        listener: Callable[["SesameLocker", "CHSesameProtocolMechStatus"], None],
+    ) -> None:
+        """Unregister a listener added by `addStatusListener`.
+
+        Args:
+            listener (Callable[[SesameLocker, CHSesameProtocolMechStatus], None]): The listener.
+        """
+        if listener in self._statusListeners:
+            self._statusListeners.remove(listener)
+
+    def _notifyStatusListeners(self, status: "CHSesameProtocolMechStatus") -> None:
+        for listener in list(self._statusListeners):
+            try:
+                listener(self, status)
+            except Exception as err:
+                logger.exception(err)
+
+    @property
+    def state(self) -> DeviceState:
+        return self._state
+
+    @property
+    def snapshot(self) -> DeviceSnapshot:
+        """Return the latest state of a device without any I/O or locking.
+
+        Returns:
+            DeviceSnapshot: An immutable snapshot of the state.
+        """
+        return self._state.snapshot
+
+    @property
+    def commandQueue(self) -> CommandQueue:
+        return self._commandQueue
+
+    def enqueue(
+        self, cmd: CHSesame2CMD, history_tag: str = "pysesame3"
+    ) -> "Future[bool]":
+        """Queue a command, to be sent after the commands already in flight.
+
+        Commands queued by several callers are sent one at a time; a command
+        still waiting is dropped when a newer one arrives, and `TOGGLE` is
+        resolved against the latest intent. See `CommandQueue`.
+
+        Args:
+            cmd (CHSesame2CMD): The command.
+            history_tag (str, optional): The key tag to sent with the command. Defaults to `pysesame3`.
+
+        Returns:
+            Future[bool]: `True` if the cloud accepted the command, cancelled if it was superseded.
+        """
+        return self._commandQueue.submit(cmd, history_tag)
+
+    def sendCommand(self, cmd: CHSesame2CMD, history_tag: str = "pysesame3") -> bool:
+        """Send a command to the cloud right away, bypassing `commandQueue`.
+
+        The command methods such as `lock` and `enqueue` go through the
+        queue, which sends with this method.
+
+        Args:
+            cmd (CHSesame2CMD): The command.
+            history_tag (str, optional): The key tag to sent with the command. Defaults to `pysesame3`.
+
+        Raises:
+            NotImplementedError: If the device does not support `cmd`.
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not support {cmd}.")
+
+    def _sendQueued(self, cmd: CHSesame2CMD, history_tag: str) -> bool:
+        try:
+            return self._commandQueue.submit(cmd, history_tag).result()
+        except CancelledError:
+            # A newer command replaced it before it was sent
+            return False
+
+    @property
+    def actuationLatency(self) -> Optional[float]:
+        """Return the usual time the device takes to carry out a command.
+
+        Returns:
+            Optional[float]: A moving average of `recordActuation`, `None` before the first one.
+        """
+        return self._actuationLatency
+
+    def recordActuation(self, latency: float) -> None:
+        """Add an observed actuation to `actuationLatency`.
+
+        Args:
+            latency (float): Seconds from the cloud accepting a command until a status showing its effect was produced.
+        """
+        if self._actuationLatency is None:
+            self._actuationLatency = latency
+        else:
+            self._actuationLatency += ACTUATION_SMOOTHING * (
+                latency - self._actuationLatency
+            )
+
+    def fetchMechStatus(self) -> "CHSesameProtocolMechStatus":
+        """Retrieve a mechanical status of a device from the cloud.
+
+        Raises:
+            NotImplementedError: If the device does not report its status.
+        """
+        raise NotImplementedError("This device does not report its status.")
+
+    @property
+    def mechStatus(self) -> "CHSesameProtocolMechStatus":
+        """Return a mechanical status of a device.
+
+        This always queries the cloud; it is the same as `fetchMechStatus`.
+
+        Returns:
+            CHSesameProtocolMechStatus: Current mechanical status of the device.
+        """
+        return self.fetchMechStatus()
+
+    @property
+    def lastMechStatus(self) -> Optional["CHSesameProtocolMechStatus"]:
+        """Return the last known mechanical status of a device without any I/O.
+
+        Returns:
+            Optional[CHSesameProtocolMechStatus]: The last fetched or reported status, `None` if unknown yet.
+        """
+        return self._state.snapshot.mechStatus
+
+    def applyShadowDocument(self, shadow: dict) -> "CHSesameProtocolMechStatus":
+        """Update the device from a shadow document retrieved from AWS IoT.
+
+        Raises:
+            NotImplementedError: If the device does not support shadows.
+        """
+        raise NotImplementedError("This device does not support shadows.")
+
+    def subscribeMechStatus(
+        self,
+        callback: Optional[
+            Callable[["SesameLocker", "CHSesameProtocolMechStatus"], None]
+        ] = None,
+    ) -> None:
+        """Subscribe to a topic at AWS IoT
+
+        Args:
+            callback (Callable[[SesameLocker, CHSesameProtocolMechStatus], None], optional): The registered callback will be executed once an update is delivered. Defaults to `None`.
+
+        Raises:
+            NotImplementedError: If the authenticator is not `AuthType.SDK`.
+        """
+        topic = self._prepareSubscription(callback)
+        self.authenticator.aws_iot.subscribe(
+            topic=topic,
+            callback=self._iot_shadow_callback,
+            key=self.getDeviceUUID(),
+        )
+        self._onSubscribed(topic)
+
+    async def subscribeMechStatusAsync(
+        self,
+        callback: Optional[
+            Callable[["SesameLocker", "CHSesameProtocolMechStatus"], None]
+        ] = None,
+    ) -> None:
+        """Subscribe to a topic at AWS IoT without blocking the event loop.
+
+        Args:
+            callback (Callable[[SesameLocker, CHSesameProtocolMechStatus], None], optional): The registered callback will be executed once an update is delivered. Defaults to `None`.
+
+        Raises:
+            NotImplementedError: If the authenticator is not `AuthType.SDK`.
+        """
+        topic = self._prepareSubscription(callback)
+        await self.authenticator.aws_iot.subscribeAsync(
+            topic=topic,
+            callback=self._iot_shadow_callback,
+            key=self.getDeviceUUID(),
+        )
+        self._onSubscribed(topic)
+
+    @property
+    def isSubscribed(self) -> bool:
+        """Return whether the device reports its status through AWS IoT.
+
+        Returns:
+            bool: `True` once `subscribeMechStatus` succeeded, until `close`.
+        """
+        return bool(self._subscribedTopics)
+
+    def _prepareSubscription(self, callback: Optional[Callable]) -> str:
+        if self.authenticator.login_method != AuthType.SDK:
+            raise NotImplementedError("This feature is not suppoted by the Web API.")
+
+        logger.info("UUID={}, Subscribe to the topic...".format(self.getDeviceUUID()))
+        if callable(callback) or callback is None:
+            self._callback = callback
+        else:
+            raise TypeError("callback should be callable.")
+        return "$aws/things/sesame2/shadow/name/{}/update/accepted".format(
+            self.getDeviceUUID()
+        )
+
+    def _onSubscribed(self, topic: str) -> None:
+        if topic not in self._subscribedTopics:
+            self._subscribedTopics.append(topic)
+        logger.info("UUID={}, Subscription established".format(self.getDeviceUUID()))
+
+    def _iot_shadow_callback(self, topic: str, payload: bytes, *_) -> None:
+        """Callback for updated shadows.
+
+        Raises:
+            NotImplementedError: If the device does not support subscriptions.
+        """
+        raise NotImplementedError("This device does not support subscriptions.")
+
+    async def watch(
+        self, maxsize: int = 16
+    ) -> AsyncIterator["CHSesameProtocolMechStatus"]:
+        """Iterate over status updates of the device, as seen by `addStatusListener`.
+
+        The device is subscribed if it is not yet.
+        Updates are buffered in a bounded queue; when a consumer falls behind,
+        the oldest updates are dropped so that the latest one is always kept.
+
+        Args:
+            maxsize (int, optional): The maximum number of buffered updates. Defaults to `16`.
+
+        Yields:
+            CHSesameProtocolMechStatus: The reported mechanical status.
+        """
+        loop = asyncio.get_running_loop()
+        queue: "asyncio.Queue[CHSesameProtocolMechStatus]" = asyncio.Queue(maxsize)
+
+        def _put(status: "CHSesameProtocolMechStatus") -> None:
+            if queue.full():
+                queue.get_nowait()
+                logger.debug(
+                    "UUID={}, watch queue is full, dropped the oldest update".format(
+                        self.getDeviceUUID()
+                    )
+                )
+            queue.put_nowait(status)
+
+        def _listener(_, status: "CHSesameProtocolMechStatus") -> None:
+            try:
+                loop.call_soon_threadsafe(_put, status)
+            except RuntimeError:
+                # The event loop is already closed
+                self.removeStatusListener(_listener)
+
+        self.addStatusListener(_listener)
+        try:
+            if not self._subscribedTopics:
+                await self.subscribeMechStatusAsync(self._callback)
+            while True:
+                yield await queue.get()
+        finally:
+            self.removeStatusListener(_listener)
+
+    def close(self) -> None:
+        """Unsubscribe from all topics of this device.
+
+        The connection itself belongs to the authenticator and stays open.
+        """
+        if self._subscribedTopics and self.authenticator.login_method == AuthType.SDK:
+            for topic in self._subscribedTopics:
+                self.authenticator.aws_iot.unsubscribe(topic)
+        self._subscribedTopics = []
+
+    def __enter__(self) -> "SesameLocker":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
     def __str__(self) -> str:
         """Return a string representation of an object.
 
@@ -139,3 +448,6 @@ class SesameLocker(CHDevices):
             str: The string representation of the object.
         """
         return f"SesameLocker(deviceUUID={self.getDeviceUUID()}, deviceModel={self.productModel})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
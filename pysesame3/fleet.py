@@ -0,0 +1,296 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Union,
+)
+
+from .helper import CHProductModel
+
+if TYPE_CHECKING:
+    from .device import SesameLocker
+    from .registry import DeviceRegistry
+
+logger = logging.getLogger(__name__)
+
+
+class CommandOutcome:
+    """The result of a command sent to a device of a fleet.
+
+    Attributes:
+        device (SesameLocker): The device.
+        command (str): The name of the command, such as `lock`.
+        success (bool): `True` if the cloud accepted the command.
+        latency (float): Seconds spent on the command.
+        historyTag (str): The history tag sent with the command.
+        error (Optional[Exception]): The error raised by the command, if any.
+    """
+
+    def __init__(
+        self,
+        device: "SesameLocker",
+        command: str,
+        success: bool,
+        latency: float,
+        historyTag: str,
+        error: Optional[Exception] = None,
+    ) -> None:
+        self.device = device
+        self.command = command
+        self.success = success
+        self.latency = latency
+        self.historyTag = historyTag
+        self.error = error
+
+    def __str__(self) -> str:
+        return f"CommandOutcome(deviceUUID={self.device.getDeviceUUID()}, command={self.command}, success={self.success}, latency={self.latency:.3f}, error={self.error!r})"
+
+
+class Fleet:
+    def __init__(
+        self,
+        devices: Optional[Iterable["SesameLocker"]] = None,
+        max_workers: int = 8,
+        history_tag: str = "pysesame3",
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """A group of devices controlled together.
+
+        Commands are sent to every device concurrently, with at most
+        `max_workers` requests in flight.
+
+        Args:
+            devices (Optional[Iterable[SesameLocker]], optional): The initial devices. Defaults to `None`.
+            max_workers (int, optional): The maximum number of commands in flight. Defaults to `8`.
+            history_tag (str, optional): The history tag of devices without their own. Defaults to `pysesame3`.
+            clock (Callable[[], float], optional): Measures latencies. Defaults to `time.monotonic`.
+
+        Raises:
+            ValueError: If `max_workers` is less than 1.
+        """
+        if max_workers < 1:
+            raise ValueError("max_workers should be 1 or more.")
+        self._max_workers = max_workers
+        self._history_tag = history_tag
+        self._clock = clock
+        self._devices: Dict[str, "SesameLocker"] = {}
+        self._tags: Dict[str, Set[str]] = {}
+        self._history_tags: Dict[str, str] = {}
+
+        for device in devices or []:
+            self.add(device)
+
+    @classmethod
+    def fromRegistry(cls, registry: "DeviceRegistry", **kwargs) -> "Fleet":
+        """Create a fleet with every device of a registry.
+
+        The `tags` (separated by spaces) and `history_tag` fields of the
+        manifest are used for the devices.
+
+        Args:
+            registry (DeviceRegistry): The registry.
+            **kwargs: Passed to `Fleet`.
+
+        Returns:
+            Fleet: The fleet.
+        """
+        fleet = cls(**kwargs)
+        for device in registry:
+            metadata = registry.getMetadata(device.getDeviceUUID())
+            tags = metadata.get("tags") or []
+            if isinstance(tags, str):
+                tags = tags.split()
+            fleet.add(device, tags, metadata.get("history_tag") or None)
+        return fleet
+
+    @property
+    def devices(self) -> List["SesameLocker"]:
+        return list(self._devices.values())
+
+    def __len__(self) -> int:
+        return len(self._devices)
+
+    def __iter__(self) -> Iterator["SesameLocker"]:
+        return iter(list(self._devices.values()))
+
+    def add(
+        self,
+        device: "SesameLocker",
+        tags: Iterable[str] = (),
+        history_tag: Optional[str] = None,
+    ) -> None:
+        """Add a device, or update the tags of a device already in the fleet.
+
+        Args:
+            device (SesameLocker): The device.
+            tags (Iterable[str], optional): Labels to select the device by, such as `floor3`. Defaults to `()`.
+            history_tag (Optional[str], optional): The history tag of the device. Defaults to the one of the fleet.
+        """
+        key = device.getDeviceUUID()
+        self._devices[key] = device
+        self._tags.setdefault(key, set()).update(tags)
+        if history_tag is not None:
+            self._history_tags[key] = history_tag
+
+    def remove(self, device: "SesameLocker") -> None:
+        """Remove a device.
+
+        Args:
+            device (SesameLocker): The device.
+        """
+        key = device.getDeviceUUID()
+        self._devices.pop(key, None)
+        self._tags.pop(key, None)
+        self._history_tags.pop(key, None)
+
+    def getTags(self, device: "SesameLocker") -> Set[str]:
+        """Return the tags of a device.
+
+        Args:
+            device (SesameLocker): The device.
+
+        Returns:
+            Set[str]: The tags.
+        """
+        return set(self._tags.get(device.getDeviceUUID(), ()))
+
+    def getHistoryTag(self, device: "SesameLocker") -> str:
+        """Return the history tag sent with the commands to a device.
+
+        Args:
+            device (SesameLocker): The device.
+
+        Returns:
+            str: The history tag.
+        """
+        return self._history_tags.get(device.getDeviceUUID(), self._history_tag)
+
+    def select(self, *tags: str, model: Optional[CHProductModel] = None) -> "Fleet":
+        """Return the devices having all of the tags, as a new fleet.
+
+        Args:
+            *tags (str): The required tags.
+            model (Optional[CHProductModel], optional): The required product model. Defaults to any.
+
+        Returns:
+            Fleet: The selected devices, with their tags and history tags.
+        """
+        selected = Fleet(
+            max_workers=self._max_workers,
+            history_tag=self._history_tag,
+            clock=self._clock,
+        )
+        required = set(tags)
+        for key, device in self._devices.items():
+            if not required <= self._tags[key]:
+                continue
+            if model is not None and device.productModel != model:
+                continue
+            selected.add(device, self._tags[key], self._history_tags.get(key))
+        return selected
+
+    def lock(self, history_tag: Optional[str] = None) -> List[CommandOutcome]:
+        """Lock every device.
+
+        Args:
+            history_tag (Optional[str], optional): Overrides the history tags of the devices. Defaults to `None`.
+
+        Returns:
+            List[CommandOutcome]: The outcome of each device, in the order of the fleet.
+        """
+        return self.run("lock", history_tag)
+
+    def unlock(self, history_tag: Optional[str] = None) -> List[CommandOutcome]:
+        """Unlock every device.
+
+        Args:
+            history_tag (Optional[str], optional): Overrides the history tags of the devices. Defaults to `None`.
+
+        Returns:
+            List[CommandOutcome]: The outcome of each device, in the order of the fleet.
+        """
+        return self.run("unlock", history_tag)
+
+    def toggle(self, history_tag: Optional[str] = None) -> List[CommandOutcome]:
+        """Toggle every device.
+
+        Args:
+            history_tag (Optional[str], optional): Overrides the history tags of the devices. Defaults to `None`.
+
+        Returns:
+            List[CommandOutcome]: The outcome of each device, in the order of the fleet.
+        """
+        return self.run("toggle", history_tag)
+
+    def click(self, history_tag: Optional[str] = None) -> List[CommandOutcome]:
+        """Click every device.
+
+        Args:
+            history_tag (Optional[str], optional): Overrides the history tags of the devices. Defaults to `None`.
+
+        Returns:
+            List[CommandOutcome]: The outcome of each device, in the order of the fleet.
+        """
+        return self.run("click", history_tag)
+
+    def run(
+        self,
+        command: Union[str, Callable[["SesameLocker", str], bool]],
+        history_tag: Optional[str] = None,
+    ) -> List[CommandOutcome]:
+        """Run a command on every device concurrently.
+
+        Errors are reported in the outcomes and never raised; a device which
+        does not support the command fails with `NotImplementedError`.
+
+        Args:
+            command (Union[str, Callable[[SesameLocker, str], bool]]): A method name of the devices such as `lock`,
+                or a function called with a device and its history tag.
+            history_tag (Optional[str], optional): Overrides the history tags of the devices. Defaults to `None`.
+
+        Returns:
+            List[CommandOutcome]: The outcome of each device, in the order of the fleet.
+        """
+        name = command if isinstance(command, str) else command.__name__
+
+        def _run(device: "SesameLocker") -> CommandOutcome:
+            tag = history_tag if history_tag is not None else self.getHistoryTag(device)
+            started = self._clock()
+            try:
+                if isinstance(command, str):
+                    method = getattr(device, command, None)
+                    if not callable(method):
+                        raise NotImplementedError(
+                            f"{type(device).__name__} does not support {command}."
+                        )
+                    success = bool(method(tag))
+                else:
+                    success = bool(command(device, tag))
+                error = None
+            except Exception as err:
+                success = False
+                error = err
+            outcome = CommandOutcome(
+                device, name, success, self._clock() - started, tag, error
+            )
+            logger.debug(str(outcome))
+            return outcome
+
+        devices = self.devices
+        if not devices:
+            return []
+        with ThreadPoolExecutor(
+            max_workers=min(self._max_workers, len(devices))
+        ) as executor:
+            return list(executor.map(_run, devices))
+
+    def __str__(self) -> str:
+        return f"Fleet(devices={len(self._devices)})"
@@ -0,0 +1,434 @@
+import logging
+import time
+import uuid
+from array import array
+from typing import TYPE_CHECKING, Dict, Iterator, Optional, Union
+
+from .const import CHSesame2ShadowStatus, StateSource
+from .helper import (
+    _SESAME2_MECHST,
+    _SESAMEBOT_MECHST,
+    BATTERY_CURVES,
+    SESAME2_BATTERY_CURVE,
+    SESAMEBOT_WEBAPI_VOLTAGE_THRESHOLD,
+    CHProductModel,
+    CHSesameProtocolMechStatus,
+)
+
+if TYPE_CHECKING:
+    from .auth import CognitoAuth, WebAPIAuth
+    from .device import SesameLocker
+
+logger = logging.getLogger(__name__)
+
+# Bits of the `flags` column. The lock, unlock and battery bits are the
+# ones of `mechst`; `FLAG_KNOWN` is set once a status has been stored, and
+# `FLAG_SECRET_KEY` when the device was added with its secret key.
+FLAG_KNOWN = 0x01
+FLAG_LOCK_RANGE = 0x02
+FLAG_UNLOCK_RANGE = 0x04
+FLAG_BATTERY_CRITICAL = 0x20
+FLAG_SECRET_KEY = 0x80
+_MECHST_FLAGS = FLAG_LOCK_RANGE | FLAG_UNLOCK_RANGE | FLAG_BATTERY_CRITICAL
+
+# Codes of the `shadow` column, 0 means unknown
+_SHADOW_CODES = {status: status.value for status in CHSesame2ShadowStatus}
+_SHADOW_STATUSES = {code: status for status, code in _SHADOW_CODES.items()}
+
+
+def _uuid_bytes(device_uuid: Union[uuid.UUID, str]) -> bytes:
+    if isinstance(device_uuid, uuid.UUID):
+        return device_uuid.bytes
+    return uuid.UUID(device_uuid).bytes
+
+
+class FleetStateTable:
+    def __init__(self) -> None:
+        """The state of many devices, stored column by column.
+
+        Each device is a row. The columns are fixed-width arrays, so a device
+        costs a few dozen bytes instead of a device object, its state and
+        its status objects. `mechst` is decoded straight into the columns.
+        Use `view` to read a row, and `DeviceRow.toDevice` to get a
+        `CHSesame2` or `CHSesameBot` when a command has to be sent.
+
+        Columns:
+            model (B): The product type.
+            voltage (f): The battery voltage.
+            position (h): The position, or the motor status of a SESAME bot.
+            flags (B): `FLAG_KNOWN`, `FLAG_LOCK_RANGE`, `FLAG_UNLOCK_RANGE`, `FLAG_BATTERY_CRITICAL` and `FLAG_SECRET_KEY`.
+            shadow (B): The value of the `CHSesame2ShadowStatus`, 0 if unknown.
+            updatedAt (d): UNIX timestamp of the last update, 0 if never.
+        """
+        self._index: Dict[bytes, int] = {}
+        self._uuids = bytearray()
+        self._secretKeys = bytearray()
+        self.model = array("B")
+        self.voltage = array("f")
+        self.position = array("h")
+        self.flags = array("B")
+        self.shadow = array("B")
+        self.updatedAt = array("d")
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, device_uuid: Union[uuid.UUID, str]) -> bool:
+        return _uuid_bytes(device_uuid) in self._index
+
+    def __iter__(self) -> Iterator["DeviceRow"]:
+        return (DeviceRow(self, row) for row in range(len(self._index)))
+
+    def add(
+        self,
+        device_uuid: Union[uuid.UUID, str],
+        secret_key: Optional[Union[bytes, str]] = None,
+        model: CHProductModel = CHProductModel.SS2,
+    ) -> "DeviceRow":
+        """Add a device.
+
+        Args:
+            device_uuid (Union[uuid.UUID, str]): The UUID of the device.
+            secret_key (Optional[Union[bytes, str]], optional): The secret key of the device, needed by `DeviceRow.toDevice`. Defaults to `None`.
+            model (CHProductModel, optional): The product model. Defaults to `CHProductModel.SS2`.
+
+        Raises:
+            ValueError: If the device is already in the table, or the secret key is invalid.
+
+        Returns:
+            DeviceRow: The row of the device.
+        """
+        key = _uuid_bytes(device_uuid)
+        if key in self._index:
+            raise ValueError(f"Duplicate device: {str(uuid.UUID(bytes=key)).upper()}")
+        if secret_key is None:
+            # Placeholder, `toDevice` refuses rows without `FLAG_SECRET_KEY`
+            secret = bytes(16)
+        elif isinstance(secret_key, str):
+            secret = bytes.fromhex(secret_key)
+        else:
+            secret = bytes(secret_key)
+        if len(secret) != 16:
+            raise ValueError("Invalid secret_key - length should be 32.")
+
+        row = len(self._index)
+        self._index[key] = row
+        self._uuids += key
+        self._secretKeys += secret
+        self.model.append(model.productType())
+        self.voltage.append(0.0)
+        self.position.append(0)
+        self.flags.append(FLAG_SECRET_KEY if secret_key is not None else 0)
+        self.shadow.append(0)
+        self.updatedAt.append(0.0)
+        return DeviceRow(self, row)
+
+    def row(self, device_uuid: Union[uuid.UUID, str]) -> int:
+        """Return the row number of a device.
+
+        Args:
+            device_uuid (Union[uuid.UUID, str]): The UUID of the device.
+
+        Raises:
+            KeyError: If the device is not in the table.
+
+        Returns:
+            int: The row number.
+        """
+        return self._index[_uuid_bytes(device_uuid)]
+
+    def view(self, device_uuid: Union[uuid.UUID, str]) -> "DeviceRow":
+        """Return a view of the row of a device.
+
+        Args:
+            device_uuid (Union[uuid.UUID, str]): The UUID of the device.
+
+        Raises:
+            KeyError: If the device is not in the table.
+
+        Returns:
+            DeviceRow: The view.
+        """
+        return DeviceRow(self, self.row(device_uuid))
+
+    def applyMechst(
+        self,
+        device_uuid: Union[uuid.UUID, str],
+        rawdata: Union[str, bytes],
+        updated_at: Optional[float] = None,
+    ) -> None:
+        """Store a raw `mechst`, as reported by AWS IoT.
+
+        No status object is created.
+
+        Args:
+            device_uuid (Union[uuid.UUID, str]): The UUID of the device.
+            rawdata (Union[str, bytes]): Hex-encoded or binary `mechst` data.
+            updated_at (Optional[float], optional): UNIX timestamp of the data. Defaults to now.
+
+        Raises:
+            KeyError: If the device is not in the table.
+            ValueError: If `rawdata` is not 8 bytes long.
+            NotImplementedError: If the model of the device has no `mechst`.
+        """
+        row = self.row(device_uuid)
+        if isinstance(rawdata, str):
+            rawdata = bytes.fromhex(rawdata)
+        if len(rawdata) != 8:
+            raise ValueError("Invalid mechst - length should be 8.")
+
+        model = CHProductModel.getByValue(self.model[row])
+        if model == CHProductModel.SesameBot1:
+            battery, position, flags = _SESAMEBOT_MECHST.unpack_from(rawdata)
+            voltage = battery * 3.6 / 1023
+        elif model in (CHProductModel.SS2, CHProductModel.SS4):
+            battery, _, position, _, flags = _SESAME2_MECHST.unpack_from(rawdata)
+            voltage = battery * 7.2 / 1023
+        else:
+            raise NotImplementedError("This device type is not supported.")
+        self._store(row, voltage, position, flags & _MECHST_FLAGS, updated_at)
+
+    def applyStatus(
+        self,
+        device_uuid: Union[uuid.UUID, str],
+        status: CHSesameProtocolMechStatus,
+        updated_at: Optional[float] = None,
+    ) -> None:
+        """Store a status object, for example one fetched over HTTP.
+
+        Args:
+            device_uuid (Union[uuid.UUID, str]): The UUID of the device.
+            status (CHSesameProtocolMechStatus): The status.
+            updated_at (Optional[float], optional): UNIX timestamp of the data. Defaults to now.
+
+        Raises:
+            KeyError: If the device is not in the table.
+        """
+        row = self.row(device_uuid)
+        # Statuses from the Web API carry no battery flag
+        critical = getattr(status, "_isBatteryCritical", False)
+        get_motor_status = getattr(status, "getMotorStatus", None)
+        position = (
+            get_motor_status() if get_motor_status is not None else status.getPosition()
+        )
+        flags = (
+            (FLAG_LOCK_RANGE if status.isInLockRange() else 0)
+            | (FLAG_UNLOCK_RANGE if status.isInUnlockRange() else 0)
+            | (FLAG_BATTERY_CRITICAL if critical else 0)
+        )
+        self._store(row, status.getBatteryVoltage(), position, flags, updated_at)
+
+    def applyShadowStatus(
+        self,
+        device_uuid: Union[uuid.UUID, str],
+        status: Optional[CHSesame2ShadowStatus],
+    ) -> None:
+        """Store the lock state of a device.
+
+        Args:
+            device_uuid (Union[uuid.UUID, str]): The UUID of the device.
+            status (Optional[CHSesame2ShadowStatus]): The lock state, `None` if unknown.
+
+        Raises:
+            KeyError: If the device is not in the table.
+        """
+        self.shadow[self.row(device_uuid)] = (
+            0 if status is None else _SHADOW_CODES[status]
+        )
+
+    def attach(self, device: "SesameLocker") -> None:
+        """Keep the row of a device up to date with its status listeners.
+
+        The device is added to the table if needed.
+
+        Args:
+            device (SesameLocker): The device.
+        """
+        device_uuid = device.getDeviceUUID()
+        if device_uuid not in self:
+            self.add(device_uuid, device.getSecretKey(), device.productModel)
+        device.addStatusListener(self._onStatus)
+
+    def detach(self, device: "SesameLocker") -> None:
+        """Stop updating the row of a device.
+
+        Args:
+            device (SesameLocker): The device.
+        """
+        device.removeStatusListener(self._onStatus)
+
+    def _onStatus(
+        self, device: "SesameLocker", status: CHSesameProtocolMechStatus
+    ) -> None:
+        device_uuid = device.getDeviceUUID()
+        self.applyStatus(device_uuid, status)
+        self.applyShadowStatus(device_uuid, device.snapshot.shadowStatus)
+
+    def _store(
+        self,
+        row: int,
+        voltage: float,
+        position: int,
+        flags: int,
+        updated_at: Optional[float],
+    ) -> None:
+        self.voltage[row] = voltage
+        self.position[row] = position
+        self.flags[row] = (self.flags[row] & FLAG_SECRET_KEY) | flags | FLAG_KNOWN
+        if flags & FLAG_LOCK_RANGE and not flags & FLAG_UNLOCK_RANGE:
+            self.shadow[row] = _SHADOW_CODES[CHSesame2ShadowStatus.LockedWm]
+        elif flags & FLAG_UNLOCK_RANGE and not flags & FLAG_LOCK_RANGE:
+            self.shadow[row] = _SHADOW_CODES[CHSesame2ShadowStatus.UnlockedWm]
+        self.updatedAt[row] = time.time() if updated_at is None else updated_at
+
+
+class DeviceRow:
+    __slots__ = ("_table", "_row")
+
+    def __init__(self, table: FleetStateTable, row: int) -> None:
+        """A read-only view of a device in a `FleetStateTable`.
+
+        Getters read the columns on every call, so a view never goes stale
+        and holds no state of its own.
+
+        Args:
+            table (FleetStateTable): The table.
+            row (int): The row of the device.
+        """
+        self._table = table
+        self._row = row
+
+    @property
+    def row(self) -> int:
+        return self._row
+
+    @property
+    def deviceId(self) -> str:
+        """Return the UUID of the device.
+
+        Returns:
+            str: The UUID of the device.
+        """
+        start = self._row * 16
+        key = bytes(self._table._uuids[start : start + 16])
+        return str(uuid.UUID(bytes=key)).upper()
+
+    @property
+    def productModel(self) -> CHProductModel:
+        return CHProductModel.getByValue(self._table.model[self._row])
+
+    @property
+    def updatedAt(self) -> Optional[float]:
+        """Return when the status was last updated.
+
+        Returns:
+            Optional[float]: UNIX timestamp, `None` if the status is unknown.
+        """
+        updated_at = self._table.updatedAt[self._row]
+        return updated_at if updated_at else None
+
+    def getDeviceUUID(self) -> str:
+        return self.deviceId
+
+    def hasStatus(self) -> bool:
+        """Return whether a status has been stored.
+
+        When `False`, the other getters return their zero values.
+
+        Returns:
+            bool: `True` if a status is known.
+        """
+        return self._table.flags[self._row] & FLAG_KNOWN > 0
+
+    def hasSecretKey(self) -> bool:
+        """Return whether the device was added with its secret key.
+
+        Returns:
+            bool: `True` if `toDevice` can be used.
+        """
+        return self._table.flags[self._row] & FLAG_SECRET_KEY > 0
+
+    def getBatteryVoltage(self) -> float:
+        return self._table.voltage[self._row]
+
+    def getBatteryPercentage(self) -> int:
+        """Return battery status information as a percentage.
+
+        Returns:
+            int: Battery power left as a percentage.
+        """
+        voltage = self.getBatteryVoltage()
+        model = self.productModel
+        if (
+            model == CHProductModel.SesameBot1
+            and voltage > SESAMEBOT_WEBAPI_VOLTAGE_THRESHOLD
+        ):
+            return SESAME2_BATTERY_CURVE.getPercentage(voltage)
+        try:
+            return BATTERY_CURVES[model].getPercentage(voltage)
+        except KeyError:
+            raise NotImplementedError("This device type is not supported.")
+
+    def getPosition(self) -> int:
+        """Return the position, or the motor status of a SESAME bot.
+
+        Returns:
+            int: The position.
+        """
+        return self._table.position[self._row]
+
+    def isInLockRange(self) -> bool:
+        return self._table.flags[self._row] & FLAG_LOCK_RANGE > 0
+
+    def isInUnlockRange(self) -> bool:
+        return self._table.flags[self._row] & FLAG_UNLOCK_RANGE > 0
+
+    def isBatteryCritical(self) -> bool:
+        return self._table.flags[self._row] & FLAG_BATTERY_CRITICAL > 0
+
+    def getDeviceShadowStatus(self) -> Optional[CHSesame2ShadowStatus]:
+        """Return the (assumed) lock state, without any I/O.
+
+        Returns:
+            Optional[CHSesame2ShadowStatus]: The lock state, `None` if unknown.
+        """
+        return _SHADOW_STATUSES.get(self._table.shadow[self._row])
+
+    def toDevice(
+        self, authenticator: Union["WebAPIAuth", "CognitoAuth"]
+    ) -> "SesameLocker":
+        """Create a device object for this row, to send commands.
+
+        The device is created without any I/O, and starts from the lock
+        state of the row.
+
+        Args:
+            authenticator (Union[WebAPIAuth, CognitoAuth]): The authenticator for the device.
+
+        Raises:
+            ValueError: If the device was added without its secret key.
+
+        Returns:
+            SesameLocker: The device.
+        """
+        if not self.hasSecretKey():
+            raise ValueError(
+                f"No secret key for {self.deviceId}: add it with `secret_key` to send commands."
+            )
+        model = self.productModel
+        start = self._row * 16
+        device = model.deviceFactory()(
+            authenticator=authenticator,
+            device_uuid=self.deviceId,
+            secret_key=self._table._secretKeys[start : start + 16].hex(),
+            initial_sync=False,
+        )
+        if model != device.productModel:
+            device.setProductModel(model)
+        shadow_status = self.getDeviceShadowStatus()
+        if shadow_status is not None:
+            device.state.update(StateSource.Shadow, shadowStatus=shadow_status)
+        return device
+
+    def __str__(self) -> str:
+        return f"DeviceRow(deviceUUID={self.deviceId}, productModel={self.productModel}, shadowStatus={self.getDeviceShadowStatus()}, voltage={self.getBatteryVoltage():.2f}V, position={self.getPosition()})"
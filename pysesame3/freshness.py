@@ -0,0 +1,363 @@
+import logging
+import threading
+import time
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Set
+
+from .cloud import AWSIoT, AWSIoTPool
+from .const import StateSource, UpdateChannel
+from .polling import PollingScheduler
+
+if TYPE_CHECKING:
+    from .device import SesameLocker
+    from .helper import CHSesameProtocolMechStatus
+
+logger = logging.getLogger(__name__)
+
+
+class _Freshness:
+    __slots__ = ("device", "pool", "connections", "channel", "updatedAt", "reconcile")
+
+    def __init__(
+        self,
+        device: "SesameLocker",
+        pool: Optional[AWSIoTPool],
+        connections: List[AWSIoT],
+        updated_at: float,
+    ) -> None:
+        self.device = device
+        self.pool = pool
+        self.connections = connections
+        self.channel = UpdateChannel.Push
+        self.updatedAt = updated_at
+        self.reconcile = False
+
+
+class FreshnessManager:
+    def __init__(
+        self,
+        scheduler: Optional[PollingScheduler] = None,
+        stale_after: float = 600.0,
+        check_interval: float = 5.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """Keep the state of subscribed devices fresh, polling when push fails.
+
+        The time of the last update of each device is tracked. A device is
+        moved to HTTP polling with `scheduler` when its AWS IoT connection is
+        interrupted, or when nothing was heard from it for `stale_after`
+        seconds. It goes back to push when an update arrives through the AWS
+        IoT again; after a reconnection, its status is fetched once first,
+        since updates sent while disconnected are lost.
+
+        Freshness listeners are told when a device changes channel, so the
+        application knows when its cached state may be going stale.
+
+        Args:
+            scheduler (Optional[PollingScheduler], optional): Polls the devices which fell back. Defaults to a `PollingScheduler` with its default budget.
+            stale_after (float, optional): Seconds without any update before polling. Defaults to `600`.
+            check_interval (float, optional): Seconds between two checks when running in the background. Defaults to `5`.
+            clock (Callable[[], float], optional): A monotonic clock. Defaults to `time.monotonic`.
+
+        Raises:
+            ValueError: If `stale_after` or `check_interval` is not positive.
+        """
+        if stale_after <= 0 or check_interval <= 0:
+            raise ValueError("stale_after and check_interval should be positive.")
+
+        self._scheduler = (
+            scheduler if scheduler is not None else PollingScheduler(clock=clock)
+        )
+        self._staleAfter = stale_after
+        self._checkInterval = check_interval
+        self._clock = clock
+
+        self._lock = threading.Lock()
+        self._devices: Dict[str, _Freshness] = {}
+        # Keyed by the id of each connection
+        self._connections: Dict[int, AWSIoT] = {}
+        self._down: Set[int] = set()
+        self._listeners: List[Callable[["SesameLocker", UpdateChannel], None]] = []
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self.fallbacks = 0
+        self.reconciliations = 0
+
+    @property
+    def scheduler(self) -> PollingScheduler:
+        return self._scheduler
+
+    def __len__(self) -> int:
+        return len(self._devices)
+
+    def track(self, device: "SesameLocker") -> None:
+        """Track the freshness of a subscribed device.
+
+        Args:
+            device (SesameLocker): The device, subscribed with `subscribeMechStatus`.
+
+        Raises:
+            NotImplementedError: If the authenticator has no AWS IoT connection.
+        """
+        aws_iot = device.authenticator.aws_iot
+        pool = aws_iot if isinstance(aws_iot, AWSIoTPool) else None
+        connections = pool.shards if pool is not None else [aws_iot]
+        device_uuid = device.getDeviceUUID()
+        with self._lock:
+            if device_uuid in self._devices:
+                return
+            self._devices[device_uuid] = _Freshness(
+                device, pool, connections, self._clock()
+            )
+            for connection in connections:
+                key = id(connection)
+                if key not in self._connections:
+                    self._connections[key] = connection
+                    connection.addConnectionListener(self._onConnection)
+        device.addStatusListener(self._onStatus)
+
+    def untrack(self, device: "SesameLocker") -> None:
+        """Stop tracking a device, and polling it if it fell back.
+
+        Args:
+            device (SesameLocker): The device.
+        """
+        device.removeStatusListener(self._onStatus)
+        with self._lock:
+            state = self._devices.pop(device.getDeviceUUID(), None)
+            if state is None:
+                return
+        if state.channel == UpdateChannel.Poll:
+            self._scheduler.remove(device)
+
+    def addFreshnessListener(
+        self, listener: Callable[["SesameLocker", UpdateChannel], None]
+    ) -> None:
+        """Register a listener called when a device changes channel.
+
+        `UpdateChannel.Poll` means push updates stopped for the device, and
+        its state is now only as fresh as the polling interval.
+
+        Args:
+            listener (Callable[[SesameLocker, UpdateChannel], None]): Called with the device and its new channel.
+
+        Raises:
+            TypeError: If `listener` is not callable.
+        """
+        if not callable(listener):
+            raise TypeError("listener should be callable.")
+        self._listeners.append(listener)
+
+    def removeFreshnessListener(
+        self, listener: Callable[["SesameLocker", UpdateChannel], None]
+    ) -> None:
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def getChannel(self, device: "SesameLocker") -> UpdateChannel:
+        """Return how the state of a device is currently kept up to date.
+
+        Args:
+            device (SesameLocker): The device.
+
+        Raises:
+            KeyError: If the device is not tracked.
+
+        Returns:
+            UpdateChannel: `Push` or `Poll`.
+        """
+        with self._lock:
+            return self._devices[device.getDeviceUUID()].channel
+
+    def getAge(self, device: "SesameLocker") -> float:
+        """Return the seconds since the last update of a device.
+
+        Args:
+            device (SesameLocker): The device.
+
+        Raises:
+            KeyError: If the device is not tracked.
+
+        Returns:
+            float: Seconds since the last status, or since it was tracked.
+        """
+        with self._lock:
+            return self._clock() - self._devices[device.getDeviceUUID()].updatedAt
+
+    def isFresh(self, device: "SesameLocker") -> bool:
+        """Return whether a device was heard from within `stale_after`.
+
+        Args:
+            device (SesameLocker): The device.
+
+        Raises:
+            KeyError: If the device is not tracked.
+
+        Returns:
+            bool: `True` if its state is fresh.
+        """
+        return self.getAge(device) <= self._staleAfter
+
+    def check(self) -> None:
+        """Move devices between push and polling.
+
+        Called every `check_interval` and on connection changes when running
+        in the background; call it yourself otherwise.
+        """
+        now = self._clock()
+        fallbacks: List[_Freshness] = []
+        reconciles: List[_Freshness] = []
+        with self._lock:
+            for state in self._devices.values():
+                push_up = self._isPushUp(state)
+                if state.reconcile and push_up:
+                    # Even if the outage was too short to fall back
+                    reconciles.append(state)
+                elif state.channel == UpdateChannel.Push and (
+                    not push_up or now - state.updatedAt > self._staleAfter
+                ):
+                    state.channel = UpdateChannel.Poll
+                    fallbacks.append(state)
+
+        for state in fallbacks:
+            logger.info(
+                "UUID={}, Push updates stopped, polling".format(
+                    state.device.getDeviceUUID()
+                )
+            )
+            self.fallbacks += 1
+            self._scheduler.add(state.device)
+            self._notifyFreshnessListeners(state.device, UpdateChannel.Poll)
+
+        for state in reconciles:
+            if not self._scheduler.budget.tryAcquire():
+                # Retried at the next check
+                break
+            self._reconcile(state)
+
+    def start(self) -> None:
+        """Check in a background thread, and start the scheduler, until `stop` is called."""
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._scheduler.start()
+        self._thread = threading.Thread(
+            target=self._run, name="pysesame3-freshness", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop the background thread and the scheduler.
+
+        Args:
+            timeout (Optional[float], optional): Seconds to wait for the thread. Defaults to no limit.
+        """
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self._scheduler.stop(timeout)
+
+    def __enter__(self) -> "FreshnessManager":
+        self.start()
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.stop()
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                self.check()
+            except Exception as err:
+                logger.exception(err)
+            self._wakeup.wait(self._checkInterval)
+            self._wakeup.clear()
+
+    def _isPushUp(self, state: _Freshness) -> bool:
+        # Topics of an `AWSIoTPool` fail over to any live connection
+        return any(id(c) not in self._down for c in state.connections)
+
+    def _reconcile(self, state: _Freshness) -> None:
+        device = state.device
+        try:
+            device.fetchMechStatus()
+        except Exception as err:
+            logger.warning(
+                "UUID={}, Failed to reconcile: {}".format(device.getDeviceUUID(), err)
+            )
+            return
+        self.reconciliations += 1
+        with self._lock:
+            state.reconcile = False
+        self._backToPush(state)
+
+    def _backToPush(self, state: _Freshness) -> None:
+        with self._lock:
+            if state.channel == UpdateChannel.Push:
+                return
+            state.channel = UpdateChannel.Push
+            state.reconcile = False
+        logger.info(
+            "UUID={}, Push updates resumed".format(state.device.getDeviceUUID())
+        )
+        self._scheduler.remove(state.device)
+        self._notifyFreshnessListeners(state.device, UpdateChannel.Push)
+
+    def _notifyFreshnessListeners(
+        self, device: "SesameLocker", channel: UpdateChannel
+    ) -> None:
+        for listener in self._listeners:
+            try:
+                listener(device, channel)
+            except Exception as err:
+                logger.exception(err)
+
+    def _onConnection(self, connection: AWSIoT, connected: bool) -> None:
+        # Called on the event-loop thread of the connection: flag and wake up only
+        key = id(connection)
+        with self._lock:
+            if not connected:
+                self._down.add(key)
+                states = []
+            else:
+                self._down.discard(key)
+                states = [
+                    s for s in self._devices.values() if connection in s.connections
+                ]
+        if connected:
+            # Only the devices subscribed on this connection missed updates
+            resumed = [s for s in states if self._placement(s) is connection]
+            with self._lock:
+                for state in resumed:
+                    state.reconcile = True
+        self._wakeup.set()
+
+    @staticmethod
+    def _placement(state: _Freshness) -> Optional[AWSIoT]:
+        if state.pool is None:
+            return state.connections[0]
+        try:
+            # The pool has already moved the topics of the resumed connection
+            return state.pool.getShard(state.device.getDeviceUUID())
+        except ConnectionError:
+            return None
+
+    def _onStatus(
+        self, device: "SesameLocker", status: "CHSesameProtocolMechStatus"
+    ) -> None:
+        with self._lock:
+            state = self._devices.get(device.getDeviceUUID())
+            if state is None:
+                return
+            state.updatedAt = self._clock()
+            pushed = (
+                state.channel == UpdateChannel.Poll
+                and not state.reconcile
+                and device.snapshot.source == StateSource.IoT
+            )
+        if pushed:
+            # An update arrived through the AWS IoT: push works again
+            self._backToPush(state)
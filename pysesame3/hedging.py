@@ -0,0 +1,251 @@
+import asyncio
+import collections
+import logging
+import math
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Executor, ThreadPoolExecutor
+from concurrent.futures import wait as wait_futures
+from typing import Awaitable, Callable, Deque, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class ReadHedger:
+    def __init__(
+        self,
+        percentile: float = 95.0,
+        window: int = 200,
+        min_samples: int = 20,
+        initial_delay: float = 1.0,
+        min_delay: float = 0.01,
+        max_hedges: int = 8,
+        max_reads: int = 32,
+        executor: Optional[Executor] = None,
+    ) -> None:
+        """Send a second copy of slow idempotent reads, and use the first answer.
+
+        If a read has not answered after the `percentile` of recent
+        latencies, the same read is sent again. Whichever succeeds first is
+        returned and the other is cancelled; a blocking request already on
+        the wire cannot be stopped, so its answer is dropped instead. Each
+        hedge is one more request against the budget of the API key, so
+        they are counted in `hedges`. At most `max_hedges` are in flight;
+        a slow read finding none free is not hedged and counted in
+        `skipped`, so hedges never pile up when the cloud is overloaded.
+
+        Blocking reads run on a pool of `max_reads` threads, leaving the
+        caller free to return the answer of the hedge. When all of them are
+        busy, such as during a fleet-wide refresh, a read runs in the calling
+        thread instead and is not hedged; it is counted in `inline`. Reads
+        never wait for a thread, and the threads do not grow with the number
+        of callers.
+
+        Set it with `SesameCloud.setHedger`. It only applies to
+        `getMechStatus` and `getHistoryEntries`, never to `sendCmd`.
+
+        Args:
+            percentile (float, optional): The percentile of recent latencies to wait before hedging. Defaults to `95`.
+            window (int, optional): The number of recent latencies kept. Defaults to `200`.
+            min_samples (int, optional): The latencies needed before using the percentile. Defaults to `20`.
+            initial_delay (float, optional): Seconds to wait before hedging until then. Defaults to `1`.
+            min_delay (float, optional): The shortest delay before hedging. Defaults to `0.01`.
+            max_hedges (int, optional): The maximum number of hedges in flight. Defaults to `8`.
+            max_reads (int, optional): The maximum number of blocking reads run off the calling thread. Defaults to `32`.
+            executor (Optional[Executor], optional): Runs the blocking reads and their hedges. Defaults to a pool of `max_reads + max_hedges` threads.
+
+        Raises:
+            ValueError: If `percentile` is not within (0, 100], or `window`, `min_samples`, `max_hedges` or `max_reads` is not positive.
+        """
+        if not 0 < percentile <= 100:
+            raise ValueError("percentile should be within (0, 100].")
+        if window <= 0 or min_samples <= 0 or max_hedges <= 0 or max_reads <= 0:
+            raise ValueError(
+                "window, min_samples, max_hedges and max_reads should be positive."
+            )
+
+        self._percentile = percentile
+        self._minSamples = min(min_samples, window)
+        self._initialDelay = initial_delay
+        self._minDelay = min_delay
+        self._maxHedges = max_hedges
+        self._hedgeSlots = threading.BoundedSemaphore(max_hedges)
+        self._maxReads = max_reads
+        self._readSlots = threading.BoundedSemaphore(max_reads)
+        self._executor = executor
+        self._ownsExecutor = executor is None
+
+        self._lock = threading.Lock()
+        self._latencies: Deque[float] = collections.deque(maxlen=window)
+
+        self.requests = 0
+        self.hedges = 0
+        # Hedges which answered before the original read
+        self.wins = 0
+        # Slow reads not hedged, since `max_hedges` were in flight
+        self.skipped = 0
+        # Reads run in the calling thread, since `max_reads` were in flight
+        self.inline = 0
+
+    def getDelay(self) -> float:
+        """Return the seconds a read waits before it is hedged.
+
+        Returns:
+            float: The `percentile` of recent latencies, or `initial_delay` while there are too few.
+        """
+        with self._lock:
+            if len(self._latencies) < self._minSamples:
+                return self._initialDelay
+            ordered = sorted(self._latencies)
+        rank = math.ceil(self._percentile / 100 * len(ordered)) - 1
+        return max(self._minDelay, ordered[max(rank, 0)])
+
+    def record(self, latency: float) -> None:
+        """Add the latency of a successful read.
+
+        Args:
+            latency (float): Seconds the read took.
+        """
+        with self._lock:
+            self._latencies.append(latency)
+
+    def run(self, read: Callable[[], T]) -> T:
+        """Run a blocking read, hedging it if it is slow.
+
+        Args:
+            read (Callable[[], T]): The read, safe to run twice at once.
+
+        Raises:
+            Exception: The error of the original read, if both failed.
+
+        Returns:
+            T: The first successful result.
+        """
+        delay = self.getDelay()
+        with self._lock:
+            self.requests += 1
+        if not self._readSlots.acquire(blocking=False):
+            with self._lock:
+                self.inline += 1
+            return self._timed(read, time.monotonic())
+        try:
+            primary = self._getExecutor().submit(self._timed, read, time.monotonic())
+        except BaseException:
+            self._readSlots.release()
+            raise
+        primary.add_done_callback(lambda _: self._readSlots.release())
+        done, _ = wait_futures([primary], timeout=delay)
+        if done or not self._takeSlot():
+            return primary.result()
+
+        try:
+            hedge = self._getExecutor().submit(self._timed, read, time.monotonic())
+        except BaseException:
+            self._hedgeSlots.release()
+            raise
+        hedge.add_done_callback(lambda _: self._hedgeSlots.release())
+        pending = {primary, hedge}
+        while pending:
+            done, pending = wait_futures(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    self._won(future is hedge, pending)
+                    return future.result()
+        return primary.result()
+
+    async def runAsync(self, read: Callable[[], Awaitable[T]]) -> T:
+        """Run a read without blocking the event loop, hedging it if it is slow.
+
+        Args:
+            read (Callable[[], Awaitable[T]]): Returns a new awaitable of the read at each call.
+
+        Raises:
+            Exception: The error of the original read, if both failed.
+
+        Returns:
+            T: The first successful result.
+        """
+        delay = self.getDelay()
+        with self._lock:
+            self.requests += 1
+        primary = asyncio.ensure_future(self._timedAsync(read))
+        pending = {primary}
+        try:
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if done or not self._takeSlot():
+                return await primary
+
+            hedge = asyncio.ensure_future(self._timedAsync(read))
+            hedge.add_done_callback(lambda _: self._hedgeSlots.release())
+            pending = {primary, hedge}
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for future in done:
+                    if future.exception() is None:
+                        self._won(future is hedge, pending)
+                        return future.result()
+            return primary.result()
+        finally:
+            # Also when the caller is cancelled
+            for future in pending:
+                future.cancel()
+
+    def close(self) -> None:
+        """Shut down the pool of the hedger, if it owns one."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None and self._ownsExecutor:
+            executor.shutdown(wait=False)
+
+    def __enter__(self) -> "ReadHedger":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    def _getExecutor(self) -> Executor:
+        with self._lock:
+            if self._executor is None:
+                # One thread per slot, so that no read waits for one
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self._maxReads + self._maxHedges,
+                    thread_name_prefix="pysesame3-hedging",
+                )
+                self._ownsExecutor = True
+            return self._executor
+
+    def _timed(self, read: Callable[[], T], start: float) -> T:
+        result = read()
+        self.record(time.monotonic() - start)
+        return result
+
+    async def _timedAsync(self, read: Callable[[], Awaitable[T]]) -> T:
+        start = time.monotonic()
+        result = await read()
+        self.record(time.monotonic() - start)
+        return result
+
+    def _takeSlot(self) -> bool:
+        """Count a hedge if one more may be in flight, or a skipped one."""
+        if not self._hedgeSlots.acquire(blocking=False):
+            with self._lock:
+                self.skipped += 1
+            return False
+        with self._lock:
+            self.hedges += 1
+        logger.debug("Hedging a slow read")
+        return True
+
+    def _won(self, hedge: bool, pending: set) -> None:
+        if hedge:
+            with self._lock:
+                self.wins += 1
+        for future in pending:
+            future.cancel()
+
+    def __str__(self) -> str:
+        return f"ReadHedger(requests={self.requests}, hedges={self.hedges}, wins={self.wins}, skipped={self.skipped}, inline={self.inline}, delay={self.getDelay():.3f})"
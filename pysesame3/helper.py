@@ -1,9 +1,12 @@
+import bisect
+import functools
 import importlib
 import logging
 import re
+import struct
 import sys
 from enum import Enum
-from typing import Dict, Union
+from typing import Dict, Tuple, Union
 
 if sys.version_info[:2] >= (3, 8):
     from typing import TypedDict
@@ -51,10 +54,8 @@ class CHProductModel(Enum):
         if not isinstance(model, str):
             raise TypeError("Invalid Model")
         try:
-            return next(
-                e for e in list(CHProductModel) if e.value["deviceModel"] == model
-            )
-        except StopIteration:
+            return _MODELS_BY_NAME[model]
+        except KeyError:
             raise NotImplementedError("This device is not supported.")
 
     @staticmethod
@@ -62,10 +63,8 @@ class CHProductModel(Enum):
         if not isinstance(val, int):
             raise TypeError("Invalid Value")
         try:
-            return next(
-                e for e in list(CHProductModel) if e.value["productType"] == val
-            )
-        except StopIteration:
+            return _MODELS_BY_PRODUCT_TYPE[val]
+        except KeyError:
             raise NotImplementedError("This device is not supported.")
 
     def deviceModel(self) -> str:
@@ -80,38 +79,182 @@ class CHProductModel(Enum):
     def deviceFactory(self) -> Union[type, None]:
         if self.value["deviceFactory"] is None:
             raise NotImplementedError("This device type is not supported.")
-        return getattr(
-            importlib.import_module(f"pysesame3.{self.value['deviceFactory'].lower()}"),
-            self.value["deviceFactory"],
-        )
+        return _load_device_factory(self.value["deviceFactory"])
+
+
+# Lookup tables for `CHProductModel.getByModel` and `CHProductModel.getByValue`
+_MODELS_BY_NAME: Dict[str, CHProductModel] = {
+    e.value["deviceModel"]: e for e in CHProductModel
+}
+_MODELS_BY_PRODUCT_TYPE: Dict[int, CHProductModel] = {
+    e.value["productType"]: e for e in CHProductModel
+}
+
+
+@functools.lru_cache(maxsize=None)
+def _load_device_factory(name: str) -> type:
+    return getattr(importlib.import_module(f"pysesame3.{name.lower()}"), name)
+
+
+class BatteryCurve:
+    def __init__(self, voltages: Tuple[float, ...], percentages: Tuple[float, ...]):
+        """A discharge curve, mapping a battery voltage to a percentage.
+
+        The tables are stored in ascending order, so that the segment of a
+        voltage is found by bisection.
+
+        Args:
+            voltages (Tuple[float, ...]): Voltages, in descending order.
+            percentages (Tuple[float, ...]): Percentages for each voltage.
+
+        Raises:
+            ValueError: If the tables do not describe a valid curve.
+        """
+        if len(voltages) != len(percentages) or len(voltages) < 2:
+            raise ValueError("voltages and percentages must have the same length.")
+        if any(a <= b for a, b in zip(voltages, voltages[1:])):
+            raise ValueError("voltages must be in strictly descending order.")
+
+        self.voltages = tuple(reversed(voltages))
+        self.percentages = tuple(reversed(percentages))
+
+    def getPercentage(self, voltage: float) -> int:
+        """Return the percentage for a voltage by linear interpolation.
+
+        Args:
+            voltage (float): The battery voltage.
+
+        Returns:
+            int: Battery power left as a percentage.
+        """
+        voltages = self.voltages
+        if voltage >= voltages[-1]:
+            return 100
+        elif voltage <= voltages[0]:
+            return 0
+
+        # voltages[i - 1] < voltage <= voltages[i]
+        i = bisect.bisect_left(voltages, voltage)
+        f = (voltage - voltages[i - 1]) / (voltages[i] - voltages[i - 1])
+        f3 = self.percentages[i]
+        f4 = self.percentages[i - 1]
+        return int(f4 + (f * (f3 - f4)))
+
+
+_BATTERY_PERCENTAGES = (100.0, 50.0, 40.0, 32.0, 21.0, 13.0, 10.0, 7.0, 3.0, 0.0)
+SESAME2_BATTERY_CURVE = BatteryCurve(
+    (6.0, 5.8, 5.7, 5.6, 5.4, 5.2, 5.1, 5.0, 4.8, 4.6), _BATTERY_PERCENTAGES
+)
+SESAMEBOT_BATTERY_CURVE = BatteryCurve(
+    (3.0, 2.9, 2.85, 2.8, 2.7, 2.6, 2.55, 2.5, 2.4, 2.3), _BATTERY_PERCENTAGES
+)
+BATTERY_CURVES: Dict[CHProductModel, BatteryCurve] = {
+    CHProductModel.SS2: SESAME2_BATTERY_CURVE,
+    CHProductModel.SS4: SESAME2_BATTERY_CURVE,
+    CHProductModel.SesameBot1: SESAMEBOT_BATTERY_CURVE,
+}
+
+# TODO: Remove this workaround
+# The Web API weirdly answers as if the SESAME bot's
+# rated battery voltage is 6V.
+# This is clearly wrong and is very likely to be changed in the future.
+SESAMEBOT_WEBAPI_VOLTAGE_THRESHOLD = 4.5
+
+
+# Layout of `mechst`, little-endian:
+# battery (u16), target (s16), position (s16), retcode (u8), flags (u8)
+_SESAME2_MECHST = struct.Struct("<HhhBB")
+# SESAME bot: battery (u16), 2 bytes, motor status (u8), 2 bytes, flags (u8)
+_SESAMEBOT_MECHST = struct.Struct("<H2xB2xB")
+_MECHST_LENGTH = 8
+
+
+def _as_memoryview(rawdata: Union[bytes, bytearray, memoryview]) -> memoryview:
+    buf = memoryview(rawdata)
+    if buf.nbytes < _MECHST_LENGTH:
+        raise ValueError("Invalid mechst - length should be 8.")
+    return buf
 
 
 class CHSesameProtocolMechStatus:
+    __slots__ = (
+        "_isInLockRange",
+        "_isInUnlockRange",
+        "_isBatteryCritical",
+        "_batteryVoltage",
+        "_target",
+        "_position",
+        "_retcode",
+    )
+
     def __init__(self, rawdata: Union[bytes, str, Dict]) -> None:
         """Represent a mechanical status of a device.
 
+        Prefer `from_bytes`, `from_hex` and `from_webapi`, which skip the type dispatch.
+
         Args:
             rawdata (Union[bytes, str, dict]): The raw `mechst` data for the device.
         """
         if isinstance(rawdata, str):
-            rawdata = bytes.fromhex(rawdata)
-
-        if isinstance(rawdata, bytes):
-            self._isInLockRange = rawdata[7] & 2 > 0
-            self._isInUnlockRange = rawdata[7] & 4 > 0
-            self._isBatteryCritical = rawdata[7] & 32 > 0
+            self._decode(_as_memoryview(bytes.fromhex(rawdata)))
+        elif isinstance(rawdata, (bytes, bytearray, memoryview)):
+            self._decode(_as_memoryview(rawdata))
         elif isinstance(rawdata, dict):
-            self._isInLockRange = (
-                True if rawdata["CHSesame2Status"] == "locked" else False
-            )
-            self._isInUnlockRange = not self._isInLockRange
+            self._load_webapi(rawdata)
         else:
             raise TypeError("Invalid input type")
 
-        self._batteryVoltage: float
-        self._target: int
-        self._position: int
-        self._retcode: int
+    @classmethod
+    def from_bytes(cls, rawdata: Union[bytes, bytearray, memoryview]):
+        """Decode a binary `mechst`.
+
+        Args:
+            rawdata (Union[bytes, bytearray, memoryview]): The raw `mechst` data.
+
+        Returns:
+            CHSesameProtocolMechStatus: The decoded status, an instance of `cls`.
+        """
+        status = cls.__new__(cls)
+        status._decode(_as_memoryview(rawdata))
+        return status
+
+    @classmethod
+    def from_hex(cls, rawdata: str):
+        """Decode a hex-encoded `mechst`, as found in the shadow.
+
+        Args:
+            rawdata (str): The hex-encoded `mechst` data.
+
+        Returns:
+            CHSesameProtocolMechStatus: The decoded status, an instance of `cls`.
+        """
+        return cls.from_bytes(bytes.fromhex(rawdata))
+
+    @classmethod
+    def from_webapi(cls, rawdata: Dict):
+        """Load a status returned by the Web API.
+
+        Args:
+            rawdata (Dict): The JSON response of the Web API.
+
+        Returns:
+            CHSesameProtocolMechStatus: The loaded status, an instance of `cls`.
+        """
+        status = cls.__new__(cls)
+        status._load_webapi(rawdata)
+        return status
+
+    def _decode(self, buf: memoryview) -> None:
+        self._set_flags(buf[7])
+
+    def _set_flags(self, flags: int) -> None:
+        self._isInLockRange = flags & 2 > 0
+        self._isInUnlockRange = flags & 4 > 0
+        self._isBatteryCritical = flags & 32 > 0
+
+    def _load_webapi(self, rawdata: Dict) -> None:
+        self._isInLockRange = True if rawdata["CHSesame2Status"] == "locked" else False
+        self._isInUnlockRange = not self._isInLockRange
 
     def getBatteryVoltage(self) -> float:
         """Return battery status information as a voltage.
@@ -169,29 +312,22 @@ class CHSesameProtocolMechStatus:
 
 
 class CHSesame2MechStatus(CHSesameProtocolMechStatus):
-    def __init__(self, rawdata: Union[bytes, str, Dict]) -> None:
-        """Represent a mechanical status of a SESAME3.
+    """Represent a mechanical status of a SESAME3."""
 
-        Args:
-            rawdata (Union[bytes, str, Dict]): The raw `mechst` data for the device.
-        """
-        if isinstance(rawdata, str):
-            rawdata = bytes.fromhex(rawdata)
+    __slots__ = ()
 
-        if isinstance(rawdata, bytes):
-            super().__init__(rawdata)
+    def _decode(self, buf: memoryview) -> None:
+        battery, target, position, retcode, flags = _SESAME2_MECHST.unpack_from(buf)
+        self._batteryVoltage = battery * 7.2 / 1023
+        self._target = target
+        self._position = position
+        self._retcode = retcode
+        self._set_flags(flags)
 
-            self._batteryVoltage = int.from_bytes(rawdata[0:2], "little") * 7.2 / 1023
-            self._target = int.from_bytes(rawdata[2:4], "little", signed=True)
-            self._position = int.from_bytes(rawdata[4:6], "little", signed=True)
-            self._retcode = rawdata[6]
-        elif isinstance(rawdata, dict):
-            super().__init__(rawdata)
-
-            self._batteryVoltage = rawdata["batteryVoltage"]
-            self._position = rawdata["position"]
-        else:
-            raise TypeError("Invalid input type")
+    def _load_webapi(self, rawdata: Dict) -> None:
+        super()._load_webapi(rawdata)
+        self._batteryVoltage = rawdata["batteryVoltage"]
+        self._position = rawdata["position"]
 
     def getBatteryPercentage(self) -> int:
         """Return battery status information as a percentage.
@@ -199,29 +335,7 @@ class CHSesame2MechStatus(CHSesameProtocolMechStatus):
         Returns:
             int: Battery power left as a percentage.
         """
-        list_vol = [6.0, 5.8, 5.7, 5.6, 5.4, 5.2, 5.1, 5.0, 4.8, 4.6]
-        list_pct = [100.0, 50.0, 40.0, 32.0, 21.0, 13.0, 10.0, 7.0, 3.0, 0.0]
-        cur_vol = self._batteryVoltage
-
-        if cur_vol >= list_vol[0]:
-            return 100
-        elif cur_vol <= list_vol[-1]:
-            return 0
-        else:
-            ret = 0
-            i = 0
-            while i < len(list_vol) - 1:
-                if cur_vol > list_vol[i] or cur_vol <= list_vol[i + 1]:
-                    i = i + 1
-                    continue
-                else:
-                    f = (cur_vol - list_vol[i + 1]) / (list_vol[i] - list_vol[i + 1])
-                    f3 = list_pct[i]
-                    f4 = list_pct[i + 1]
-                    ret = int(f4 + (f * (f3 - f4)))
-                    break
-
-            return ret
+        return SESAME2_BATTERY_CURVE.getPercentage(self._batteryVoltage)
 
     def getBatteryPrecentage(self) -> int:
         """Return battery status information as a percentage.
@@ -243,32 +357,26 @@ class CHSesame2MechStatus(CHSesameProtocolMechStatus):
 
 
 class CHSesameBotMechStatus(CHSesameProtocolMechStatus):
-    def __init__(self, rawdata: Union[bytes, str, Dict]) -> None:
-        """Represent a mechanical status of a SESAME bot.
+    """Represent a mechanical status of a SESAME bot."""
 
-        Args:
-            rawdata (Union[bytes, str, Dict]): The raw `mechst` data for the device.
-        """
-        if isinstance(rawdata, str):
-            rawdata = bytes.fromhex(rawdata)
+    __slots__ = ("_motorStatus",)
 
-        if isinstance(rawdata, bytes):
-            super().__init__(rawdata)
+    def _decode(self, buf: memoryview) -> None:
+        battery, motor_status, flags = _SESAMEBOT_MECHST.unpack_from(buf)
+        self._batteryVoltage = battery * 3.6 / 1023
+        self._motorStatus = motor_status
+        self._set_flags(flags)
 
-            self._batteryVoltage = int.from_bytes(rawdata[0:2], "little") * 3.6 / 1023
-            self._motorStatus = rawdata[4]
-        elif isinstance(rawdata, dict):
-            super().__init__(rawdata)
-
-            # TODO: Watch carefully for any change in the response from SESAME Cloud.
-            # The Web API always responds with the same type for all devices at this moment.
-            # That is, even for SESAME bot, it also appears to have a battery voltage of 6V,
-            # and it also has a position field.
-            # This is clearly wrong and is very likely to be changed in the future.
-            self._batteryVoltage = rawdata["batteryVoltage"]
-            self._motorStatus = rawdata["position"]
-        else:
-            raise TypeError("Invalid input type")
+    def _load_webapi(self, rawdata: Dict) -> None:
+        super()._load_webapi(rawdata)
+
+        # TODO: Watch carefully for any change in the response from SESAME Cloud.
+        # The Web API always responds with the same type for all devices at this moment.
+        # That is, even for SESAME bot, it also appears to have a battery voltage of 6V,
+        # and it also has a position field.
+        # This is clearly wrong and is very likely to be changed in the future.
+        self._batteryVoltage = rawdata["batteryVoltage"]
+        self._motorStatus = rawdata["position"]
 
     def getBatteryPercentage(self) -> int:
         """Return battery status information as a percentage.
@@ -276,36 +384,9 @@ class CHSesameBotMechStatus(CHSesameProtocolMechStatus):
         Returns:
             int: Battery power left as a percentage.
         """
-        if self._batteryVoltage > 4.5:
-            # TODO: Remove this workaround
-            # The Web API weirdly answers as if the SESAME bot's
-            # rated battery voltage is 6V.
-            # This is clearly wrong and is very likely to be changed in the future.
-            list_vol = [6.0, 5.8, 5.7, 5.6, 5.4, 5.2, 5.1, 5.0, 4.8, 4.6]
-        else:
-            list_vol = [3.0, 2.9, 2.85, 2.8, 2.7, 2.6, 2.55, 2.5, 2.4, 2.3]
-        list_pct = [100.0, 50.0, 40.0, 32.0, 21.0, 13.0, 10.0, 7.0, 3.0, 0.0]
-        cur_vol = self._batteryVoltage
-
-        if cur_vol >= list_vol[0]:
-            return 100
-        elif cur_vol <= list_vol[-1]:
-            return 0
-        else:
-            ret = 0
-            i = 0
-            while i < len(list_vol) - 1:
-                if cur_vol > list_vol[i] or cur_vol <= list_vol[i + 1]:
-                    i = i + 1
-                    continue
-                else:
-                    f = (cur_vol - list_vol[i + 1]) / (list_vol[i] - list_vol[i + 1])
-                    f3 = list_pct[i]
-                    f4 = list_pct[i + 1]
-                    ret = int(f4 + (f * (f3 - f4)))
-                    break
-
-            return ret
+        if self._batteryVoltage > SESAMEBOT_WEBAPI_VOLTAGE_THRESHOLD:
+            return SESAME2_BATTERY_CURVE.getPercentage(self._batteryVoltage)
+        return SESAMEBOT_BATTERY_CURVE.getPercentage(self._batteryVoltage)
 
     def getBatteryPrecentage(self) -> int:
         """Return battery status information as a percentage.
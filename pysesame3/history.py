@@ -68,9 +68,11 @@ class CHSesame2History:
             "recordID": self.record_id,
             "timeStamp": self.timestamp.strftime("%Y/%m/%d %H:%M:%S"),
             "type": self.event_type.name,
-            "historyTag": base64.b64decode(self.historytag).decode("utf-8")
-            if self.historytag is not None
-            else None,
+            "historyTag": (
+                base64.b64decode(self.historytag).decode("utf-8")
+                if self.historytag is not None
+                else None
+            ),
             "devicePk": self.devicePk,
             "parameter": self.parameter,
         }
@@ -0,0 +1,231 @@
+import logging
+import threading
+import time
+import uuid
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    Dict,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Union,
+)
+
+import requests
+
+from .polling import TokenBucket
+
+if TYPE_CHECKING:
+    from .auth import CognitoAuth, WebAPIAuth
+
+logger = logging.getLogger(__name__)
+
+# Seconds a key rests after `429 Too Many Requests` without `Retry-After`
+THROTTLE_BACKOFF = 5.0
+
+
+class KeyUsage:
+    """How much of the budget of an API key is used.
+
+    Attributes:
+        name (str): The name of the key in the pool.
+        devices (int): The number of devices assigned to it.
+        requests (int): The number of requests sent with it.
+        throttled (int): The number of `429 Too Many Requests` responses.
+        tokens (float): The requests it can send right now.
+    """
+
+    def __init__(
+        self, name: str, devices: int, requests: int, throttled: int, tokens: float
+    ) -> None:
+        self.name = name
+        self.devices = devices
+        self.requests = requests
+        self.throttled = throttled
+        self.tokens = tokens
+
+    def __str__(self) -> str:
+        return f"KeyUsage(name={self.name}, devices={self.devices}, requests={self.requests}, throttled={self.throttled}, tokens={self.tokens:.1f})"
+
+
+class _Key:
+    __slots__ = ("name", "authenticator", "bucket", "devices", "requests", "throttled")
+
+    def __init__(
+        self,
+        name: str,
+        authenticator: Union["WebAPIAuth", "CognitoAuth"],
+        bucket: TokenBucket,
+    ) -> None:
+        self.name = name
+        self.authenticator = authenticator
+        self.bucket = bucket
+        self.devices = 0
+        self.requests = 0
+        self.throttled = 0
+
+
+class APIKeyPool:
+    def __init__(
+        self,
+        authenticators: Union[
+            Mapping[str, Union["WebAPIAuth", "CognitoAuth"]],
+            Sequence[Union["WebAPIAuth", "CognitoAuth"]],
+        ],
+        rate: float = 1.0,
+        burst: Optional[float] = None,
+        timeout: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """Spread devices over several API keys, each with its own budget.
+
+        Each device is assigned to one key, either the one named in its
+        manifest or the key with the fewest devices, and all its requests
+        are sent with that key. Requests wait for a token of the budget of
+        their key; a `429 Too Many Requests` response empties it until the
+        `Retry-After` delay has passed. Total throughput grows with the
+        number of keys.
+
+        Pass the pool instead of an authenticator to `DeviceRegistry`; the
+        `key_name` field of the manifest pins a device to a key.
+
+        Args:
+            authenticators (Union[Mapping[str, Union[WebAPIAuth, CognitoAuth]], Sequence[Union[WebAPIAuth, CognitoAuth]]]): One authenticator per API key, by name. A sequence is named by index.
+            rate (float, optional): The requests per second allowed for each key. Defaults to `1`.
+            burst (Optional[float], optional): The requests allowed at once for each key. Defaults to `max(1, rate)`.
+            timeout (Optional[float], optional): Seconds a request waits for its budget before failing. Defaults to no limit.
+            clock (Callable[[], float], optional): A monotonic clock. Defaults to `time.monotonic`.
+
+        Raises:
+            ValueError: If there is no authenticator, or one is used twice.
+        """
+        if isinstance(authenticators, Mapping):
+            named = list(authenticators.items())
+        else:
+            named = [(str(i), auth) for i, auth in enumerate(authenticators)]
+        if not named:
+            raise ValueError("At least one authenticator is required.")
+        if len({id(auth) for _, auth in named}) != len(named):
+            raise ValueError("Each authenticator should be given once.")
+
+        self._lock = threading.Lock()
+        self._keys: Dict[str, _Key] = {}
+        self._assignments: Dict[str, _Key] = {}
+        for name, authenticator in named:
+            key = _Key(name, authenticator, TokenBucket(rate, burst, clock))
+            cloud = authenticator.sesame_cloud
+            cloud.setRateLimiter(key.bucket, timeout)
+            cloud.addResponseListener(self._responseListener(key))
+            self._keys[name] = key
+
+    @property
+    def names(self) -> List[str]:
+        return list(self._keys)
+
+    def getAuthenticator(self, name: str) -> Union["WebAPIAuth", "CognitoAuth"]:
+        """Return the authenticator of a key.
+
+        Args:
+            name (str): The name of the key.
+
+        Raises:
+            KeyError: If there is no such key.
+
+        Returns:
+            Union[WebAPIAuth, CognitoAuth]: The authenticator.
+        """
+        return self._keys[name].authenticator
+
+    def assign(
+        self, device_uuid: str, name: Optional[str] = None
+    ) -> Union["WebAPIAuth", "CognitoAuth"]:
+        """Assign a device to a key, and return its authenticator.
+
+        A device keeps its key once assigned.
+
+        Args:
+            device_uuid (str): The UUID of the device.
+            name (Optional[str], optional): The key to use. Defaults to the key with the fewest devices.
+
+        Raises:
+            KeyError: If there is no key `name`.
+            ValueError: If the device is already assigned to another key.
+
+        Returns:
+            Union[WebAPIAuth, CognitoAuth]: The authenticator of the key.
+        """
+        device_key = str(uuid.UUID(device_uuid)).upper()
+        with self._lock:
+            key = self._assignments.get(device_key)
+            if key is not None:
+                if name is not None and key.name != name:
+                    raise ValueError(
+                        f"{device_key} is already assigned to key {key.name}"
+                    )
+                return key.authenticator
+
+            if name is not None:
+                key = self._keys[name]
+            else:
+                key = min(self._keys.values(), key=lambda k: k.devices)
+            key.devices += 1
+            self._assignments[device_key] = key
+        logger.debug("UUID={}, Assigned to key {}".format(device_key, key.name))
+        return key.authenticator
+
+    def getKeyName(self, device_uuid: str) -> Optional[str]:
+        """Return the name of the key of a device.
+
+        Args:
+            device_uuid (str): The UUID of the device.
+
+        Returns:
+            Optional[str]: The name, `None` if the device is not assigned.
+        """
+        with self._lock:
+            key = self._assignments.get(str(uuid.UUID(device_uuid)).upper())
+            return key.name if key is not None else None
+
+    def getUsage(self) -> List[KeyUsage]:
+        """Return how much of the budget of each key is used.
+
+        Returns:
+            List[KeyUsage]: One entry per key.
+        """
+        with self._lock:
+            return [
+                KeyUsage(k.name, k.devices, k.requests, k.throttled, k.bucket.tokens)
+                for k in self._keys.values()
+            ]
+
+    def close(self) -> None:
+        """Close every authenticator."""
+        for key in self._keys.values():
+            key.authenticator.close()
+
+    def __enter__(self) -> "APIKeyPool":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    def _responseListener(self, key: _Key) -> Callable[[requests.Response], None]:
+        def _onResponse(response: requests.Response) -> None:
+            with self._lock:
+                key.requests += 1
+                if response.status_code != 429:
+                    return
+                key.throttled += 1
+            try:
+                delay = float(response.headers.get("Retry-After", THROTTLE_BACKOFF))
+            except ValueError:
+                delay = THROTTLE_BACKOFF
+            logger.warning("Key {} throttled for {:.1f}s".format(key.name, delay))
+            key.bucket.drain(delay)
+
+        return _onResponse
+
+    def __str__(self) -> str:
+        return f"APIKeyPool(keys={len(self._keys)}, devices={len(self._assignments)})"
@@ -0,0 +1,508 @@
+import asyncio
+import hashlib
+import heapq
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Tuple
+
+from .const import CHSesame2CMD
+
+if TYPE_CHECKING:
+    from .device import SesameLocker
+    from .helper import CHSesameProtocolMechStatus
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    def __init__(
+        self,
+        rate: float,
+        capacity: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """A token bucket, to keep requests under a budget.
+
+        Tokens are added at `rate` per second up to `capacity`; each request
+        takes one. The bucket starts full.
+
+        Args:
+            rate (float): Tokens added per second.
+            capacity (Optional[float], optional): The maximum number of tokens, the allowed burst. Defaults to `max(1, rate)`.
+            clock (Callable[[], float], optional): A monotonic clock. Defaults to `time.monotonic`.
+
+        Raises:
+            ValueError: If `rate` or `capacity` is not positive.
+        """
+        if rate <= 0:
+            raise ValueError("rate should be positive.")
+        if capacity is None:
+            capacity = max(1.0, rate)
+        if capacity <= 0:
+            raise ValueError("capacity should be positive.")
+
+        self._rate = rate
+        self._capacity = capacity
+        self._clock = clock
+        self._tokens = capacity
+        self._updatedAt = clock()
+        self._lock = threading.Lock()
+
+    @property
+    def rate(self) -> float:
+        return self._rate
+
+    @property
+    def capacity(self) -> float:
+        return self._capacity
+
+    def _refill(self) -> None:
+        now = self._clock()
+        if now < self._updatedAt:
+            # Drained until then
+            return
+        self._tokens = min(
+            self._capacity, self._tokens + (now - self._updatedAt) * self._rate
+        )
+        self._updatedAt = now
+
+    @property
+    def tokens(self) -> float:
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+    def tryAcquire(self, tokens: float = 1.0) -> bool:
+        """Take tokens if there are enough.
+
+        Args:
+            tokens (float, optional): The number of tokens. Defaults to `1`.
+
+        Returns:
+            bool: `True` if taken, `False` if the budget is exhausted.
+        """
+        with self._lock:
+            self._refill()
+            if self._tokens < tokens:
+                return False
+            self._tokens -= tokens
+            return True
+
+    def acquire(self, tokens: float = 1.0, timeout: Optional[float] = None) -> bool:
+        """Take tokens, waiting for them if needed.
+
+        Args:
+            tokens (float, optional): The number of tokens. Defaults to `1`.
+            timeout (Optional[float], optional): Seconds to wait at most. Defaults to no limit.
+
+        Returns:
+            bool: `True` if taken, `False` if `timeout` expired first.
+        """
+        deadline = None if timeout is None else self._clock() + timeout
+        while not self.tryAcquire(tokens):
+            delay = self.getDelay(tokens)
+            if deadline is not None:
+                remaining = deadline - self._clock()
+                if remaining <= 0:
+                    return False
+                delay = min(delay, remaining)
+            time.sleep(max(delay, 0.001))
+        return True
+
+    async def acquireAsync(
+        self, tokens: float = 1.0, timeout: Optional[float] = None
+    ) -> bool:
+        """Take tokens, waiting for them without blocking the event loop.
+
+        Args:
+            tokens (float, optional): The number of tokens. Defaults to `1`.
+            timeout (Optional[float], optional): Seconds to wait at most. Defaults to no limit.
+
+        Returns:
+            bool: `True` if taken, `False` if `timeout` expired first.
+        """
+        deadline = None if timeout is None else self._clock() + timeout
+        while not self.tryAcquire(tokens):
+            delay = self.getDelay(tokens)
+            if deadline is not None:
+                remaining = deadline - self._clock()
+                if remaining <= 0:
+                    return False
+                delay = min(delay, remaining)
+            await asyncio.sleep(max(delay, 0.001))
+        return True
+
+    def drain(self, seconds: float) -> None:
+        """Take all tokens and stop refilling for a while.
+
+        Used when the server reports that the budget was exceeded.
+
+        Args:
+            seconds (float): Seconds before tokens are added again.
+        """
+        with self._lock:
+            self._tokens = 0.0
+            self._updatedAt = max(self._updatedAt, self._clock() + seconds)
+
+    def getDelay(self, tokens: float = 1.0) -> float:
+        """Return the seconds until enough tokens are available.
+
+        Args:
+            tokens (float, optional): The number of tokens. Defaults to `1`.
+
+        Returns:
+            float: `0` if they are available now.
+        """
+        with self._lock:
+            self._refill()
+            missing = tokens - self._tokens
+            return max(0.0, missing / self._rate) + max(
+                0.0, self._updatedAt - self._clock()
+            )
+
+
+def _phase(device_uuid: str) -> float:
+    """Return a stable fraction in [0, 1) to spread the devices over an interval."""
+    digest = hashlib.md5(device_uuid.upper().encode()).digest()
+    return int.from_bytes(digest[:8], "big") / 2**64
+
+
+def _status_key(status: "CHSesameProtocolMechStatus") -> Tuple:
+    try:
+        position = status.getPosition()
+    except NotImplementedError:
+        position = None
+    return (status.isInLockRange(), status.isInUnlockRange(), position)
+
+
+class _PollState:
+    __slots__ = ("device", "interval", "due", "inflight", "active", "lastKey")
+
+    def __init__(self, device: "SesameLocker", interval: float, due: float) -> None:
+        self.device = device
+        self.interval = interval
+        self.due = due
+        self.inflight = False
+        self.active = False
+        self.lastKey: Optional[Tuple] = None
+
+
+class PollingScheduler:
+    def __init__(
+        self,
+        interval: float = 60.0,
+        min_interval: float = 10.0,
+        max_interval: float = 600.0,
+        backoff: float = 1.5,
+        budget: float = 1.0,
+        burst: Optional[float] = None,
+        max_workers: int = 4,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """Poll the status of devices without a push channel, such as `WebAPIAuth` ones.
+
+        Devices are spread over the interval by the hash of their UUID, so
+        their polls never fire in one burst. A device whose status changed,
+        or which has commands in flight, is polled every `min_interval`; an
+        idle device is polled less and less often, up to `max_interval`.
+        All polls share a budget of `budget` requests per second; polls over
+        the budget are deferred, which stretches the intervals.
+
+        Args:
+            interval (float, optional): The interval of a device added or seen active. Defaults to `60`.
+            min_interval (float, optional): The interval of an active device. Defaults to `10`.
+            max_interval (float, optional): The interval of an idle device. Defaults to `600`.
+            backoff (float, optional): The interval of an idle device grows by this factor at each poll. Defaults to `1.5`.
+            budget (float, optional): The maximum number of polls per second, for all devices. Defaults to `1`.
+            burst (Optional[float], optional): Polls allowed at once within the budget. Defaults to `max(1, budget)`.
+            max_workers (int, optional): Polls in flight at once when running in the background. Defaults to `4`.
+            clock (Callable[[], float], optional): A monotonic clock. Defaults to `time.monotonic`.
+
+        Raises:
+            ValueError: If the intervals are not ordered or `backoff` is less than 1.
+        """
+        if not 0 < min_interval <= interval <= max_interval:
+            raise ValueError(
+                "Intervals should be 0 < min_interval <= interval <= max_interval."
+            )
+        if backoff < 1:
+            raise ValueError("backoff should be 1 or more.")
+
+        self._interval = interval
+        self._minInterval = min_interval
+        self._maxInterval = max_interval
+        self._backoff = backoff
+        self._maxWorkers = max_workers
+        self._clock = clock
+        self._bucket = TokenBucket(budget, burst, clock)
+
+        self._lock = threading.Lock()
+        self._states: Dict[str, _PollState] = {}
+        # (due, sequence, uuid); entries whose due is outdated are skipped
+        self._heap: List[Tuple[float, int, str]] = []
+        self._sequence = itertools.count()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+        self.polls = 0
+        self.failures = 0
+        self.deferred = 0
+
+    @property
+    def budget(self) -> TokenBucket:
+        return self._bucket
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    def add(self, device: "SesameLocker") -> None:
+        """Poll a device.
+
+        Its first poll happens within `interval`, at an offset derived from
+        its UUID.
+
+        Args:
+            device (SesameLocker): The device.
+        """
+        device_uuid = device.getDeviceUUID()
+        with self._lock:
+            if device_uuid in self._states:
+                return
+            due = self._clock() + self._interval * _phase(device_uuid)
+            state = _PollState(device, self._interval, due)
+            status = device.lastMechStatus
+            if status is not None:
+                state.lastKey = _status_key(status)
+            self._states[device_uuid] = state
+            self._push(device_uuid, due)
+        device.addStatusListener(self._onStatus)
+        self._wakeup.set()
+
+    def remove(self, device: "SesameLocker") -> None:
+        """Stop polling a device.
+
+        Args:
+            device (SesameLocker): The device.
+        """
+        device.removeStatusListener(self._onStatus)
+        with self._lock:
+            self._states.pop(device.getDeviceUUID(), None)
+
+    def getInterval(self, device: "SesameLocker") -> float:
+        """Return the current polling interval of a device.
+
+        Args:
+            device (SesameLocker): The device.
+
+        Raises:
+            KeyError: If the device is not polled.
+
+        Returns:
+            float: Seconds between two polls.
+        """
+        with self._lock:
+            return self._states[device.getDeviceUUID()].interval
+
+    def getNextPoll(self, device: "SesameLocker") -> float:
+        """Return the seconds until the next poll of a device, budget permitting.
+
+        Args:
+            device (SesameLocker): The device.
+
+        Raises:
+            KeyError: If the device is not polled.
+
+        Returns:
+            float: Seconds, `0` if it is due.
+        """
+        with self._lock:
+            return max(0.0, self._states[device.getDeviceUUID()].due - self._clock())
+
+    def expedite(self, device: "SesameLocker") -> None:
+        """Mark a device as active, for example after sending it a command.
+
+        It is polled within `min_interval`, then every `min_interval` while it stays active.
+
+        Args:
+            device (SesameLocker): The device.
+
+        Raises:
+            KeyError: If the device is not polled.
+        """
+        with self._lock:
+            state = self._states[device.getDeviceUUID()]
+            state.active = True
+            self._pullIn(device.getDeviceUUID(), state)
+        self._wakeup.set()
+
+    def enqueue(
+        self,
+        device: "SesameLocker",
+        cmd: CHSesame2CMD,
+        history_tag: str = "pysesame3",
+    ) -> "Future[bool]":
+        """Queue a command with `SesameLocker.enqueue` and poll the device sooner.
+
+        Args:
+            device (SesameLocker): The device.
+            cmd (CHSesame2CMD): The command.
+            history_tag (str, optional): The key tag to sent with the command. Defaults to `pysesame3`.
+
+        Returns:
+            Future[bool]: `True` if the cloud accepted the command.
+        """
+        future = device.enqueue(cmd, history_tag)
+        self.expedite(device)
+        return future
+
+    def runOnce(self) -> List["SesameLocker"]:
+        """Poll the devices which are due, within the budget.
+
+        Returns:
+            List[SesameLocker]: The devices polled.
+        """
+        devices = self._takeDue()
+        for device in devices:
+            self._poll(device)
+        return devices
+
+    def start(self) -> None:
+        """Poll in a background thread until `stop` is called."""
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._executor = ThreadPoolExecutor(
+            max_workers=self._maxWorkers, thread_name_prefix="pysesame3-polling"
+        )
+        self._thread = threading.Thread(
+            target=self._run, name="pysesame3-polling-scheduler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop polling in the background, waiting for the polls in flight.
+
+        Args:
+            timeout (Optional[float], optional): Seconds to wait for the thread. Defaults to no limit.
+        """
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def __enter__(self) -> "PollingScheduler":
+        self.start()
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.stop()
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            for device in self._takeDue():
+                self._executor.submit(self._poll, device)  # type: ignore
+            self._wakeup.wait(self._getDelay())
+            self._wakeup.clear()
+
+    def _getDelay(self) -> float:
+        with self._lock:
+            while self._heap and self._isOutdated(self._heap[0]):
+                heapq.heappop(self._heap)
+            if not self._heap:
+                return 1.0
+            delay = self._heap[0][0] - self._clock()
+        if delay <= 0:
+            delay = self._bucket.getDelay()
+        return min(max(delay, 0.01), 1.0)
+
+    def _isOutdated(self, entry: Tuple[float, int, str]) -> bool:
+        state = self._states.get(entry[2])
+        return state is None or state.inflight or state.due != entry[0]
+
+    def _push(self, device_uuid: str, due: float) -> None:
+        heapq.heappush(self._heap, (due, next(self._sequence), device_uuid))
+
+    def _pullIn(self, device_uuid: str, state: _PollState) -> None:
+        state.interval = self._minInterval
+        due = self._clock() + self._minInterval
+        if not state.inflight and due < state.due:
+            state.due = due
+            self._push(device_uuid, due)
+
+    def _takeDue(self) -> List["SesameLocker"]:
+        due = []
+        with self._lock:
+            now = self._clock()
+            while self._heap and self._heap[0][0] <= now:
+                entry = self._heap[0]
+                if self._isOutdated(entry):
+                    heapq.heappop(self._heap)
+                    continue
+                if not self._bucket.tryAcquire():
+                    # Over budget: the remaining polls wait for tokens
+                    self.deferred += 1
+                    break
+                heapq.heappop(self._heap)
+                state = self._states[entry[2]]
+                state.inflight = True
+                due.append(state.device)
+        return due
+
+    def _poll(self, device: "SesameLocker") -> None:
+        failed = False
+        try:
+            device.fetchMechStatus()
+        except Exception as err:
+            failed = True
+            logger.warning(
+                "UUID={}, Failed to poll: {}".format(device.getDeviceUUID(), err)
+            )
+
+        device_uuid = device.getDeviceUUID()
+        queue = getattr(device, "commandQueue", None)
+        busy = queue is not None and queue.busy
+        with self._lock:
+            self.polls += 1
+            if failed:
+                self.failures += 1
+            state = self._states.get(device_uuid)
+            if state is None:
+                return
+            if state.active or busy:
+                state.interval = self._minInterval
+            elif failed:
+                state.interval = max(state.interval, self._interval)
+            else:
+                state.interval = min(state.interval * self._backoff, self._maxInterval)
+            state.active = False
+            state.inflight = False
+            state.due = self._clock() + state.interval
+            self._push(device_uuid, state.due)
+        logger.debug(
+            "UUID={}, Next poll in {:.1f}s".format(device_uuid, state.interval)
+        )
+
+    def _onStatus(
+        self, device: "SesameLocker", status: "CHSesameProtocolMechStatus"
+    ) -> None:
+        key = _status_key(status)
+        with self._lock:
+            state = self._states.get(device.getDeviceUUID())
+            if state is None:
+                return
+            changed = state.lastKey is not None and key != state.lastKey
+            state.lastKey = key
+            if changed:
+                state.active = True
+                self._pullIn(device.getDeviceUUID(), state)
+        if changed:
+            self._wakeup.set()
@@ -0,0 +1,262 @@
+import csv
+import json
+import logging
+import os
+import uuid
+from typing import IO, TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional, Union
+
+from .helper import CHProductModel
+from .keypool import APIKeyPool
+
+if TYPE_CHECKING:
+    from .auth import CognitoAuth, WebAPIAuth
+    from .device import SesameLocker
+
+logger = logging.getLogger(__name__)
+
+# Columns of a manifest; any other column is kept as metadata of the device.
+MANIFEST_FIELDS = ("uuid", "secret_key", "model")
+
+
+def parse_model(model: Union[CHProductModel, str, int]) -> CHProductModel:
+    """Resolve a product model written in a manifest.
+
+    Args:
+        model (Union[CHProductModel, str, int]): A model such as `sesame_2`, `SS2` or its product type `0`.
+
+    Raises:
+        NotImplementedError: If the model is unknown.
+
+    Returns:
+        CHProductModel: The product model.
+    """
+    if isinstance(model, CHProductModel):
+        return model
+    if isinstance(model, int) or (isinstance(model, str) and model.isdigit()):
+        return CHProductModel.getByValue(int(model))
+    try:
+        return CHProductModel.getByModel(model)
+    except NotImplementedError:
+        try:
+            return CHProductModel[model]
+        except KeyError:
+            raise NotImplementedError(f"This device is not supported: {model}")
+
+
+def read_manifest(
+    manifest: Union[str, os.PathLike, IO[str]], format: Optional[str] = None
+) -> List[Dict[str, str]]:
+    """Read the entries of a manifest, without creating any device.
+
+    A JSON manifest is a list of objects, a CSV manifest has a header row.
+    Both have the fields `uuid`, `secret_key` and `model`; other fields
+    are kept as metadata.
+
+    Args:
+        manifest (Union[str, os.PathLike, IO[str]]): A path or a text stream.
+        format (Optional[str], optional): `json` or `csv`. Defaults to the extension of the path.
+
+    Raises:
+        ValueError: If the format is unknown.
+
+    Returns:
+        List[Dict[str, str]]: One entry per device.
+    """
+    if isinstance(manifest, (str, os.PathLike)):
+        if format is None:
+            format = os.path.splitext(os.fspath(manifest))[1].lstrip(".")
+        with open(manifest, newline="", encoding="utf-8") as f:
+            return read_manifest(f, format)
+    if format is None:
+        raise ValueError("format is required for a stream.")
+
+    format = format.lower()
+    if format == "json":
+        entries = json.load(manifest)
+        if not isinstance(entries, list):
+            raise ValueError("A JSON manifest should be a list of devices.")
+        return entries
+    if format == "csv":
+        return list(csv.DictReader(manifest))
+    raise ValueError(f"Unknown manifest format: {format}")
+
+
+class DeviceRegistry:
+    def __init__(
+        self, authenticator: Union["WebAPIAuth", "CognitoAuth", "APIKeyPool"]
+    ) -> None:
+        """A set of devices sharing an authenticator, indexed by UUID.
+
+        Devices are created without any network I/O; sync them in bulk with
+        `SesameCloud.syncMechStatuses` or `AWSIoT.syncShadows`.
+
+        With an `APIKeyPool`, each device is assigned to one of its keys; the
+        `key_name` field of the manifest pins a device to a key.
+
+        Args:
+            authenticator (Union[WebAPIAuth, CognitoAuth, APIKeyPool]): The authenticator for the devices.
+        """
+        self._authenticator = authenticator
+        self._devices: Dict[str, "SesameLocker"] = {}
+        self._metadata: Dict[str, Dict[str, str]] = {}
+
+    @classmethod
+    def fromManifest(
+        cls,
+        authenticator: Union["WebAPIAuth", "CognitoAuth", "APIKeyPool"],
+        manifest: Union[str, os.PathLike, IO[str]],
+        format: Optional[str] = None,
+    ) -> "DeviceRegistry":
+        """Create a registry from a manifest file.
+
+        Args:
+            authenticator (Union[WebAPIAuth, CognitoAuth, APIKeyPool]): The authenticator for the devices.
+            manifest (Union[str, os.PathLike, IO[str]]): A path or a text stream.
+            format (Optional[str], optional): `json` or `csv`. Defaults to the extension of the path.
+
+        Returns:
+            DeviceRegistry: The registry.
+        """
+        registry = cls(authenticator)
+        registry.load(manifest, format)
+        return registry
+
+    @property
+    def devices(self) -> List["SesameLocker"]:
+        return list(self._devices.values())
+
+    def __len__(self) -> int:
+        return len(self._devices)
+
+    def __iter__(self) -> Iterator["SesameLocker"]:
+        return iter(list(self._devices.values()))
+
+    def __contains__(self, device_uuid: object) -> bool:
+        return isinstance(device_uuid, str) and device_uuid.upper() in self._devices
+
+    def get(self, device_uuid: str) -> Optional["SesameLocker"]:
+        """Return a device by its UUID.
+
+        Args:
+            device_uuid (str): The UUID of the device, in any case.
+
+        Returns:
+            Optional[SesameLocker]: The device, `None` if it is not registered.
+        """
+        return self._devices.get(device_uuid.upper())
+
+    def getMetadata(self, device_uuid: str) -> Dict[str, str]:
+        """Return the extra columns of a device in the manifest.
+
+        Args:
+            device_uuid (str): The UUID of the device, in any case.
+
+        Returns:
+            Dict[str, str]: The extra columns, such as a name.
+        """
+        return dict(self._metadata.get(device_uuid.upper(), {}))
+
+    def getByModel(self, model: CHProductModel) -> List["SesameLocker"]:
+        """Return the devices of a product model.
+
+        Args:
+            model (CHProductModel): The product model.
+
+        Returns:
+            List[SesameLocker]: The devices.
+        """
+        return [d for d in self._devices.values() if d.productModel == model]
+
+    def add(
+        self,
+        device_uuid: str,
+        secret_key: str,
+        model: Union[CHProductModel, str, int],
+        **metadata: str,
+    ) -> "SesameLocker":
+        """Create and register a device.
+
+        Args:
+            device_uuid (str): The UUID of the device.
+            secret_key (str): The secret key of the device.
+            model (Union[CHProductModel, str, int]): The product model, see `parse_model`.
+            **metadata (str): Extra information to keep with the device.
+
+        Raises:
+            ValueError: If the device is already registered.
+            NotImplementedError: If the model is not supported.
+
+        Returns:
+            SesameLocker: The device.
+        """
+        product_model = parse_model(model)
+        factory = product_model.deviceFactory()
+        key = str(uuid.UUID(device_uuid)).upper()
+        if key in self._devices:
+            # Before a key of an `APIKeyPool` is assigned to it
+            raise ValueError(f"Duplicate device: {key}")
+
+        authenticator = self._authenticator
+        if isinstance(authenticator, APIKeyPool):
+            authenticator = authenticator.assign(key, metadata.get("key_name"))
+        device = factory(
+            authenticator=authenticator,
+            device_uuid=key,
+            secret_key=secret_key,
+            initial_sync=False,
+        )
+        if product_model != device.productModel:
+            # `CHSesame2` handles both SESAME 3 and SESAME 4
+            device.setProductModel(product_model)
+
+        self._devices[key] = device
+        self._metadata[key] = metadata
+        return device
+
+    def load(
+        self,
+        manifest: Union[str, os.PathLike, IO[str]],
+        format: Optional[str] = None,
+    ) -> List["SesameLocker"]:
+        """Register every device of a manifest.
+
+        Args:
+            manifest (Union[str, os.PathLike, IO[str]]): A path or a text stream, see `read_manifest`.
+            format (Optional[str], optional): `json` or `csv`. Defaults to the extension of the path.
+
+        Raises:
+            ValueError: If the format is unknown or an entry is invalid.
+
+        Returns:
+            List[SesameLocker]: The devices of the manifest.
+        """
+        return self.addEntries(read_manifest(manifest, format))
+
+    def addEntries(self, entries: Iterable[Dict[str, str]]) -> List["SesameLocker"]:
+        """Register the devices of entries read by `read_manifest`.
+
+        Args:
+            entries (Iterable[Dict[str, str]]): The entries.
+
+        Raises:
+            ValueError: If an entry is invalid.
+
+        Returns:
+            List[SesameLocker]: The devices of the entries.
+        """
+        devices = []
+        for line, entry in enumerate(entries, 1):
+            try:
+                metadata = {k: v for k, v in entry.items() if k not in MANIFEST_FIELDS}
+                devices.append(
+                    self.add(
+                        entry["uuid"], entry["secret_key"], entry["model"], **metadata
+                    )
+                )
+            except KeyError as err:
+                raise ValueError(f"Entry {line}: missing field {err}")
+        logger.debug("Registered {} devices".format(len(devices)))
+        return devices
+
+    def __str__(self) -> str:
+        return f"DeviceRegistry(devices={len(self._devices)})"
@@ -0,0 +1,515 @@
+import hashlib
+import itertools
+import logging
+import multiprocessing
+import multiprocessing.connection
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import IO, TYPE_CHECKING, Callable, Dict, List, NamedTuple, Optional, Union
+
+from .const import CHSesame2ShadowStatus
+from .registry import DeviceRegistry, read_manifest
+
+if TYPE_CHECKING:
+    from .auth import CognitoAuth, WebAPIAuth
+    from .device import SesameLocker
+    from .helper import CHSesameProtocolMechStatus
+
+logger = logging.getLogger(__name__)
+
+
+def shard_for(device_uuid: str, shards: int) -> int:
+    """Return the shard of a device.
+
+    The hash does not depend on the process, so every process agrees on it.
+
+    Args:
+        device_uuid (str): The UUID of the device.
+        shards (int): The number of shards.
+
+    Returns:
+        int: The shard, from 0 to `shards - 1`.
+    """
+    digest = hashlib.md5(device_uuid.upper().encode()).digest()
+    return int.from_bytes(digest[:8], "big") % shards
+
+
+def split_manifest(
+    entries: List[Dict[str, str]], shards: int
+) -> List[List[Dict[str, str]]]:
+    """Split the entries of a manifest by the hash of their UUID.
+
+    Args:
+        entries (List[Dict[str, str]]): Entries read by `read_manifest`.
+        shards (int): The number of shards.
+
+    Raises:
+        ValueError: If an entry has no `uuid`.
+
+    Returns:
+        List[List[Dict[str, str]]]: The entries of each shard.
+    """
+    split: List[List[Dict[str, str]]] = [[] for _ in range(shards)]
+    for line, entry in enumerate(entries, 1):
+        if "uuid" not in entry:
+            raise ValueError(f"Entry {line}: missing field 'uuid'")
+        split[shard_for(entry["uuid"], shards)].append(entry)
+    return split
+
+
+class StatusEvent(NamedTuple):
+    """A status reported by a device of a worker process.
+
+    Attributes:
+        shard (int): The worker that reported it.
+        deviceId (str): The UUID of the device.
+        status (CHSesameProtocolMechStatus): The mechanical status.
+        shadowStatus (Optional[CHSesame2ShadowStatus]): The lock state of the device.
+        receivedAt (float): UNIX timestamp at which the worker received it.
+    """
+
+    shard: int
+    deviceId: str
+    status: "CHSesameProtocolMechStatus"
+    shadowStatus: Optional[CHSesame2ShadowStatus]
+    receivedAt: float
+
+
+class CommandResult:
+    """The result of a command run by a worker process.
+
+    Attributes:
+        shard (int): The worker that ran it.
+        deviceId (str): The UUID of the device.
+        command (str): The name of the command, such as `lock`.
+        success (bool): `True` if the command succeeded.
+        latency (float): Seconds spent on the command in the worker.
+        error (Optional[str]): The error raised by the command, if any.
+    """
+
+    def __init__(
+        self,
+        shard: int,
+        deviceId: str,
+        command: str,
+        success: bool,
+        latency: float,
+        error: Optional[str] = None,
+    ) -> None:
+        self.shard = shard
+        self.deviceId = deviceId
+        self.command = command
+        self.success = success
+        self.latency = latency
+        self.error = error
+
+    def __str__(self) -> str:
+        return f"CommandResult(shard={self.shard}, deviceUUID={self.deviceId}, command={self.command}, success={self.success}, latency={self.latency:.3f}, error={self.error})"
+
+
+# Messages from the workers: (kind, shard, payload)
+_READY = "ready"
+_STATUS = "status"
+_RESULT = "result"
+_STOPPED = "stopped"
+
+
+def _run_worker(
+    shard: int,
+    authenticator_factory: Callable[[], Union["WebAPIAuth", "CognitoAuth"]],
+    entries: List[Dict[str, str]],
+    subscribe: bool,
+    callback: Optional[Callable[["SesameLocker", "CHSesameProtocolMechStatus"], None]],
+    commands: "multiprocessing.Queue",
+    events: "multiprocessing.connection.Connection",
+) -> None:
+    # A pipe of its own, so that a worker killed while sending does not
+    # leave a lock held for the others; sent from several threads
+    lock = threading.Lock()
+
+    def _post(message: tuple) -> None:
+        with lock:
+            events.send(message)
+
+    def _forward(device: "SesameLocker", status: "CHSesameProtocolMechStatus") -> None:
+        event = StatusEvent(
+            shard,
+            device.getDeviceUUID(),
+            status,
+            device.snapshot.shadowStatus,
+            time.time(),
+        )
+        _post((_STATUS, shard, event))
+
+    authenticator = None
+    try:
+        authenticator = authenticator_factory()
+        registry = DeviceRegistry(authenticator)
+        registry.addEntries(entries)
+        for device in registry:
+            device.addStatusListener(_forward)
+            if subscribe:
+                device.subscribeMechStatus(callback)
+    except Exception as err:
+        if authenticator is not None:
+            authenticator.close()
+        _post((_READY, shard, repr(err)))
+        return
+    _post((_READY, shard, None))
+
+    try:
+        while True:
+            request = commands.get()
+            if request is None:
+                break
+            request_id, device_uuid, command, history_tag = request
+            started = time.monotonic()
+            try:
+                device = registry.get(device_uuid)
+                if device is None:
+                    raise KeyError(f"Unknown device: {device_uuid}")
+                method = getattr(device, command, None)
+                if not callable(method):
+                    raise NotImplementedError(
+                        f"{type(device).__name__} does not support {command}."
+                    )
+                success = bool(method() if history_tag is None else method(history_tag))
+                error = None
+            except Exception as err:
+                success = False
+                error = repr(err)
+            result = CommandResult(
+                shard,
+                device_uuid.upper(),
+                command,
+                success,
+                time.monotonic() - started,
+                error,
+            )
+            _post((_RESULT, request_id, result))
+    finally:
+        authenticator.close()
+        _post((_STOPPED, shard, None))
+
+
+class ShardedRunner:
+    def __init__(
+        self,
+        authenticator_factory: Callable[[], Union["WebAPIAuth", "CognitoAuth"]],
+        manifest: Union[str, os.PathLike, IO[str], List[Dict[str, str]]],
+        processes: Optional[int] = None,
+        format: Optional[str] = None,
+        subscribe: bool = True,
+        callback: Optional[
+            Callable[["SesameLocker", "CHSesameProtocolMechStatus"], None]
+        ] = None,
+        mp_context: Optional[str] = "spawn",
+    ) -> None:
+        """Run the devices of a manifest in several worker processes.
+
+        Devices are split across the workers by the hash of their UUID. Each
+        worker creates its own authenticator, and so its own connection to
+        the AWS IoT, and runs `callback` for its devices in its own
+        interpreter. The supervisor (this object) receives every status and
+        command result over a pipe of each worker, so throughput grows with
+        the number of cores instead of being bound by one GIL. A worker that
+        dies fails its pending commands.
+
+        `authenticator_factory` and `callback` are sent to the workers, so
+        they must be picklable, e.g. `functools.partial(CognitoAuth, apikey)`
+        and a module-level function.
+
+        Args:
+            authenticator_factory (Callable[[], Union[WebAPIAuth, CognitoAuth]]): Creates the authenticator of a worker.
+            manifest (Union[str, os.PathLike, IO[str], List[Dict[str, str]]]): A manifest, see `read_manifest`, or its entries.
+            processes (Optional[int], optional): The number of workers. Defaults to the number of CPUs.
+            format (Optional[str], optional): The format of the manifest. Defaults to the extension of the path.
+            subscribe (bool, optional): Subscribe every device to the AWS IoT. Defaults to `True`.
+            callback (Optional[Callable[[SesameLocker, CHSesameProtocolMechStatus], None]], optional): Called in the worker for every update delivered by the AWS IoT. Defaults to `None`.
+            mp_context (Optional[str], optional): The multiprocessing start method. Defaults to `spawn`.
+
+        Raises:
+            ValueError: If `processes` is less than 1 or the manifest is invalid.
+        """
+        if processes is None:
+            processes = os.cpu_count() or 1
+        if processes < 1:
+            raise ValueError("processes should be 1 or more.")
+        entries = (
+            manifest if isinstance(manifest, list) else read_manifest(manifest, format)
+        )
+
+        self._processes = processes
+        self._shards = split_manifest(entries, processes)
+        self._authenticator_factory = authenticator_factory
+        self._subscribe = subscribe
+        self._callback = callback
+        self._context = multiprocessing.get_context(mp_context)
+
+        self._commands: List["multiprocessing.Queue"] = []
+        self._events: List["multiprocessing.connection.Connection"] = []
+        self._workers: List[multiprocessing.process.BaseProcess] = []
+        self._collector: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._ready: "queue.Queue[tuple]" = queue.Queue()
+        self._running: set = set()
+        self._started: set = set()
+        self._futures: Dict[int, "Future[CommandResult]"] = {}
+        self._futureShards: Dict[int, int] = {}
+        self._requestIds = itertools.count()
+        self._listeners: List[Callable[[StatusEvent], None]] = []
+
+    @property
+    def processes(self) -> int:
+        return self._processes
+
+    def getShardSizes(self) -> List[int]:
+        """Return the number of devices of each worker.
+
+        Returns:
+            List[int]: The number of devices, by shard.
+        """
+        return [len(entries) for entries in self._shards]
+
+    def shardOf(self, device_uuid: str) -> int:
+        return shard_for(device_uuid, self._processes)
+
+    def addStatusListener(self, listener: Callable[[StatusEvent], None]) -> None:
+        """Register a listener called in this process with every `StatusEvent`.
+
+        Listeners run on the thread collecting the events; an exception
+        raised by one is logged and does not affect the others.
+
+        Args:
+            listener (Callable[[StatusEvent], None]): The listener.
+
+        Raises:
+            TypeError: If `listener` is not callable.
+        """
+        if not callable(listener):
+            raise TypeError("listener should be callable.")
+        self._listeners.append(listener)
+
+    def removeStatusListener(self, listener: Callable[[StatusEvent], None]) -> None:
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def start(self, timeout: Optional[float] = 60.0) -> None:
+        """Start the workers and wait until all of them are ready.
+
+        Args:
+            timeout (Optional[float], optional): Seconds to wait for the workers. Defaults to `60`.
+
+        Raises:
+            RuntimeError: If a worker failed to start or did not start in time.
+        """
+        for shard, entries in enumerate(self._shards):
+            commands = self._context.Queue()
+            events, sender = self._context.Pipe(duplex=False)
+            worker = self._context.Process(
+                target=_run_worker,
+                args=(
+                    shard,
+                    self._authenticator_factory,
+                    entries,
+                    self._subscribe,
+                    self._callback,
+                    commands,
+                    sender,
+                ),
+                name=f"pysesame3-shard-{shard}",
+                daemon=True,
+            )
+            worker.start()
+            sender.close()
+            self._commands.append(commands)
+            self._events.append(events)
+            self._workers.append(worker)
+        self._collector = threading.Thread(
+            target=self._collect, name="pysesame3-supervisor", daemon=True
+        )
+        self._collector.start()
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        errors = []
+        for _ in self._workers:
+            try:
+                remaining = (
+                    None if deadline is None else max(0, deadline - time.monotonic())
+                )
+                shard, error = self._ready.get(timeout=remaining)
+            except queue.Empty:
+                errors.append("timed out")
+                break
+            if error is not None:
+                errors.append(f"shard {shard}: {error}")
+        if errors:
+            self.stop()
+            raise RuntimeError("Failed to start the workers: {}".format(errors))
+        logger.debug("Started {} workers".format(len(self._workers)))
+
+    def send(
+        self, device_uuid: str, command: str, history_tag: Optional[str] = None
+    ) -> "Future[CommandResult]":
+        """Run a command on a device, in the worker of the device.
+
+        Args:
+            device_uuid (str): The UUID of the device.
+            command (str): A method name of the device such as `lock`, `unlock`, `click` or `fetchMechStatus`.
+            history_tag (Optional[str], optional): Passed to the method if given. Defaults to `None`.
+
+        Raises:
+            RuntimeError: If the runner is not running, or the worker of the device died.
+
+        Returns:
+            Future[CommandResult]: The result. Errors are reported in the result, not raised; it fails with `RuntimeError` if the worker dies first.
+        """
+        future: "Future[CommandResult]" = Future()
+        with self._lock:
+            shard = self.shardOf(device_uuid)
+            if shard not in self._running:
+                raise RuntimeError("The runner is not running.")
+            request_id = next(self._requestIds)
+            self._futures[request_id] = future
+            self._futureShards[request_id] = shard
+        self._commands[shard].put((request_id, device_uuid, command, history_tag))
+        return future
+
+    def lock(
+        self, device_uuid: str, history_tag: str = "pysesame3"
+    ) -> "Future[CommandResult]":
+        return self.send(device_uuid, "lock", history_tag)
+
+    def unlock(
+        self, device_uuid: str, history_tag: str = "pysesame3"
+    ) -> "Future[CommandResult]":
+        return self.send(device_uuid, "unlock", history_tag)
+
+    def click(
+        self, device_uuid: str, history_tag: str = "pysesame3"
+    ) -> "Future[CommandResult]":
+        return self.send(device_uuid, "click", history_tag)
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Stop the workers, after they finish the commands already sent.
+
+        Workers still running after `timeout` are terminated, and their
+        pending commands fail with `RuntimeError`.
+
+        Args:
+            timeout (float, optional): Seconds to wait for the workers. Defaults to `10`.
+        """
+        for commands in self._commands:
+            commands.put(None)
+        deadline = time.monotonic() + timeout
+        for worker in self._workers:
+            worker.join(max(0, deadline - time.monotonic()))
+            if worker.is_alive():
+                logger.warning("Terminating {}".format(worker.name))
+                worker.terminate()
+                worker.join()
+        if self._collector is not None:
+            # It returns once it has read the last events of every worker
+            self._collector.join(timeout)
+
+        with self._lock:
+            self._running.clear()
+            futures, self._futures = self._futures, {}
+            self._futureShards.clear()
+        for future in futures.values():
+            future.set_exception(RuntimeError("The runner stopped."))
+
+    def __enter__(self) -> "ShardedRunner":
+        self.start()
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.stop()
+
+    def _collect(self) -> None:
+        events = {conn: shard for shard, conn in enumerate(self._events)}
+        sentinels = {w.sentinel: shard for shard, w in enumerate(self._workers)}
+        while sentinels:
+            for ready in multiprocessing.connection.wait(
+                list(events) + list(sentinels)
+            ):
+                if ready in sentinels:
+                    shard = sentinels.pop(ready)
+                    # Everything it sent before exiting is already in the pipe
+                    conn = self._events[shard]
+                    while conn in events and conn.poll():
+                        self._receive(conn, events)
+                    events.pop(conn, None)
+                    conn.close()
+                    self._onWorkerExited(shard)
+                elif ready in events:
+                    self._receive(ready, events)
+
+    def _receive(
+        self,
+        conn: "multiprocessing.connection.Connection",
+        events: Dict["multiprocessing.connection.Connection", int],
+    ) -> None:
+        try:
+            kind, key, payload = conn.recv()
+        except (EOFError, OSError):
+            # Closed, or cut short by a worker killed while sending
+            events.pop(conn, None)
+            return
+        if kind == _STATUS:
+            for listener in list(self._listeners):
+                try:
+                    listener(payload)
+                except Exception:
+                    logger.exception("Status listener failed")
+        elif kind == _RESULT:
+            with self._lock:
+                future = self._futures.pop(key, None)
+                self._futureShards.pop(key, None)
+            if future is not None:
+                future.set_result(payload)
+        elif kind == _READY:
+            with self._lock:
+                self._started.add(key)
+                if payload is None:
+                    self._running.add(key)
+            self._ready.put((key, payload))
+        elif kind == _STOPPED:
+            with self._lock:
+                self._running.discard(key)
+
+    def _onWorkerExited(self, shard: int) -> None:
+        exitcode = self._workers[shard].exitcode
+        with self._lock:
+            # Still running unless it was stopped: it died
+            died = shard in self._running
+            self._running.discard(shard)
+            started = shard in self._started
+            request_ids = [
+                request_id
+                for request_id, owner in self._futureShards.items()
+                if owner == shard
+            ]
+            futures = [self._futures.pop(request_id) for request_id in request_ids]
+            for request_id in request_ids:
+                del self._futureShards[request_id]
+        if died:
+            logger.error(
+                "Worker of shard {} exited with code {}".format(shard, exitcode)
+            )
+        for future in futures:
+            future.set_exception(
+                RuntimeError(
+                    "The worker of shard {} exited with code {}.".format(
+                        shard, exitcode
+                    )
+                )
+            )
+        if not started:
+            self._ready.put((shard, "exited with code {}".format(exitcode)))
+
+    def __str__(self) -> str:
+        return f"ShardedRunner(processes={self._processes}, devices={sum(self.getShardSizes())})"
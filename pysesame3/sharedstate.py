@@ -0,0 +1,341 @@
+import logging
+import struct
+import threading
+import time
+import uuid
+from typing import TYPE_CHECKING, Dict, List, NamedTuple, Optional, Union
+
+try:
+    from multiprocessing import resource_tracker, shared_memory
+except ImportError:  # pragma: no cover
+    shared_memory = None
+
+from .const import CHSesame2ShadowStatus
+from .fleetstate import (
+    _SHADOW_STATUSES,
+    FLAG_BATTERY_CRITICAL,
+    FLAG_KNOWN,
+    FLAG_LOCK_RANGE,
+    FLAG_UNLOCK_RANGE,
+    FleetStateTable,
+    _uuid_bytes,
+)
+from .helper import CHProductModel
+
+if TYPE_CHECKING:
+    from .device import SesameLocker
+    from .helper import CHSesameProtocolMechStatus
+
+logger = logging.getLogger(__name__)
+
+# Layout of the segment, little-endian:
+# header: magic (4s), layout version (u8), pad, record size (u16), capacity (u32), count (u32)
+# record: sequence (u32), uuid (16s), model (u8), flags (u8), shadow (u8), pad,
+#         voltage (f32), position (s16), pad, updatedAt (f64)
+_MAGIC = b"PSS3"
+_LAYOUT_VERSION = 1
+_HEADER = struct.Struct("<4sBxHII")
+_COUNT = struct.Struct("<I")
+_COUNT_OFFSET = 12
+_SEQUENCE = struct.Struct("<I")
+_RECORD = struct.Struct("<I16sBBBxfhxxd")
+_PAYLOAD = struct.Struct("<BBBxfhxxd")
+_PAYLOAD_OFFSET = 20
+
+# A reader gives up after this many torn reads in a row.
+READ_RETRIES = 1000
+
+
+def _require_shared_memory() -> None:
+    if shared_memory is None:  # pragma: no cover
+        raise RuntimeError(
+            "Failed to load multiprocessing.shared_memory. It requires Python 3.8 or later."
+        )
+
+
+class SharedDeviceState(NamedTuple):
+    """A consistent copy of a device in a shared memory segment.
+
+    Attributes:
+        deviceId (str): The UUID of the device.
+        productModel (CHProductModel): The product model.
+        batteryVoltage (float): The battery voltage.
+        position (int): The position, or the motor status of a SESAME bot.
+        isInLockRange (bool): Whether the device is locked.
+        isInUnlockRange (bool): Whether the device is unlocked.
+        isBatteryCritical (bool): Whether the battery is critical.
+        shadowStatus (Optional[CHSesame2ShadowStatus]): The (assumed) lock state.
+        updatedAt (Optional[float]): UNIX timestamp of the last update, `None` if the status is unknown.
+        sequence (int): Incremented twice by every write.
+    """
+
+    deviceId: str
+    productModel: CHProductModel
+    batteryVoltage: float
+    position: int
+    isInLockRange: bool
+    isInUnlockRange: bool
+    isBatteryCritical: bool
+    shadowStatus: Optional[CHSesame2ShadowStatus]
+    updatedAt: Optional[float]
+    sequence: int
+
+
+class SharedStatePublisher:
+    def __init__(
+        self,
+        table: FleetStateTable,
+        name: Optional[str] = None,
+        capacity: int = 1024,
+    ) -> None:
+        """Publish the rows of a `FleetStateTable` to a shared memory segment.
+
+        Meant for the one process holding the AWS IoT subscriptions; other
+        processes open the segment with `SharedStateReader`. Each record is
+        guarded by a sequence number (a seqlock): it is odd while the record
+        is written, so a reader retries instead of returning a torn record.
+        There must be a single publisher per segment; within it, writes from
+        several threads are serialized.
+
+        Args:
+            table (FleetStateTable): The table to publish.
+            name (Optional[str], optional): The name of the segment. Defaults to a random name.
+            capacity (int, optional): The maximum number of devices. Defaults to 1024.
+
+        Raises:
+            RuntimeError: If `multiprocessing.shared_memory` is not available.
+            ValueError: If `capacity` is not positive.
+        """
+        _require_shared_memory()
+        if capacity < 1:
+            raise ValueError("capacity must be positive.")
+
+        self._table = table
+        self._capacity = capacity
+        self._count = 0
+        self._lock = threading.Lock()
+        self._shm = shared_memory.SharedMemory(
+            name=name, create=True, size=_HEADER.size + capacity * _RECORD.size
+        )
+        self._buf = self._shm.buf
+        _HEADER.pack_into(
+            self._buf, 0, _MAGIC, _LAYOUT_VERSION, _RECORD.size, capacity, 0
+        )
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    def publish(self, device_uuid: Union[uuid.UUID, str]) -> None:
+        """Copy the row of a device to the segment.
+
+        Args:
+            device_uuid (Union[uuid.UUID, str]): The UUID of the device.
+
+        Raises:
+            KeyError: If the device is not in the table.
+            ValueError: If the segment is full.
+        """
+        row = self._table.row(device_uuid)
+        with self._lock:
+            self._publishRow(row)
+
+    def publishAll(self) -> None:
+        """Copy every row of the table to the segment.
+
+        Raises:
+            ValueError: If the segment is full.
+        """
+        with self._lock:
+            for row in range(len(self._table)):
+                self._publishRow(row)
+
+    def attach(self, device: "SesameLocker") -> None:
+        """Publish every status of a device.
+
+        The device is attached to the table first, see `FleetStateTable.attach`.
+
+        Args:
+            device (SesameLocker): The device.
+        """
+        self._table.attach(device)
+        device.addStatusListener(self._onStatus)
+        self.publish(device.getDeviceUUID())
+
+    def detach(self, device: "SesameLocker") -> None:
+        """Stop publishing the statuses of a device.
+
+        Args:
+            device (SesameLocker): The device.
+        """
+        device.removeStatusListener(self._onStatus)
+        self._table.detach(device)
+
+    def close(self) -> None:
+        """Remove the segment. Readers keep their mapping until they close."""
+        self._buf = None
+        self._shm.close()
+        self._shm.unlink()
+
+    def __enter__(self) -> "SharedStatePublisher":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    def _onStatus(
+        self, device: "SesameLocker", status: "CHSesameProtocolMechStatus"
+    ) -> None:
+        self.publish(device.getDeviceUUID())
+
+    def _publishRow(self, row: int) -> None:
+        if row >= self._capacity:
+            raise ValueError(f"The segment is full, capacity={self._capacity}")
+        for missing in range(self._count, row):
+            # Readers index rows up to the count, so they must all be written
+            self._publishRow(missing)
+        table = self._table
+        offset = _HEADER.size + row * _RECORD.size
+        buf = self._buf
+        (sequence,) = _SEQUENCE.unpack_from(buf, offset)
+
+        _SEQUENCE.pack_into(buf, offset, sequence + 1)
+        if row >= self._count:
+            start = row * 16
+            buf[offset + 4 : offset + 20] = table._uuids[start : start + 16]
+        _PAYLOAD.pack_into(
+            buf,
+            offset + _PAYLOAD_OFFSET,
+            table.model[row],
+            table.flags[row],
+            table.shadow[row],
+            table.voltage[row],
+            table.position[row],
+            table.updatedAt[row],
+        )
+        _SEQUENCE.pack_into(buf, offset, (sequence + 2) & 0xFFFFFFFF)
+
+        if row >= self._count:
+            # Rows are published in order, so readers see complete records only
+            self._count = row + 1
+            _COUNT.pack_into(buf, _COUNT_OFFSET, self._count)
+
+
+class SharedStateReader:
+    def __init__(self, name: str) -> None:
+        """Read the device states published by a `SharedStatePublisher`.
+
+        Reads copy a record out of the segment, without any IPC round trip
+        or cloud call.
+
+        Args:
+            name (str): The name of the segment.
+
+        Raises:
+            RuntimeError: If `multiprocessing.shared_memory` is not available.
+            ValueError: If the segment was not created by a `SharedStatePublisher`.
+        """
+        _require_shared_memory()
+        self._shm = shared_memory.SharedMemory(name=name)
+        try:
+            # Only the publisher removes the segment
+            resource_tracker.unregister(self._shm._name, "shared_memory")
+        except Exception:  # pragma: no cover
+            pass
+        self._buf = self._shm.buf
+
+        magic, version, record_size, capacity, _ = _HEADER.unpack_from(self._buf, 0)
+        if magic != _MAGIC or version != _LAYOUT_VERSION or record_size != _RECORD.size:
+            self.close()
+            raise ValueError(f"Unsupported shared memory segment: {name}")
+        self._capacity = capacity
+        self._index: Dict[bytes, int] = {}
+
+    def __len__(self) -> int:
+        return _COUNT.unpack_from(self._buf, _COUNT_OFFSET)[0]
+
+    def __contains__(self, device_uuid: Union[uuid.UUID, str]) -> bool:
+        return self._row(_uuid_bytes(device_uuid)) is not None
+
+    def devices(self) -> List[str]:
+        """Return the UUIDs of the published devices.
+
+        Returns:
+            List[str]: The UUIDs, in the order they were published.
+        """
+        self._refreshIndex()
+        return [str(uuid.UUID(bytes=key)).upper() for key in self._index]
+
+    def get(self, device_uuid: Union[uuid.UUID, str]) -> SharedDeviceState:
+        """Return a consistent copy of a device.
+
+        Args:
+            device_uuid (Union[uuid.UUID, str]): The UUID of the device.
+
+        Raises:
+            KeyError: If the device has not been published.
+            RuntimeError: If the record kept changing during `READ_RETRIES` reads.
+
+        Returns:
+            SharedDeviceState: The state of the device.
+        """
+        key = _uuid_bytes(device_uuid)
+        row = self._row(key)
+        if row is None:
+            raise KeyError(device_uuid)
+
+        offset = _HEADER.size + row * _RECORD.size
+        buf = self._buf
+        for _ in range(READ_RETRIES):
+            (before,) = _SEQUENCE.unpack_from(buf, offset)
+            if before & 1 == 0:
+                payload = _PAYLOAD.unpack_from(buf, offset + _PAYLOAD_OFFSET)
+                (after,) = _SEQUENCE.unpack_from(buf, offset)
+                if before == after:
+                    return self._toState(key, payload, after)
+            time.sleep(0)
+        raise RuntimeError(f"Failed to read a consistent record: {device_uuid}")
+
+    def close(self) -> None:
+        """Unmap the segment."""
+        self._buf = None
+        self._shm.close()
+
+    def __enter__(self) -> "SharedStateReader":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    def _row(self, key: bytes) -> Optional[int]:
+        row = self._index.get(key)
+        if row is None:
+            self._refreshIndex()
+            row = self._index.get(key)
+        return row
+
+    def _refreshIndex(self) -> None:
+        count = len(self)
+        for row in range(len(self._index), count):
+            offset = _HEADER.size + row * _RECORD.size + 4
+            self._index[bytes(self._buf[offset : offset + 16])] = row
+
+    @staticmethod
+    def _toState(key: bytes, payload: tuple, sequence: int) -> SharedDeviceState:
+        model, flags, shadow, voltage, position, updated_at = payload
+        return SharedDeviceState(
+            deviceId=str(uuid.UUID(bytes=key)).upper(),
+            productModel=CHProductModel.getByValue(model),
+            batteryVoltage=voltage,
+            position=position,
+            isInLockRange=flags & FLAG_LOCK_RANGE > 0,
+            isInUnlockRange=flags & FLAG_UNLOCK_RANGE > 0,
+            isBatteryCritical=flags & FLAG_BATTERY_CRITICAL > 0,
+            shadowStatus=_SHADOW_STATUSES.get(shadow),
+            updatedAt=updated_at if flags & FLAG_KNOWN else None,
+            sequence=sequence,
+        )
@@ -0,0 +1,124 @@
+import logging
+import threading
+import time
+from typing import TYPE_CHECKING, Callable, NamedTuple, Optional, Tuple
+
+from .const import CHSesame2ShadowStatus, StateSource
+
+if TYPE_CHECKING:
+    from .helper import CHSesameProtocolMechStatus
+
+logger = logging.getLogger(__name__)
+
+
+class DeviceSnapshot(NamedTuple):
+    """An immutable view of the state of a device.
+
+    Attributes:
+        shadowStatus (Optional[CHSesame2ShadowStatus]): The (assumed) lock state.
+        mechStatus (Optional[CHSesameProtocolMechStatus]): The last reported mechanical status.
+        source (Optional[StateSource]): Where the last write came from.
+        version (int): Incremented by every write.
+        receivedAt (Optional[float]): UNIX timestamp of the last write.
+        observedAt (Optional[float]): Monotonic time at which the data of the last write was current.
+    """
+
+    shadowStatus: Optional[CHSesame2ShadowStatus] = None
+    mechStatus: Optional["CHSesameProtocolMechStatus"] = None
+    source: Optional[StateSource] = None
+    version: int = 0
+    receivedAt: Optional[float] = None
+    observedAt: Optional[float] = None
+
+
+_UNCHANGED = object()
+
+
+class DeviceState:
+    def __init__(self, clock: Callable[[], float] = time.monotonic) -> None:
+        """The state of a device, shared by the AWS IoT thread and user threads.
+
+        Reads return the current snapshot without locking. Writes replace the
+        snapshot with compare-and-swap; the lock is held only for the swap, so
+        readers never block writers.
+
+        Args:
+            clock (Callable[[], float], optional): A monotonic clock. Defaults to `time.monotonic`.
+        """
+        self._clock = clock
+        self._snapshot = DeviceSnapshot()
+        self._swap_lock = threading.Lock()
+
+    @property
+    def snapshot(self) -> DeviceSnapshot:
+        return self._snapshot
+
+    @property
+    def version(self) -> int:
+        return self._snapshot.version
+
+    def now(self) -> float:
+        """Return the current time of the clock, to be passed as `observedAt`.
+
+        Returns:
+            float: The monotonic time.
+        """
+        return self._clock()
+
+    def compareAndSwap(self, expected: DeviceSnapshot, new: DeviceSnapshot) -> bool:
+        """Replace the snapshot if it is still `expected`.
+
+        Args:
+            expected (DeviceSnapshot): The snapshot the new one was derived from.
+            new (DeviceSnapshot): The new snapshot.
+
+        Returns:
+            bool: `True` if swapped, `False` if another write came first.
+        """
+        with self._swap_lock:
+            if self._snapshot is not expected:
+                return False
+            self._snapshot = new
+            return True
+
+    def update(
+        self,
+        source: StateSource,
+        shadowStatus=_UNCHANGED,
+        mechStatus=_UNCHANGED,
+        observedAt: Optional[float] = None,
+    ) -> Optional[Tuple[DeviceSnapshot, DeviceSnapshot]]:
+        """Write some fields, unless newer data was written in the meantime.
+
+        Data is stale if it was observed before the data of the current
+        snapshot, for example an HTTP response to a request sent before the
+        last AWS IoT update arrived.
+
+        Args:
+            source (StateSource): Where the data comes from.
+            shadowStatus (Optional[CHSesame2ShadowStatus], optional): The new lock state. Defaults to unchanged.
+            mechStatus (Optional[CHSesameProtocolMechStatus], optional): The new mechanical status. Defaults to unchanged.
+            observedAt (Optional[float], optional): When the data was current, from `now()`. Defaults to now.
+
+        Returns:
+            Optional[Tuple[DeviceSnapshot, DeviceSnapshot]]: The previous and the new snapshots, `None` if stale.
+        """
+        if observedAt is None:
+            observedAt = self._clock()
+        while True:
+            current = self._snapshot
+            if current.observedAt is not None and observedAt < current.observedAt:
+                logger.debug(
+                    "Stale {} write ignored, version={}".format(source, current.version)
+                )
+                return None
+            new = DeviceSnapshot(
+                current.shadowStatus if shadowStatus is _UNCHANGED else shadowStatus,
+                current.mechStatus if mechStatus is _UNCHANGED else mechStatus,
+                source,
+                current.version + 1,
+                time.time(),
+                observedAt,
+            )
+            if self.compareAndSwap(current, new):
+                return current, new
@@ -0,0 +1,356 @@
+import asyncio
+import logging
+import sys
+import threading
+from typing import Any, Dict, Optional, Set, Tuple
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover
+    pass
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+logger = logging.getLogger(__name__)
+
+# Requests which are safe to send again after a failed HTTP/2 connection
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+
+def _has_h2() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _to_requests_response(
+    response: "httpx.Response", request: requests.PreparedRequest
+) -> requests.Response:
+    """Wrap an `httpx.Response` into a `requests.Response`."""
+    result = requests.Response()
+    result.status_code = response.status_code
+    result.headers = CaseInsensitiveDict(response.headers)
+    result._content = response.content
+    result.encoding = response.charset_encoding
+    result.reason = response.reason_phrase
+    result.url = str(response.url)
+    result.request = request
+    return result
+
+
+class HTTP2Transport:
+    def __init__(
+        self,
+        http2: bool = True,
+        prior_knowledge: bool = False,
+        max_connections: int = 10,
+        timeout: float = 10.0,
+    ) -> None:
+        """Send the requests of `SesameCloud` with `httpx`, over HTTP/2.
+
+        Concurrent requests to the cloud are multiplexed as streams of one
+        connection, instead of taking one connection each. HTTP/1.1 is used
+        when the `h2` package is missing or the server does not offer
+        HTTP/2, and from then on once an HTTP/2 connection fails with a
+        protocol error; idempotent requests failed that way are sent again
+        over HTTP/1.1.
+
+        Set it with `SesameCloud.setTransport`. It serves both `requestAPI`
+        and `requestAPIAsync`.
+
+        Args:
+            http2 (bool, optional): `False` to use HTTP/1.1 only. Defaults to `True`.
+            prior_knowledge (bool, optional): Speak HTTP/2 without negotiating it, also over plain HTTP. Defaults to `False`.
+            max_connections (int, optional): The maximum number of connections. Defaults to `10`.
+            timeout (float, optional): Seconds to wait for a connection or a response. Defaults to `10`.
+
+        Raises:
+            RuntimeError: If `httpx` is not installed, or `h2` is not installed with `prior_knowledge`.
+            ValueError: If `prior_knowledge` is set without `http2`.
+        """
+        if "httpx" not in sys.modules:  # pragma: no cover
+            raise RuntimeError(
+                "Failed to load httpx. Did you run `pip install pysesame3[http2]`?"
+            )
+        if prior_knowledge and not http2:
+            raise ValueError("prior_knowledge requires http2.")
+        if http2 and not _has_h2():
+            if prior_knowledge:
+                raise RuntimeError(
+                    "Failed to load h2. Did you run `pip install pysesame3[http2]`?"
+                )
+            logger.warning("h2 is not installed, falling back to HTTP/1.1")
+            http2 = False
+
+        self._http2 = http2
+        self._priorKnowledge = prior_knowledge
+        self._limits = httpx.Limits(max_connections=max_connections)
+        self._timeout = timeout
+
+        self._lock = threading.Lock()
+        self._client: Optional["httpx.Client"] = None
+        self._asyncClient: Optional["httpx.AsyncClient"] = None
+        self._asyncLoop: Optional[asyncio.AbstractEventLoop] = None
+        self._closing: Set["asyncio.Task"] = set()
+        # Requests in flight by client, and the replaced clients they keep open
+        self._users: Dict[int, int] = {}
+        self._retired: Dict[int, Tuple[Any, Optional[asyncio.AbstractEventLoop]]] = {}
+
+        self.fallbacks = 0
+        # The number of responses by HTTP version, such as `HTTP/2`
+        self.versions: Dict[str, int] = {}
+
+    @property
+    def http2(self) -> bool:
+        """Return whether HTTP/2 is still in use.
+
+        Returns:
+            bool: `False` once the transport fell back to HTTP/1.1.
+        """
+        return self._http2
+
+    def send(self, request: requests.PreparedRequest) -> requests.Response:
+        """Send a request prepared by `requests`.
+
+        Args:
+            request (requests.PreparedRequest): The request, already authenticated.
+
+        Raises:
+            requests.exceptions.Timeout: If the server did not answer in time.
+            requests.exceptions.ConnectionError: If the request could not be sent.
+
+        Returns:
+            requests.Response: The server's response.
+        """
+        try:
+            response = self._send(request)
+        except httpx.TimeoutException as err:
+            raise requests.exceptions.Timeout(err, request=request)
+        except httpx.TransportError as err:
+            raise requests.exceptions.ConnectionError(err, request=request)
+
+        self._count(response)
+        return _to_requests_response(response, request)
+
+    async def sendAsync(self, request: requests.PreparedRequest) -> requests.Response:
+        """Send a request prepared by `requests` without blocking the event loop.
+
+        Args:
+            request (requests.PreparedRequest): The request, already authenticated.
+
+        Raises:
+            requests.exceptions.Timeout: If the server did not answer in time.
+            requests.exceptions.ConnectionError: If the request could not be sent.
+
+        Returns:
+            requests.Response: The server's response.
+        """
+        try:
+            response = await self._sendAsync(request)
+        except httpx.TimeoutException as err:
+            raise requests.exceptions.Timeout(err, request=request)
+        except httpx.TransportError as err:
+            raise requests.exceptions.ConnectionError(err, request=request)
+
+        self._count(response)
+        return _to_requests_response(response, request)
+
+    def close(self) -> None:
+        """Close the connections of `send`.
+
+        The connections of `sendAsync` are closed by `aclose`.
+        """
+        with self._lock:
+            client, self._client = self._client, None
+        if client is not None:
+            client.close()
+
+    async def aclose(self) -> None:
+        """Close all connections."""
+        self.close()
+        with self._lock:
+            client, self._asyncClient = self._asyncClient, None
+            self._asyncLoop = None
+        if client is not None:
+            await client.aclose()
+        closing = [f for f in self._closing if not f.done()]
+        if closing:
+            await asyncio.gather(*closing, return_exceptions=True)
+
+    def __enter__(self) -> "HTTP2Transport":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    async def __aenter__(self) -> "HTTP2Transport":
+        return self
+
+    async def __aexit__(self, *_) -> None:
+        await self.aclose()
+
+    def _options(self) -> dict:
+        return {
+            "http1": not self._priorKnowledge,
+            "http2": self._http2,
+            "limits": self._limits,
+            "timeout": self._timeout,
+        }
+
+    def _buildClient(self) -> "httpx.Client":
+        return httpx.Client(**self._options())
+
+    def _buildAsyncClient(self) -> "httpx.AsyncClient":
+        return httpx.AsyncClient(**self._options())
+
+    def _send(
+        self, request: requests.PreparedRequest, retry: bool = True
+    ) -> "httpx.Response":
+        client, http2 = self._getClient()
+        try:
+            return client.request(
+                request.method,
+                request.url,
+                headers=request.headers,
+                content=request.body,
+            )
+        except httpx.ProtocolError as err:
+            if not retry or not self._fallBack(http2, err, request):
+                raise
+        finally:
+            self._release(client)
+        return self._send(request, retry=False)
+
+    async def _sendAsync(
+        self, request: requests.PreparedRequest, retry: bool = True
+    ) -> "httpx.Response":
+        client, http2 = self._getAsyncClient()
+        try:
+            return await client.request(
+                request.method,
+                request.url,
+                headers=request.headers,
+                content=request.body,
+            )
+        except httpx.ProtocolError as err:
+            if not retry or not self._fallBack(http2, err, request):
+                raise
+        finally:
+            self._release(client)
+        return await self._sendAsync(request, retry=False)
+
+    def _getClient(self) -> Tuple["httpx.Client", bool]:
+        with self._lock:
+            if self._client is None:
+                self._client = self._buildClient()
+            self._acquireLocked(self._client)
+            return self._client, self._http2
+
+    def _getAsyncClient(self) -> Tuple["httpx.AsyncClient", bool]:
+        # An `httpx.AsyncClient` is bound to the event loop it was used on
+        loop = asyncio.get_running_loop()
+        stale = None
+        with self._lock:
+            if self._asyncClient is None or self._asyncLoop is not loop:
+                if self._asyncClient is not None:
+                    stale = self._retireLocked(self._asyncClient, self._asyncLoop)
+                self._asyncClient = self._buildAsyncClient()
+                self._asyncLoop = loop
+            self._acquireLocked(self._asyncClient)
+            result = self._asyncClient, self._http2
+        if stale is not None:
+            self._closeClient(*stale)
+        return result
+
+    def _fallBack(
+        self, http2: bool, err: Exception, request: requests.PreparedRequest
+    ) -> bool:
+        """Switch to HTTP/1.1, and return whether the request can be sent again."""
+        if not http2:
+            return False
+        stale = []
+        with self._lock:
+            if self._http2:
+                logger.warning(
+                    "HTTP/2 connection failed, falling back to HTTP/1.1: {}".format(err)
+                )
+                self._http2 = False
+                self._priorKnowledge = False
+                self.fallbacks += 1
+                if self._client is not None:
+                    stale.append(self._retireLocked(self._client, None))
+                if self._asyncClient is not None:
+                    stale.append(self._retireLocked(self._asyncClient, self._asyncLoop))
+                self._client = None
+                self._asyncClient = None
+                self._asyncLoop = None
+        for entry in stale:
+            if entry is not None:
+                self._closeClient(*entry)
+        return request.method in IDEMPOTENT_METHODS
+
+    def _acquireLocked(self, client: Any) -> None:
+        self._users[id(client)] = self._users.get(id(client), 0) + 1
+
+    def _release(self, client: Any) -> None:
+        stale = None
+        with self._lock:
+            users = self._users[id(client)] - 1
+            if users:
+                self._users[id(client)] = users
+            else:
+                del self._users[id(client)]
+                stale = self._retired.pop(id(client), None)
+        if stale is not None:
+            self._closeClient(*stale)
+
+    def _retireLocked(
+        self, client: Any, loop: Optional[asyncio.AbstractEventLoop]
+    ) -> Optional[Tuple[Any, Optional[asyncio.AbstractEventLoop]]]:
+        """Return a replaced client to close now, or keep it until its requests are done."""
+        if id(client) in self._users:
+            # Closing it would abort requests in flight, such as commands
+            self._retired[id(client)] = (client, loop)
+            return None
+        return client, loop
+
+    def _closeClient(
+        self, client: Any, loop: Optional[asyncio.AbstractEventLoop]
+    ) -> None:
+        if isinstance(client, httpx.AsyncClient):
+            self._closeAsyncClient(client, loop)
+        else:
+            client.close()
+
+    def _closeAsyncClient(
+        self,
+        client: "httpx.AsyncClient",
+        loop: Optional[asyncio.AbstractEventLoop],
+    ) -> None:
+        """Close a replaced `httpx.AsyncClient` on the event loop it was used on."""
+        try:
+            running: Optional[asyncio.AbstractEventLoop] = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if loop is not None and loop is running:
+            task = loop.create_task(client.aclose())
+            # Awaited by `aclose`, and kept referenced until then
+            self._closing.add(task)
+            task.add_done_callback(self._closing.discard)
+        elif loop is not None and loop.is_running():
+            asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+        else:
+            logger.warning(
+                "Could not close an HTTP client: its event loop is not running, call `aclose` before it ends"
+            )
+
+    def _count(self, response: "httpx.Response") -> None:
+        with self._lock:
+            version = response.http_version
+            self.versions[version] = self.versions.get(version, 0) + 1
+
+    def __str__(self) -> str:
+        return f"HTTP2Transport(http2={self._http2}, fallbacks={self.fallbacks}, versions={self.versions})"
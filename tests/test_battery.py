@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+
+"""Tests for `pysesame3` package."""
+
+import random
+
+import pytest
+import requests_mock
+
+from pysesame3.auth import WebAPIAuth
+from pysesame3.battery import BatteryHistory, BatteryMonitor, critical_voltage
+from pysesame3.chsesame2 import CHSesame2
+from pysesame3.chsesamebot import CHSesameBot
+from pysesame3.helper import CHProductModel, CHSesame2MechStatus
+
+from .utils import load_fixture
+
+DAY = 86400
+
+
+def _status(voltage):
+    return CHSesame2MechStatus.from_webapi(
+        {"batteryVoltage": voltage, "position": 0, "CHSesame2Status": "locked"}
+    )
+
+
+def _device(uuid):
+    return CHSesame2(
+        authenticator=WebAPIAuth(apikey="FAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKE"),
+        device_uuid=uuid,
+        secret_key="0b3e5f1665e143b59180c915fa4b06d9",
+        initial_sync=False,
+    )
+
+
+class TestBatteryHistory:
+    def test_BatteryHistory_raises_exception_on_invalid_maxlen(self):
+        with pytest.raises(ValueError):
+            BatteryHistory(maxlen=1)
+
+    def test_BatteryHistory_forecast(self):
+        history = BatteryHistory(maxlen=10, critical_voltage=4.6)
+        assert history.getSlope() is None
+        assert history.getDaysUntilCritical() is None
+
+        # 5.6V, losing 0.01V per day
+        for day in range(5):
+            history.append(5.6 - 0.01 * day, 1600000000 + day * DAY)
+
+        assert len(history) == 5
+        assert history.latest == (1600000000 + 4 * DAY, pytest.approx(5.56))
+        assert history.getSlope() == pytest.approx(-0.01)
+        assert history.getDaysUntilCritical() == pytest.approx(96)
+
+    def test_BatteryHistory_evicts_oldest_samples(self):
+        history = BatteryHistory(maxlen=3)
+
+        for day in range(10):
+            # Discharging fast at first, then flat
+            history.append(5.0 if day >= 5 else 6.0 - 0.1 * day, day * DAY)
+
+        assert [t for t, _ in history.samples] == [7 * DAY, 8 * DAY, 9 * DAY]
+        assert history.getSlope() == pytest.approx(0.0, abs=1e-9)
+        assert history.getDaysUntilCritical() is None
+
+    def test_BatteryHistory_matches_batch_fit(self):
+        history = BatteryHistory(maxlen=50)
+        rng = random.Random(0)
+
+        for i in range(1000):
+            history.append(6.0 - 0.002 * i + rng.uniform(-0.02, 0.02), i * 3600.0)
+
+        samples = history.samples
+        n = len(samples)
+        mean_x = sum(t for t, _ in samples) / n
+        mean_y = sum(v for _, v in samples) / n
+        expected = sum((t - mean_x) * (v - mean_y) for t, v in samples) / sum(
+            (t - mean_x) ** 2 for t, _ in samples
+        )
+        assert history.getSlope() == pytest.approx(expected * DAY)
+
+    def test_BatteryHistory_already_critical(self):
+        history = BatteryHistory(critical_voltage=4.6)
+        history.append(4.7, 0)
+        history.append(4.5, DAY)
+
+        assert history.getDaysUntilCritical() == 0
+
+
+class TestBatteryMonitor:
+    def test_critical_voltage(self):
+        assert critical_voltage(CHProductModel.SS2, 5.8) == 4.6
+        assert critical_voltage(CHProductModel.SesameBot1, 2.9) == 2.3
+        assert critical_voltage(CHProductModel.SesameBot1, 5.8) == 4.6
+
+    def test_BatteryMonitor_report(self):
+        clock = [0.0]
+        monitor = BatteryMonitor(maxlen=10, clock=lambda: clock[0])
+        slow = _device("126d3d66-9222-4e5a-bcde-0c6629d48d43")
+        fast = _device("e0e56521-63d8-4da5-ba4b-c4a6a5e353f1")
+        flat = _device("e0e56521-63d8-4da5-ba4b-c4a6a5e353f2")
+        for device in (slow, fast, flat):
+            monitor.track(device)
+        assert monitor.report() == []
+
+        for day in range(3):
+            clock[0] = day * DAY
+            slow._notifyStatusListeners(_status(5.6 - 0.01 * day))
+            fast._notifyStatusListeners(_status(5.6 - 0.1 * day))
+            flat._notifyStatusListeners(_status(5.6))
+
+        report = monitor.report()
+        assert [f.device for f in report] == [fast, slow, flat]
+        assert report[0].daysUntilCritical == pytest.approx(8)
+        assert report[0].voltage == pytest.approx(5.4)
+        assert report[0].slope == pytest.approx(-0.1)
+        assert report[2].daysUntilCritical is None
+        assert "BatteryForecast(deviceUUID=E0E56521" in str(report[0])
+
+        monitor.untrack(fast)
+        fast._notifyStatusListeners(_status(5.0))
+        assert monitor.getHistory(fast) is None
+        assert [f.device for f in monitor.report()] == [slow, flat]
+
+    def test_BatteryMonitor_records_polls(self):
+        monitor = BatteryMonitor()
+        device = _device("126d3d66-9222-4e5a-bcde-0c6629d48d43")
+        monitor.track(device)
+
+        with requests_mock.Mocker() as mock:
+            mock.get(
+                "https://app.candyhouse.co/api/sesame2/126d3d66-9222-4e5a-bcde-0c6629d48d43",
+                json=load_fixture("lock_get_locked.json"),
+            )
+            device.fetchMechStatus()
+
+        assert monitor.getHistory(device).latest[1] == pytest.approx(5.8697947)
+
+        # Already known statuses are recorded when tracking starts
+        other = BatteryMonitor()
+        other.track(device)
+        assert len(other.getHistory(device)) == 1
+
+    def test_BatteryMonitor_uses_model_critical_voltage(self):
+        monitor = BatteryMonitor()
+        bot = CHSesameBot(
+            authenticator=WebAPIAuth(apikey="FAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKE"),
+            device_uuid="126d3d66-9222-4e5a-bcde-0c6629d48d43",
+            secret_key="0b3e5f1665e143b59180c915fa4b06d9",
+            initial_sync=False,
+        )
+        monitor.record(bot, _status(2.9), timestamp=0)
+
+        assert monitor.getHistory(bot).criticalVoltage == 2.3
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+
+"""Tests for `pysesame3` package."""
+
+import pytest
+
+from pysesame3.helper import (
+    SESAME2_BATTERY_CURVE,
+    CHProductModel,
+    CHSesame2MechStatus,
+    CHSesameBotMechStatus,
+)
+
+np = pytest.importorskip("numpy")
+
+from pysesame3.bulk import (  # noqa: E402
+    battery_percentages,
+    decode_mechst,
+    to_status,
+    to_statuses,
+)
+
+SESAME2_MECHST = [
+    "60030080f3ff0002",
+    "5c030503e3020004",
+    "640300801d00000a",
+    "480200000000ff26",
+]
+SESAMEBOT_MECHST = ["5503000000000102", "5503000007000104", "3003000000000122"]
+
+
+class TestDecodeMechst:
+    def test_decode_mechst_matches_status_classes(self):
+        decoded = decode_mechst(SESAME2_MECHST)
+
+        assert decoded.shape == (4,)
+        for row, rawdata in zip(decoded, SESAME2_MECHST):
+            status = CHSesame2MechStatus(rawdata)
+            assert row["batteryVoltage"] == status.getBatteryVoltage()
+            assert row["target"] == status.getTarget()
+            assert row["position"] == status.getPosition()
+            assert row["retcode"] == status.getRetCode()
+            assert row["isInLockRange"] == status.isInLockRange()
+            assert row["isInUnlockRange"] == status.isInUnlockRange()
+        assert list(decoded["isBatteryCritical"]) == [False, False, False, True]
+
+    def test_decode_mechst_accepts_bytes(self):
+        raw = [bytes.fromhex(s) for s in SESAME2_MECHST]
+        assert (decode_mechst(raw) == decode_mechst(SESAME2_MECHST)).all()
+
+        mixed = [SESAME2_MECHST[0], raw[1]]
+        assert (decode_mechst(mixed) == decode_mechst(SESAME2_MECHST[:2])).all()
+
+    def test_decode_mechst_empty(self):
+        assert decode_mechst([]).shape == (0,)
+
+    def test_decode_mechst_raises_exception_on_invalid_length(self):
+        with pytest.raises(ValueError):
+            decode_mechst(["60030080f3ff00"])
+        with pytest.raises(ValueError):
+            decode_mechst([b"\x00", SESAME2_MECHST[0]])
+
+    def test_decode_mechst_raises_exception_on_unsupported_model(self):
+        with pytest.raises(NotImplementedError):
+            decode_mechst(SESAME2_MECHST, CHProductModel.WM2)
+
+    def test_to_statuses_SS2(self):
+        statuses = to_statuses(decode_mechst(SESAME2_MECHST))
+
+        for status, rawdata in zip(statuses, SESAME2_MECHST):
+            assert isinstance(status, CHSesame2MechStatus)
+            assert str(status) == str(CHSesame2MechStatus(rawdata))
+
+    def test_to_status_SesameBot1(self):
+        decoded = decode_mechst(SESAMEBOT_MECHST, CHProductModel.SesameBot1)
+
+        for row, rawdata in zip(decoded, SESAMEBOT_MECHST):
+            status = to_status(row, CHProductModel.SesameBot1)
+            expected = CHSesameBotMechStatus(rawdata)
+            assert isinstance(status, CHSesameBotMechStatus)
+            assert status.getBatteryVoltage() == expected.getBatteryVoltage()
+            assert status.getMotorStatus() == expected.getMotorStatus()
+            assert status.isInLockRange() == expected.isInLockRange()
+            assert str(status) == str(expected)
+
+
+def _webapi(voltage):
+    return {"batteryVoltage": voltage, "position": 0, "CHSesame2Status": "locked"}
+
+
+class TestBatteryPercentages:
+    def test_battery_percentages_matches_status_classes(self):
+        voltages = np.arange(3.5, 7.0, 0.0005)
+        voltages = np.concatenate([voltages, SESAME2_BATTERY_CURVE.voltages])
+
+        expected = [
+            CHSesame2MechStatus.from_webapi(_webapi(v)).getBatteryPercentage()
+            for v in voltages
+        ]
+        assert battery_percentages(voltages).tolist() == expected
+        assert battery_percentages(list(voltages)).tolist() == expected
+
+    def test_battery_percentages_SesameBot1(self):
+        voltages = np.arange(1.5, 7.0, 0.0005)
+
+        expected = [
+            CHSesameBotMechStatus.from_webapi(_webapi(v)).getBatteryPercentage()
+            for v in voltages
+        ]
+        result = battery_percentages(voltages, CHProductModel.SesameBot1)
+        assert result.tolist() == expected
+
+    def test_battery_percentages_raises_exception_on_unsupported_model(self):
+        with pytest.raises(NotImplementedError):
+            battery_percentages([5.0], CHProductModel.WM2)
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+
+"""Tests for `pysesame3` package."""
+
+import json
+
+import pytest
+
+from pysesame3.auth import WebAPIAuth
+from pysesame3.changes import ChangeDetector
+from pysesame3.chsesame2 import CHSesame2
+from pysesame3.chsesamebot import CHSesameBot
+from pysesame3.const import CHSesame2ShadowStatus, StateSource, StatusField
+from pysesame3.helper import CHSesame2MechStatus, CHSesameBotMechStatus
+
+
+def _shadow(mechst):
+    return json.dumps({"state": {"reported": {"mechst": mechst}}}).encode("utf-8")
+
+
+@pytest.fixture
+def device():
+    return CHSesame2(
+        authenticator=WebAPIAuth(apikey="FAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKE"),
+        device_uuid="126d3d66-9222-4e5a-bcde-0c6629d48d43",
+        secret_key="0b3e5f1665e143b59180c915fa4b06d9",
+        initial_sync=False,
+    )
+
+
+class TestChangeDetector:
+    def test_ChangeDetector_reports_shadow_updates(self, device):
+        detector = ChangeDetector()
+        detector.attach(device)
+        lock_changes = []
+        all_changes = []
+        detector.subscribe(lock_changes.append, [StatusField.LockState])
+        detector.subscribe(all_changes.append)
+
+        # The first status is the baseline
+        device._iot_shadow_callback("topic", _shadow("60030080f3ff0002"))
+        assert all_changes == []
+
+        device._iot_shadow_callback("topic", _shadow("5c030503e3020004"))
+        assert [c.field for c in lock_changes] == [StatusField.LockState]
+        assert lock_changes[0].old == CHSesame2ShadowStatus.LockedWm
+        assert lock_changes[0].new == CHSesame2ShadowStatus.UnlockedWm
+        assert lock_changes[0].device is device
+        assert [(c.field, c.old, c.new) for c in all_changes] == [
+            (StatusField.LockState, lock_changes[0].old, lock_changes[0].new),
+            (StatusField.Position, -13, 739),
+        ]
+        assert "field=StatusField.Position" in str(all_changes[1])
+
+        # Both ranges at once is not a lock state change
+        device._iot_shadow_callback("topic", _shadow("480200000000ff26"))
+        assert len(lock_changes) == 1
+        assert [c.field for c in all_changes[2:]] == [
+            StatusField.Position,
+            StatusField.Battery,
+            StatusField.RetCode,
+        ]
+
+        detector.detach(device)
+        device._iot_shadow_callback("topic", _shadow("60030080f3ff0002"))
+        assert len(all_changes) == 5
+
+    def test_ChangeDetector_thresholds(self, device):
+        detector = ChangeDetector(position_threshold=10, battery_step=5)
+        changes = []
+        detector.subscribe(changes.append, [StatusField.Position])
+
+        def _status(position):
+            return CHSesame2MechStatus.from_webapi(
+                {
+                    "batteryVoltage": 5.8,
+                    "position": position,
+                    "CHSesame2Status": "locked",
+                }
+            )
+
+        for position in (0, 4, 8, 12, 13):
+            detector.update(device, _status(position))
+
+        # Measured against the last reported position, not the last sample
+        assert [(c.old, c.new) for c in changes] == [(0, 12)]
+
+    def test_ChangeDetector_motor_status(self):
+        bot = CHSesameBot(
+            authenticator=WebAPIAuth(apikey="FAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKE"),
+            device_uuid="126d3d66-9222-4e5a-bcde-0c6629d48d43",
+            secret_key="0b3e5f1665e143b59180c915fa4b06d9",
+            initial_sync=False,
+        )
+        detector = ChangeDetector()
+        changes = []
+        detector.subscribe(changes.append, [StatusField.MotorStatus])
+
+        bot.state.update(
+            StateSource.IoT, mechStatus=CHSesameBotMechStatus("5503000000000102")
+        )
+        detector.attach(bot)
+        bot._iot_shadow_callback("topic", _shadow("5503000007000104"))
+
+        assert [(c.old, c.new) for c in changes] == [(0, 7)]
+
+    def test_ChangeDetector_isolates_failing_subscribers(self, device):
+        detector = ChangeDetector()
+        changes = []
+
+        def _fail(_):
+            raise RuntimeError
+
+        detector.subscribe(_fail)
+        detector.subscribe(changes.append)
+        detector.update(device, CHSesame2MechStatus("60030080f3ff0002"))
+        detector.update(device, CHSesame2MechStatus("5c030503e3020004"))
+
+        assert len(changes) == 2
+
+    def test_ChangeDetector_raises_exception_on_invalid_callback(self):
+        detector = ChangeDetector()
+
+        with pytest.raises(TypeError):
+            detector.subscribe("callback")
+
+        detector.subscribe(print)
+        detector.unsubscribe(print)
+        assert detector._subscribers == []
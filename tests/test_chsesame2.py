@@ -2,8 +2,10 @@
 
 """Tests for `pysesame3` package."""
 
+import asyncio
 import json
-from unittest.mock import MagicMock, PropertyMock
+import threading
+from unittest.mock import AsyncMock, MagicMock, PropertyMock, patch
 
 import boto3
 import pytest
@@ -12,6 +14,7 @@ from moto import mock_cognitoidentity
 
 from pysesame3.auth import CognitoAuth, WebAPIAuth
 from pysesame3.chsesame2 import CHSesame2, CHSesame2ShadowStatus
+from pysesame3.cloud import AWSIoT
 from pysesame3.helper import CHSesame2MechStatus
 from pysesame3.history import CHSesame2History
 
@@ -112,9 +115,78 @@ class TestCHSesame2:
     def test_CHSesame2(self):
         assert (
             str(self.key_locked)
-            == "CHSesame2(deviceUUID=126D3D66-9222-4E5A-BCDE-0C6629D48D43, deviceModel=CHProductModel.SS2, mechStatus=CHSesame2MechStatus(Battery=67% (5.87V), isInLockRange=True, isInUnlockRange=False, position=11))"
+            == "CHSesame2(deviceUUID=126D3D66-9222-4E5A-BCDE-0C6629D48D43, deviceModel=CHProductModel.SS2, mechStatus=CHSesame2MechStatus(Battery=67% (5.87V), isInLockRange=True, isInUnlockRange=False, position=11), shadowStatus=CHSesame2ShadowStatus.LockedWm)"
         )
 
+    def test_CHSesame2_constructor_fetches_once(self, mock_cloud, mock_requests):
+        calls = mock_requests.call_count
+        CHSesame2(
+            mock_cloud,
+            device_uuid="126D3D66-9222-4E5A-BCDE-0C6629D48D43",
+            secret_key="0b3e5f1665e143b59180c915fa4b06d9",
+        )
+        assert mock_requests.call_count == calls + 1
+
+    def test_CHSesame2_lazy(self, mock_cloud, mock_requests):
+        calls = mock_requests.call_count
+        device = CHSesame2(
+            mock_cloud,
+            device_uuid="126D3D66-9222-4E5A-BCDE-0C6629D48D43",
+            secret_key="0b3e5f1665e143b59180c915fa4b06d9",
+            initial_sync=False,
+        )
+        assert mock_requests.call_count == calls
+
+        assert device.getDeviceShadowStatus() == CHSesame2ShadowStatus.LockedWm
+        assert device.getDeviceShadowStatus() == CHSesame2ShadowStatus.LockedWm
+        assert mock_requests.call_count == calls + 1
+
+    def test_SesameCloud_syncMechStatuses(self, mock_cloud, mock_requests):
+        devices = [
+            CHSesame2(
+                mock_cloud,
+                device_uuid=device_uuid,
+                secret_key="0b3e5f1665e143b59180c915fa4b06d9",
+                initial_sync=False,
+            )
+            for device_uuid in [
+                "126D3D66-9222-4E5A-BCDE-0C6629D48D43",
+                "E0E56521-63D8-4DA5-BA4B-C4A6A5E353F1",
+                "42918AD1-8154-4AFF-BD1F-F0CDE88A8DE1",
+            ]
+        ]
+        mock_requests.get(
+            "https://app.candyhouse.co/api/sesame2/42918ad1-8154-4aff-bd1f-f0cde88a8de1",
+            status_code=500,
+        )
+        calls = mock_requests.call_count
+
+        missing = mock_cloud.sesame_cloud.syncMechStatuses(devices, max_workers=3)
+
+        assert missing == [devices[2]]
+        assert mock_requests.call_count == calls + 3
+        assert devices[0].getDeviceShadowStatus() == CHSesame2ShadowStatus.LockedWm
+        assert devices[1].getDeviceShadowStatus() == CHSesame2ShadowStatus.UnlockedWm
+
+    def test_CHSesame2_formatting_makes_no_requests(self, mock_requests):
+        calls = mock_requests.call_count
+
+        device = CHSesame2(
+            self.key_locked.authenticator,
+            device_uuid="126D3D66-9222-4E5A-BCDE-0C6629D48D43",
+            secret_key="0b3e5f1665e143b59180c915fa4b06d9",
+            initial_sync=False,
+        )
+        assert (
+            str(device)
+            == "CHSesame2(deviceUUID=126D3D66-9222-4E5A-BCDE-0C6629D48D43, deviceModel=CHProductModel.SS2, mechStatus=None, shadowStatus=None)"
+        )
+        assert repr(device) == str(device)
+        str(self.key_locked)
+        repr(self.key_unlocked)
+        "{}".format(self.key_locked)
+        assert mock_requests.call_count == calls
+
     def test_CHSesame2_subscribeMechStatus_raises_exception_with_WebAPI(self):
         def _callback(*_):
             return True
@@ -190,6 +262,50 @@ class TestCHSesame2:
             == CHSesame2ShadowStatus.UnlockedWm
         )
 
+    def test_CHSesame2_lock_and_wait_polls(self, mock_requests):
+        mock_requests.get(
+            "https://app.candyhouse.co/api/sesame2/e0e56521-63d8-4da5-ba4b-c4a6a5e353f1",
+            [
+                {"json": load_fixture("lock_get_unlocked.json")},
+                {"json": load_fixture("lock_get_locked.json")},
+            ],
+        )
+        result = self.key_unlocked.lock_and_wait(
+            timeout=5.0, poll_interval=0.01, max_poll_interval=0.02
+        )
+
+        assert result
+        assert result.accepted and result.confirmed
+        assert result.polls == 2
+        assert result.status.isInLockRange()
+        assert result.actuationLatency > 0
+        assert result.totalLatency == pytest.approx(
+            result.acceptLatency + result.actuationLatency + result.confirmLatency
+        )
+        assert self.key_unlocked.lastMechStatus is result.status
+
+    def test_CHSesame2_unlock_and_wait_times_out(self):
+        result = self.key_locked.unlock_and_wait(
+            timeout=0.1, poll_interval=0.01, max_poll_interval=0.02
+        )
+
+        assert not result
+        assert result.accepted and not result.confirmed
+        assert result.polls > 0
+        assert result.status.isInLockRange()
+        assert result.totalLatency is None
+
+    def test_CHSesame2_lock_and_wait_fails_HTTP_requests(self, mock_requests):
+        mock_requests.post(
+            "https://app.candyhouse.co/api/sesame2/e0e56521-63d8-4da5-ba4b-c4a6a5e353f1/cmd",
+            status_code=500,
+        )
+        calls = mock_requests.call_count
+        result = self.key_unlocked.lock_and_wait()
+
+        assert not result.accepted and not result.confirmed
+        assert mock_requests.call_count == calls + 1
+
 
 class TestCHSesame2Cognito:
     @pytest.fixture(autouse=True)
@@ -209,7 +325,7 @@ class TestCHSesame2Cognito:
     def test_CHSesame2(self):
         assert (
             str(self.key_locked)
-            == "CHSesame2(deviceUUID=126D3D66-9222-4E5A-BCDE-0C6629D48D43, deviceModel=CHProductModel.SS2, mechStatus=CHSesame2MechStatus(Battery=67% (5.87V), isInLockRange=True, isInUnlockRange=False, position=11))"
+            == "CHSesame2(deviceUUID=126D3D66-9222-4E5A-BCDE-0C6629D48D43, deviceModel=CHProductModel.SS2, mechStatus=CHSesame2MechStatus(Battery=67% (5.87V), isInLockRange=True, isInUnlockRange=False, position=11), shadowStatus=CHSesame2ShadowStatus.LockedWm)"
         )
 
     def test_CHSesame2_iot_shadow_callback_with_missing_mechst(self):
@@ -262,13 +378,139 @@ class TestCHSesame2Cognito:
         with pytest.raises(TypeError):
             self.key_locked.subscribeMechStatus("NOT-CALLABLE")
 
-    @mock_cognitoidentity
     def test_CHSesame2_subscribeMechStatus(self):
-        pass
-        """
         m = MagicMock()
-        self.key_locked.subscribeMechStatus(m)
-        """
+        aws_iot = MagicMock()
+        with patch.object(
+            CognitoAuth, "aws_iot", new_callable=PropertyMock, return_value=aws_iot
+        ):
+            self.key_locked.subscribeMechStatus(m)
+
+        aws_iot.subscribe.assert_called_once_with(
+            topic="$aws/things/sesame2/shadow/name/126D3D66-9222-4E5A-BCDE-0C6629D48D43/update/accepted",
+            callback=self.key_locked._iot_shadow_callback,
+            key="126D3D66-9222-4E5A-BCDE-0C6629D48D43",
+        )
+        assert self.key_locked._callback is m
+
+    def test_CHSesame2_subscribeMechStatusAsync(self):
+        aws_iot = MagicMock()
+        aws_iot.subscribeAsync = AsyncMock()
+        with patch.object(
+            CognitoAuth, "aws_iot", new_callable=PropertyMock, return_value=aws_iot
+        ):
+            asyncio.run(self.key_locked.subscribeMechStatusAsync())
+
+        aws_iot.subscribeAsync.assert_awaited_once_with(
+            topic="$aws/things/sesame2/shadow/name/126D3D66-9222-4E5A-BCDE-0C6629D48D43/update/accepted",
+            callback=self.key_locked._iot_shadow_callback,
+            key="126D3D66-9222-4E5A-BCDE-0C6629D48D43",
+        )
+
+    def test_CHSesame2_unlock_and_wait_confirms_through_shadow(self, mock_requests):
+        topic = "$aws/things/sesame2/shadow/name/126D3D66-9222-4E5A-BCDE-0C6629D48D43/update/accepted"
+        unlocked = json.dumps(load_fixture("lock_shadow_unlocked.json")).encode()
+        self.key_locked._subscribedTopics.append(topic)
+        calls = mock_requests.call_count
+
+        def _send(*_):
+            # The update arrives on the AWS IoT event-loop thread
+            threading.Timer(
+                0.05, self.key_locked._iot_shadow_callback, (topic, unlocked)
+            ).start()
+            return True
+
+        with patch.object(self.key_locked, "unlock", side_effect=_send):
+            result = self.key_locked.unlock_and_wait(timeout=5.0)
+
+        assert result.confirmed
+        assert result.polls == 0
+        assert result.status.isInUnlockRange()
+        assert result.actuationLatency >= 0.04
+        assert self.key_locked.actuationLatency == result.actuationLatency
+        assert mock_requests.call_count == calls
+        assert (
+            self.key_locked.getDeviceShadowStatus() == CHSesame2ShadowStatus.UnlockedWm
+        )
+
+    def test_CHSesame2_watch(self):
+        topic = "$aws/things/sesame2/shadow/name/E0E56521-63D8-4DA5-BA4B-C4A6A5E353F1/update/accepted"
+        locked = json.dumps(load_fixture("lock_shadow_locked.json")).encode()
+        unlocked = json.dumps(load_fixture("lock_shadow_unlocked.json")).encode()
+
+        def _deliver(*payloads):
+            # Updates arrive on the AWS IoT event-loop thread
+            for payload in payloads:
+                t = threading.Thread(
+                    target=self.key_unlocked._iot_shadow_callback,
+                    args=(topic, payload),
+                )
+                t.start()
+                t.join()
+
+        async def _run():
+            statuses = self.key_unlocked.watch(maxsize=2)
+            first = asyncio.ensure_future(statuses.__anext__())
+            await asyncio.sleep(0)
+            _deliver(locked)
+            status = await asyncio.wait_for(first, 1)
+            assert isinstance(status, CHSesame2MechStatus)
+            assert status.isInLockRange()
+
+            # The oldest update is dropped once the queue is full
+            _deliver(unlocked, unlocked, locked)
+            await asyncio.sleep(0)
+            status = await asyncio.wait_for(statuses.__anext__(), 1)
+            assert not status.isInLockRange()
+            status = await asyncio.wait_for(statuses.__anext__(), 1)
+            assert status.isInLockRange()
+
+            await statuses.aclose()
+            assert self.key_unlocked._statusListeners == []
+
+        aws_iot = MagicMock()
+        aws_iot.subscribeAsync = AsyncMock()
+        with patch.object(
+            CognitoAuth, "aws_iot", new_callable=PropertyMock, return_value=aws_iot
+        ):
+            asyncio.run(_run())
+        aws_iot.subscribeAsync.assert_awaited_once()
+
+    def test_CHSesame2_initial_sync_with_shadows(self, mock_requests):
+        key = {
+            "device_uuid": "E0E56521-63D8-4DA5-BA4B-C4A6A5E353F1",
+            "secret_key": "0b3e5f1665e143b59180c915fa4b06d9",
+        }
+        calls = mock_requests.call_count
+        device = CHSesame2(self.key_locked.authenticator, initial_sync=False, **key)
+        assert mock_requests.call_count == calls
+
+        aws_iot = self.key_locked.authenticator.aws_iot
+        shadows = {
+            "E0E56521-63D8-4DA5-BA4B-C4A6A5E353F1": load_fixture(
+                "lock_shadow_locked.json"
+            )
+        }
+        with patch.object(AWSIoT, "getShadows", return_value=shadows):
+            missing = aws_iot.syncShadows([device, self.key_locked])
+
+        assert missing == [self.key_locked]
+        assert device.getDeviceShadowStatus() == CHSesame2ShadowStatus.LockedWm
+        assert mock_requests.call_count == calls
+
+    def test_CHSesame2_close_unsubscribes(self):
+        aws_iot = MagicMock()
+        with patch.object(
+            CognitoAuth, "aws_iot", new_callable=PropertyMock, return_value=aws_iot
+        ):
+            with self.key_locked as device:
+                device.subscribeMechStatus()
+            aws_iot.unsubscribe.assert_called_once_with(
+                "$aws/things/sesame2/shadow/name/126D3D66-9222-4E5A-BCDE-0C6629D48D43/update/accepted"
+            )
+
+            self.key_locked.close()
+            aws_iot.unsubscribe.assert_called_once()
 
     def test_CHSesame2_getDeviceShadowStatus(self):
         assert self.key_locked.getDeviceShadowStatus() == CHSesame2ShadowStatus.LockedWm
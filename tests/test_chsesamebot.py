@@ -3,7 +3,7 @@
 """Tests for `pysesame3` package."""
 
 import json
-from unittest.mock import MagicMock, PropertyMock
+from unittest.mock import MagicMock, PropertyMock, patch
 
 import boto3
 import pytest
@@ -107,9 +107,28 @@ class TestCHSesameBot:
     def test_CHSesameBot(self):
         assert (
             str(self.key_locked)
-            == "CHSesameBot(deviceUUID=126D3D66-9222-4E5A-BCDE-0C6629D48D43, deviceModel=CHProductModel.SesameBot1, mechStatus=CHSesameBotMechStatus(Battery=100% (6.00V), motorStatus=0))"
+            == "CHSesameBot(deviceUUID=126D3D66-9222-4E5A-BCDE-0C6629D48D43, deviceModel=CHProductModel.SesameBot1, mechStatus=CHSesameBotMechStatus(Battery=100% (6.00V), motorStatus=0), shadowStatus=CHSesame2ShadowStatus.LockedWm)"
         )
 
+    def test_CHSesameBot_formatting_makes_no_requests(self, mock_requests):
+        calls = mock_requests.call_count
+
+        device = CHSesameBot(
+            self.key_locked.authenticator,
+            device_uuid="126D3D66-9222-4E5A-BCDE-0C6629D48D43",
+            secret_key="0b3e5f1665e143b59180c915fa4b06d9",
+            initial_sync=False,
+        )
+        assert (
+            str(device)
+            == "CHSesameBot(deviceUUID=126D3D66-9222-4E5A-BCDE-0C6629D48D43, deviceModel=CHProductModel.SesameBot1, mechStatus=None, shadowStatus=None)"
+        )
+        assert repr(device) == str(device)
+        str(self.key_locked)
+        repr(self.key_locked)
+        "{}".format(self.key_locked)
+        assert mock_requests.call_count == calls
+
     def test_CHSesameBot_subscribeMechStatus_raises_exception_with_WebAPI(self):
         def _callback(*_):
             return True
@@ -174,7 +193,7 @@ class TestCHSesameBotCognito:
     def test_CHSesameBot(self):
         assert (
             str(self.key_locked)
-            == "CHSesameBot(deviceUUID=126D3D66-9222-4E5A-BCDE-0C6629D48D43, deviceModel=CHProductModel.SesameBot1, mechStatus=CHSesameBotMechStatus(Battery=100% (6.00V), motorStatus=0))"
+            == "CHSesameBot(deviceUUID=126D3D66-9222-4E5A-BCDE-0C6629D48D43, deviceModel=CHProductModel.SesameBot1, mechStatus=CHSesameBotMechStatus(Battery=100% (6.00V), motorStatus=0), shadowStatus=CHSesame2ShadowStatus.LockedWm)"
         )
 
     def test_CHSesameBot_iot_shadow_callback_with_missing_mechst(self):
@@ -230,8 +249,19 @@ class TestCHSesameBotCognito:
             self.key_locked.subscribeMechStatus("NOT-CALLABLE")
 
     def test_CHSesameBot_subscribeMechStatus(self):
-        # TODO: Make tests using moto
-        pass
+        m = MagicMock()
+        aws_iot = MagicMock()
+        with patch.object(
+            CognitoAuth, "aws_iot", new_callable=PropertyMock, return_value=aws_iot
+        ):
+            self.key_locked.subscribeMechStatus(m)
+
+        aws_iot.subscribe.assert_called_once_with(
+            topic="$aws/things/sesame2/shadow/name/126D3D66-9222-4E5A-BCDE-0C6629D48D43/update/accepted",
+            callback=self.key_locked._iot_shadow_callback,
+            key="126D3D66-9222-4E5A-BCDE-0C6629D48D43",
+        )
+        assert self.key_locked._callback is m
 
     def test_CHSesameBot_getDeviceShadowStatus(self):
         assert self.key_locked.getDeviceShadowStatus() == CHSesame2ShadowStatus.LockedWm
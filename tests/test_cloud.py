@@ -3,7 +3,14 @@
 """Tests for `pysesame3` package."""
 
 import asyncio
+import gc
+import json
+import os
 import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from unittest.mock import MagicMock, call
 
 import boto3
 
@@ -14,14 +21,82 @@ else:
 
 import pytest
 import requests_mock
+from awscrt import mqtt
 from moto import mock_cognitoidentity
 
 from pysesame3.auth import CognitoAuth
-from pysesame3.cloud import AWSIoT, SesameCloud
+from pysesame3.cloud import AWSIoT, AWSIoTPool, ResubscribeReport, SesameCloud
 
 from .utils import load_fixture
 
 
+def _native_thread_count():
+    with open("/proc/self/status") as fp:
+        for line in fp:
+            if line.startswith("Threads:"):
+                return int(line.split()[1])
+
+
+def _done_future(result=None):
+    f = Future()
+    f.set_result(result)
+    return f
+
+
+def _mock_mqtt_connection():
+    conn = MagicMock()
+    conn.connect.side_effect = lambda: _done_future()
+    conn.subscribe.side_effect = lambda **kwargs: (
+        _done_future({"topic": kwargs["topic"], "qos": kwargs["qos"]}),
+        1,
+    )
+    conn.unsubscribe.side_effect = lambda topic: (_done_future(), 1)
+    return conn
+
+
+def _mock_shadow_service(conn, shadows, silent=()):
+    """Answer `get` requests published on `conn` with `shadows`.
+
+    Other devices are rejected as unknown, except those in `silent`, which never answer.
+    """
+    callbacks = {}
+
+    def _subscribe(**kwargs):
+        callbacks[kwargs["topic"]] = kwargs["callback"]
+        return _done_future(), 1
+
+    def _publish(topic, payload, qos):
+        device_uuid = topic.split("/")[5]
+        if device_uuid in shadows:
+            reply = topic + "/accepted"
+            callback = callbacks[reply.replace(device_uuid, "+")]
+            callback(reply, json.dumps(shadows[device_uuid]).encode())
+        elif device_uuid not in silent:
+            reply = topic + "/rejected"
+            callback = callbacks[reply.replace(device_uuid, "+")]
+            callback(reply, b'{"code": 404, "message": "No shadow exists"}')
+        return _done_future(), 1
+
+    conn.subscribe.side_effect = _subscribe
+    conn.publish.side_effect = _publish
+
+
+@pytest.fixture()
+def cognito_auth():
+    with mock_cognitoidentity():
+        cognito_identity = boto3.client(
+            "cognito-identity", region_name="ap-northeast-1"
+        )
+        identity_pool_data = cognito_identity.create_identity_pool(
+            IdentityPoolName="test_identity_pool",
+            AllowUnauthenticatedIdentities=False,
+        )
+        yield CognitoAuth(
+            apikey="FAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKE",
+            client_id=identity_pool_data["IdentityPoolId"],
+        )
+
+
 @pytest.fixture(autouse=True)
 def mock_requests():
     with requests_mock.Mocker() as mock:
@@ -67,9 +142,7 @@ class TestAWSIoT:
         with patch("pysesame3.cloud.mqtt.Connection.connect") as connect:
 
             def _connect(*args, **kwargs):
-                f = asyncio.Future()
-                f.set_result(True)
-                return f
+                return _done_future(True)
 
             connect.side_effect = _connect
             aws_iot.connect()
@@ -77,3 +150,429 @@ class TestAWSIoT:
 
             aws_iot.connect()
             assert connect.call_count == 2
+
+    def test_AWSIoT_subscribe(self, aws_iot):
+        aws_iot.mqtt_connection = _mock_mqtt_connection()
+        callback = MagicMock()
+
+        aws_iot.subscribe("topic/a", callback)
+        aws_iot.mqtt_connection.subscribe.assert_called_once()
+        assert aws_iot.subscriptions == {"topic/a": callback}
+
+        aws_iot.unsubscribe("topic/a")
+        aws_iot.mqtt_connection.unsubscribe.assert_called_once_with("topic/a")
+        assert aws_iot.subscriptions == {}
+
+    def test_AWSIoT_subscribeAsync(self, aws_iot):
+        aws_iot.mqtt_connection = _mock_mqtt_connection()
+        callback = MagicMock()
+
+        asyncio.run(aws_iot.subscribeAsync("topic/a", callback))
+        aws_iot.mqtt_connection.connect.assert_called_once()
+        aws_iot.mqtt_connection.subscribe.assert_called_once()
+        assert aws_iot.subscriptions == {"topic/a": callback}
+
+    def test_AWSIoT_getShadows(self, aws_iot):
+        aws_iot.mqtt_connection = _mock_mqtt_connection()
+        shadows = {
+            "126D3D66-9222-4E5A-BCDE-0C6629D48D43": load_fixture(
+                "lock_shadow_locked.json"
+            ),
+            "E0E56521-63D8-4DA5-BA4B-C4A6A5E353F1": load_fixture(
+                "lock_shadow_unlocked.json"
+            ),
+        }
+        _mock_shadow_service(aws_iot.mqtt_connection, shadows)
+
+        result = aws_iot.getShadows(
+            [
+                "126d3d66-9222-4e5a-bcde-0c6629d48d43",
+                "E0E56521-63D8-4DA5-BA4B-C4A6A5E353F1",
+                "42918AD1-8154-4AFF-BD1F-F0CDE88A8DE1",
+            ],
+            timeout=0.1,
+        )
+
+        assert result == shadows
+        assert aws_iot.mqtt_connection.subscribe.call_count == 2
+        assert aws_iot.mqtt_connection.publish.call_count == 3
+        assert [c.args for c in aws_iot.mqtt_connection.unsubscribe.call_args_list] == [
+            ("$aws/things/sesame2/shadow/name/+/get/accepted",),
+            ("$aws/things/sesame2/shadow/name/+/get/rejected",),
+        ]
+        assert aws_iot.subscriptions == {}
+
+    def test_AWSIoT_getShadows_returns_once_all_devices_answered(self, cognito_auth):
+        aws_iot = AWSIoT(
+            cognito_auth, resubscribe_batch_size=2, resubscribe_interval_secs=0.05
+        )
+        aws_iot.mqtt_connection = _mock_mqtt_connection()
+        shadows = {
+            "DEVICE-{}".format(i): load_fixture("lock_shadow_locked.json")
+            for i in range(3)
+        }
+        _mock_shadow_service(aws_iot.mqtt_connection, shadows)
+
+        with patch("pysesame3.cloud.time.sleep") as sleep:
+            started = time.monotonic()
+            # Two devices without a shadow are rejected instead of timing out
+            result = aws_iot.getShadows(list(shadows) + ["GONE-1", "GONE-2"], 10)
+
+        assert time.monotonic() - started < 5
+        assert result == shadows
+        assert aws_iot.mqtt_connection.publish.call_count == 5
+        # 3 batches of at most 2 requests
+        assert sleep.call_args_list == [call(0.05), call(0.05)]
+
+    def test_AWSIoT_getShadows_shares_the_reply_subscription(self, aws_iot):
+        aws_iot.mqtt_connection = _mock_mqtt_connection()
+        first = "126D3D66-9222-4E5A-BCDE-0C6629D48D43"
+        second = "E0E56521-63D8-4DA5-BA4B-C4A6A5E353F1"
+        shadows = {
+            first: load_fixture("lock_shadow_locked.json"),
+            second: load_fixture("lock_shadow_unlocked.json"),
+        }
+        _mock_shadow_service(
+            aws_iot.mqtt_connection,
+            shadows,
+            silent={"42918AD1-8154-4AFF-BD1F-F0CDE88A8DE1"},
+        )
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            # Waits for a device that never answers
+            slow = executor.submit(
+                aws_iot.getShadows,
+                [first, "42918AD1-8154-4AFF-BD1F-F0CDE88A8DE1"],
+                timeout=1,
+            )
+            while not aws_iot.mqtt_connection.publish.call_count:
+                threading.Event().wait(0.01)
+
+            assert aws_iot.getShadows([second], timeout=1) == {second: shadows[second]}
+            # Still subscribed for the call in flight
+            aws_iot.mqtt_connection.unsubscribe.assert_not_called()
+            assert slow.result() == {first: shadows[first]}
+
+        assert aws_iot.mqtt_connection.subscribe.call_count == 2
+        assert aws_iot.mqtt_connection.unsubscribe.call_count == 2
+        assert aws_iot.subscriptions == {}
+
+    def test_AWSIoT_notifies_connection_listeners(self, aws_iot):
+        listener = MagicMock()
+        aws_iot.addConnectionListener(listener)
+
+        aws_iot._on_connection_interrupted(MagicMock(), MagicMock())
+        listener.assert_called_with(aws_iot, False)
+
+        aws_iot._on_connection_resumed(
+            MagicMock(), mqtt.ConnectReturnCode.ACCEPTED, True
+        )
+        listener.assert_called_with(aws_iot, True)
+
+    def test_AWSIoT_jitters_reconnect_backoff(self, aws_iot):
+        with patch(
+            "pysesame3.cloud.mqtt_connection_builder.websockets_with_custom_handshake"
+        ) as builder:
+            for _ in range(20):
+                aws_iot._build_connection()
+
+        timeouts = {
+            call.kwargs["reconnect_min_timeout_secs"] for call in builder.mock_calls
+        }
+        assert all(2 <= t <= 8 for t in timeouts)
+        assert len(timeouts) > 1
+
+    def test_AWSIoT_resubscribes_in_batches(self, cognito_auth):
+        aws_iot = AWSIoT(
+            cognito_auth,
+            resubscribe_batch_size=2,
+            resubscribe_interval_secs=0,
+            resubscribe_jitter_secs=0,
+        )
+        conn = _mock_mqtt_connection()
+        aws_iot.mqtt_connection = conn
+        rejecting = {"topic/bad"}
+        conn.subscribe.side_effect = lambda **kwargs: (
+            _done_future(
+                {
+                    "topic": kwargs["topic"],
+                    "qos": (
+                        None if kwargs["topic"] in rejecting else mqtt.QoS.AT_LEAST_ONCE
+                    ),
+                }
+            ),
+            1,
+        )
+        for topic in ["topic/1", "topic/2", "topic/bad", "topic/3", "topic/4"]:
+            aws_iot.subscribe(topic, MagicMock())
+        conn.subscribe.reset_mock()
+
+        reports = []
+        done = threading.Event()
+
+        def _listener(_, report):
+            reports.append(report)
+            done.set()
+
+        aws_iot.addResubscribeListener(_listener)
+
+        # Must not raise on the event-loop thread
+        aws_iot._on_connection_resumed(conn, mqtt.ConnectReturnCode.ACCEPTED, False)
+        assert done.wait(5)
+
+        assert conn.subscribe.call_count == 5
+        assert isinstance(reports[0], ResubscribeReport)
+        assert sorted(reports[0].accepted) == [
+            "topic/1",
+            "topic/2",
+            "topic/3",
+            "topic/4",
+        ]
+        assert list(reports[0].rejected) == ["topic/bad"]
+        assert list(aws_iot.rejectedTopics) == ["topic/bad"]
+
+        rejecting.clear()
+        done.clear()
+        aws_iot.retryRejectedTopics()
+        assert done.wait(5)
+        assert reports[1].accepted == ["topic/bad"]
+        assert aws_iot.rejectedTopics == {}
+
+    def test_AWSIoT_addConnectionListener_raises_exception_on_invalid_arguments(
+        self, aws_iot
+    ):
+        with pytest.raises(TypeError):
+            aws_iot.addConnectionListener("NOT-CALLABLE")
+
+    def test_AWSIoT_close(self, aws_iot):
+        conn = _mock_mqtt_connection()
+        aws_iot.mqtt_connection = conn
+        aws_iot.subscribe("topic/a", MagicMock())
+
+        with aws_iot:
+            pass
+
+        conn.disconnect.assert_called_once()
+        assert not hasattr(aws_iot, "mqtt_connection")
+        assert aws_iot.subscriptions == {}
+
+        # Closing twice is harmless
+        aws_iot.close()
+
+    def test_AWSIoT_setEventLoopGroupThreads_raises_exception_on_invalid_arguments(
+        self,
+    ):
+        with pytest.raises(ValueError):
+            AWSIoT.setEventLoopGroupThreads(0)
+
+    @pytest.mark.skipif(
+        not os.path.exists("/proc/self/status"), reason="requires procfs"
+    )
+    def test_AWSIoT_thread_count_stays_bounded(self):
+        with patch("pysesame3.cloud.mqtt.Connection.connect") as connect, patch(
+            "pysesame3.cloud.mqtt.Connection.disconnect"
+        ) as disconnect:
+            connect.side_effect = lambda *args, **kwargs: _done_future()
+            disconnect.side_effect = lambda *args, **kwargs: _done_future()
+
+            AWSIoT.getClientBootstrap()
+            baseline = _native_thread_count()
+
+            for _ in range(3):
+                auths = [
+                    CognitoAuth(apikey="FAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKE")
+                    for _ in range(10)
+                ]
+                for auth in auths:
+                    auth.aws_iot.connect()
+                for auth in auths:
+                    with auth:
+                        pass
+                del auths
+                gc.collect()
+
+                assert _native_thread_count() <= baseline + 1
+
+            assert connect.call_count == 30
+            assert disconnect.call_count == 30
+
+        with pytest.raises(RuntimeError):
+            AWSIoT.setEventLoopGroupThreads(AWSIoT._event_loop_group_threads + 1)
+
+
+class TestAWSIoTPool:
+    @pytest.fixture()
+    def pool(self, cognito_auth):
+        pool = AWSIoTPool(cognito_auth, 3)
+        for shard in pool.shards:
+            shard.mqtt_connection = _mock_mqtt_connection()
+        yield pool
+
+    def test_AWSIoTPool_raises_exception_on_invalid_size(self, cognito_auth):
+        with pytest.raises(ValueError):
+            AWSIoTPool(cognito_auth, 0)
+
+    def test_CognitoAuth_creates_AWSIoTPool(self, cognito_auth):
+        with pytest.raises(ValueError):
+            CognitoAuth(
+                apikey="FAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKE", iot_connections=0
+            )
+
+        assert isinstance(cognito_auth.aws_iot, AWSIoT)
+        c = CognitoAuth(
+            apikey="FAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKE", iot_connections=4
+        )
+        assert isinstance(c.aws_iot, AWSIoTPool)
+        assert len(c.aws_iot.shards) == 4
+
+    def test_AWSIoTPool_subscribe_spreads_keys(self, pool):
+        for i in range(60):
+            pool.subscribe("topic/{}".format(i), MagicMock(), key="device-{}".format(i))
+
+        counts = [len(shard.subscriptions) for shard in pool.shards]
+        assert sum(counts) == 60
+        assert all(c > 0 for c in counts)
+
+        for i in range(60):
+            assert (
+                "topic/{}".format(i)
+                in pool.getShard("device-{}".format(i)).subscriptions
+            )
+
+    def test_AWSIoTPool_rebalances_on_interruption(self, pool):
+        for i in range(60):
+            pool.subscribe("topic/{}".format(i), MagicMock(), key="device-{}".format(i))
+
+        dead = pool.getShard("device-0")
+        moved = set(dead.subscriptions)
+        others = [shard for shard in pool.shards if shard is not dead]
+        before = {id(shard): set(shard.subscriptions) for shard in others}
+
+        dead._on_connection_interrupted(dead.mqtt_connection, MagicMock())
+
+        assert pool.getShard("device-0") is not dead
+        taken_over = set()
+        for shard in others:
+            new_topics = set(shard.subscriptions) - before[id(shard)]
+            assert before[id(shard)] <= set(shard.subscriptions)
+            taken_over |= new_topics
+        assert taken_over == moved
+
+        dead._on_connection_resumed(
+            dead.mqtt_connection, mqtt.ConnectReturnCode.ACCEPTED, True
+        )
+
+        assert pool.getShard("device-0") is dead
+        for shard in others:
+            assert set(shard.subscriptions) == before[id(shard)]
+        assert set(dead.subscriptions) == moved
+
+    def test_AWSIoTPool_hands_topics_back_once_acknowledged(self, pool):
+        for i in range(60):
+            pool.subscribe("topic/{}".format(i), MagicMock(), key="device-{}".format(i))
+        dead = pool.getShard("device-0")
+        moved = set(dead.subscriptions)
+        others = [shard for shard in pool.shards if shard is not dead]
+        before = {id(shard): set(shard.subscriptions) for shard in others}
+        dead._on_connection_interrupted(dead.mqtt_connection, MagicMock())
+
+        acks = []
+
+        def _subscribe(**kwargs):
+            acks.append((kwargs["topic"], Future()))
+            return acks[-1][1], 1
+
+        dead.mqtt_connection.subscribe.side_effect = _subscribe
+        dead._schedule_resubscribe = MagicMock()
+        # The session is lost: the connection would resubscribe after its jitter
+        dead._on_connection_resumed(
+            dead.mqtt_connection, mqtt.ConnectReturnCode.ACCEPTED, False
+        )
+
+        # Subscribed again at once, and still served by the other connections
+        assert {topic for topic, _ in acks} == moved
+        dead._schedule_resubscribe.assert_called_once()
+        for shard in others:
+            assert before[id(shard)] < set(shard.subscriptions)
+
+        failed, failure = acks[0]
+        failure.set_exception(RuntimeError("timeout"))
+        for _, ack in acks[1:]:
+            ack.set_result({"topic": "", "qos": mqtt.QoS.AT_LEAST_ONCE})
+
+        # Only the acknowledged topics left the other connections
+        copies = set()
+        for shard in others:
+            copies |= set(shard.subscriptions) - before[id(shard)]
+        assert copies == {failed}
+        assert pool._placement[failed] != pool.shards.index(dead)
+
+    def test_AWSIoTPool_drops_topics_moved_off_dead_connections(self, pool):
+        for i in range(60):
+            pool.subscribe("topic/{}".format(i), MagicMock(), key="device-{}".format(i))
+        first = pool.getShard("device-0")
+        first._on_connection_interrupted(first.mqtt_connection, MagicMock())
+        second = pool.getShard("device-0")
+        second._on_connection_interrupted(second.mqtt_connection, MagicMock())
+        assert pool.getShard("device-0") not in (first, second)
+
+        first._on_connection_resumed(
+            first.mqtt_connection, mqtt.ConnectReturnCode.ACCEPTED, True
+        )
+        second._schedule_resubscribe = MagicMock()
+        second._on_connection_resumed(
+            second.mqtt_connection, mqtt.ConnectReturnCode.ACCEPTED, False
+        )
+
+        # Every topic is subscribed once, on its owner
+        for i in range(60):
+            topic = "topic/{}".format(i)
+            owners = [shard for shard in pool.shards if topic in shard.subscriptions]
+            assert owners == [pool.getShard("device-{}".format(i))]
+        (topics, _), _ = second._schedule_resubscribe.call_args
+        assert all(pool.getShard(pool._subscriptions[t][0]) is second for t in topics)
+        second.mqtt_connection.unsubscribe.assert_any_call("topic/0")
+
+    def test_AWSIoTPool_raises_exception_without_live_connections(self, pool):
+        for shard in pool.shards:
+            shard._on_connection_interrupted(shard.mqtt_connection, MagicMock())
+
+        with pytest.raises(ConnectionError):
+            pool.getShard("device-0")
+
+    def test_AWSIoTPool_unsubscribe(self, pool):
+        pool.subscribe("topic/a", MagicMock(), key="device-a")
+        shard = pool.getShard("device-a")
+
+        pool.unsubscribe("topic/a")
+        shard.mqtt_connection.unsubscribe.assert_called_once_with("topic/a")
+        assert "topic/a" not in shard.subscriptions
+
+    def test_AWSIoTPool_close(self, pool):
+        pool.subscribe("topic/a", MagicMock(), key="device-a")
+
+        with pool:
+            pass
+
+        for shard in pool.shards:
+            assert not hasattr(shard, "mqtt_connection")
+            assert shard.subscriptions == {}
+
+    def test_AWSIoTPool_subscribeAsync(self, pool):
+        asyncio.run(pool.subscribeAsync("topic/a", MagicMock(), key="device-a"))
+
+        for shard in pool.shards:
+            shard.mqtt_connection.connect.assert_called_once()
+        assert "topic/a" in pool.getShard("device-a").subscriptions
+
+    def test_AWSIoTPool_getShadows(self, pool):
+        shadows = {
+            "DEVICE-{}".format(i): load_fixture("lock_shadow_locked.json")
+            for i in range(20)
+        }
+        for shard in pool.shards:
+            _mock_shadow_service(shard.mqtt_connection, shadows)
+
+        assert pool.getShadows(list(shadows), timeout=0.1) == shadows
+        for shard in pool.shards:
+            assert shard.mqtt_connection.publish.call_count > 0
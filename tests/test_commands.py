@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+
+"""Tests for `pysesame3` package."""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests_mock
+
+from pysesame3.auth import WebAPIAuth
+from pysesame3.chsesame2 import CHSesame2
+from pysesame3.chsesamebot import CHSesameBot
+from pysesame3.commands import CommandQueue
+from pysesame3.const import CHSesame2CMD, CHSesame2ShadowStatus, StateSource
+from pysesame3.helper import CHSesame2MechStatus
+
+UNLOCKED = CHSesame2MechStatus("5c030503e3020004")
+
+
+def _device(factory=CHSesame2):
+    return factory(
+        WebAPIAuth(apikey="FAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKE"),
+        device_uuid="126d3d66-9222-4e5a-bcde-0c6629d48d43",
+        secret_key="0b3e5f1665e143b59180c915fa4b06d9",
+        initial_sync=False,
+    )
+
+
+class _Cloud:
+    """Records commands; the first one blocks until released."""
+
+    def __init__(self, device):
+        self.calls = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+        device.sendCommand = self._send
+
+    def _send(self, cmd, tag):
+        self.calls.append((cmd.name.lower(), tag))
+        self.started.set()
+        assert self.release.wait(5)
+        return True
+
+
+@pytest.fixture
+def executor():
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        yield executor
+
+
+class TestCommandQueue:
+    def test_CommandQueue_collapses_waiting_commands(self, executor):
+        device = _device()
+        cloud = _Cloud(device)
+        queue = CommandQueue(device, executor)
+
+        assert not queue.busy
+        first = queue.submit(CHSesame2CMD.LOCK)
+        assert cloud.started.wait(5)
+        assert queue.busy
+        unlock = queue.submit(CHSesame2CMD.UNLOCK)
+        lock = queue.submit(CHSesame2CMD.LOCK, "automation")
+        merged = queue.submit(CHSesame2CMD.LOCK, "automation")
+        cloud.release.set()
+
+        assert first.result(5) is True
+        assert lock.result(5) is True
+        assert merged.result(5) is True
+        assert unlock.cancelled()
+        assert cloud.calls == [("lock", "pysesame3"), ("lock", "automation")]
+        assert queue.sent == 2
+        assert queue.collapsed == 2
+
+    def test_CommandQueue_resolves_toggle_against_intent(self, executor):
+        device = _device()
+        device.state.update(StateSource.IoT, mechStatus=UNLOCKED)
+        cloud = _Cloud(device)
+        queue = CommandQueue(device, executor)
+
+        queue.submit(CHSesame2CMD.TOGGLE)
+        assert cloud.started.wait(5)
+        # Lock in flight: toggling means unlocking
+        toggled = queue.submit(CHSesame2CMD.TOGGLE)
+        cloud.release.set()
+        assert toggled.result(5)
+        assert cloud.calls == [("lock", "pysesame3"), ("unlock", "pysesame3")]
+
+        # Nothing reported since: the last command is the latest intent
+        queue.submit(CHSesame2CMD.TOGGLE).result(5)
+        assert cloud.calls[-1][0] == "lock"
+
+        # A newer status from the device wins
+        device.state.update(
+            StateSource.IoT, mechStatus=CHSesame2MechStatus("5c030503e3020004")
+        )
+        queue.submit(CHSesame2CMD.TOGGLE).result(5)
+        assert cloud.calls[-1][0] == "lock"
+
+    def test_CommandQueue_resolves_concurrent_toggles_in_turn(self, executor):
+        class _SlowCHSesame2(CHSesame2):
+            @property
+            def lastMechStatus(self):
+                # Widens the window between reading the intent and queueing
+                threading.Event().wait(0.05)
+                return super().lastMechStatus
+
+        device = _device(_SlowCHSesame2)
+        device.state.update(StateSource.IoT, mechStatus=UNLOCKED)
+        cloud = _Cloud(device)
+        queue = CommandQueue(device, executor)
+        queue.submit(CHSesame2CMD.LOCK)
+        assert cloud.started.wait(5)
+
+        barrier = threading.Barrier(2)
+
+        def _toggle():
+            barrier.wait(5)
+            return queue.submit(CHSesame2CMD.TOGGLE)
+
+        with ThreadPoolExecutor(max_workers=2) as toggles:
+            futures = [f.result(5) for f in [toggles.submit(_toggle) for _ in range(2)]]
+        cloud.release.set()
+
+        # Lock, then unlock, then lock again: the unlock is superseded
+        assert sorted(f.cancelled() for f in futures) == [False, True]
+        assert [f.result(5) for f in futures if not f.cancelled()] == [True]
+        assert cloud.calls == [("lock", "pysesame3"), ("lock", "pysesame3")]
+
+    def test_CommandQueue_falls_back_to_shadow_status(self, executor):
+        device = _device()
+        device.setDeviceShadowStatus(CHSesame2ShadowStatus.LockedWm)
+        cloud = _Cloud(device)
+        cloud.release.set()
+
+        CommandQueue(device, executor).submit(CHSesame2CMD.TOGGLE).result(5)
+        assert cloud.calls == [("unlock", "pysesame3")]
+
+    def test_CommandQueue_reports_errors(self, executor):
+        device = _device()
+
+        def _fail(cmd, tag):
+            raise RuntimeError("HTTP 500")
+
+        device.sendCommand = _fail
+        queue = CommandQueue(device, executor)
+
+        with pytest.raises(RuntimeError):
+            queue.submit(CHSesame2CMD.LOCK).result(5)
+        with pytest.raises(NotImplementedError):
+            CommandQueue(_device(CHSesameBot), executor).submit(
+                CHSesame2CMD.LOCK
+            ).result(5)
+        assert queue.sent == 0
+
+    def test_CHSesame2_commands_are_queued(self, executor):
+        device = _device()
+        cloud = _Cloud(device)
+
+        first = executor.submit(device.lock)
+        assert cloud.started.wait(5)
+        unlock = executor.submit(device.unlock)
+        while (
+            not device.commandQueue.collapsed and device.commandQueue._pending is None
+        ):
+            threading.Event().wait(0.01)
+        lock = executor.submit(device.lock, "automation")
+        while not device.commandQueue.collapsed:
+            threading.Event().wait(0.01)
+        cloud.release.set()
+
+        assert first.result(5) is True
+        # Superseded before it reached the cloud
+        assert unlock.result(5) is False
+        assert lock.result(5) is True
+        assert cloud.calls == [("lock", "pysesame3"), ("lock", "automation")]
+
+    def test_SesameLocker_enqueue(self):
+        device = _device()
+        with requests_mock.Mocker() as mock:
+            mock.post(
+                "https://app.candyhouse.co/api/sesame2/126D3D66-9222-4E5A-BCDE-0C6629D48D43/cmd"
+            )
+            assert device.enqueue(CHSesame2CMD.LOCK, "door").result(5)
+
+        assert device.commandQueue.sent == 1
+        assert device.getDeviceShadowStatus() == CHSesame2ShadowStatus.LockedWm
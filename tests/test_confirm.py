@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+
+"""Tests for `pysesame3` package."""
+
+from unittest.mock import patch
+
+import pytest
+
+from pysesame3.auth import WebAPIAuth
+from pysesame3.chsesame2 import CHSesame2
+from pysesame3.confirm import CommandConfirmation, send_and_confirm
+from pysesame3.helper import CHSesame2MechStatus
+
+LOCKED = CHSesame2MechStatus("60030080f3ff0002")
+UNLOCKED = CHSesame2MechStatus("5c030503e3020004")
+
+
+@pytest.fixture
+def device():
+    return CHSesame2(
+        WebAPIAuth(apikey="FAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKE"),
+        device_uuid="126d3d66-9222-4e5a-bcde-0c6629d48d43",
+        secret_key="0b3e5f1665e143b59180c915fa4b06d9",
+        initial_sync=False,
+    )
+
+
+def _poller(device, *results):
+    results = list(results)
+
+    def _fetch():
+        result = results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        device._notifyStatusListeners(result)
+        return result
+
+    return _fetch
+
+
+class TestSendAndConfirm:
+    def test_send_and_confirm_keeps_polling_after_errors(self, device):
+        fetch = _poller(device, RuntimeError("HTTP 500"), UNLOCKED, LOCKED)
+        with patch.object(device, "fetchMechStatus", side_effect=fetch):
+            result = send_and_confirm(
+                device,
+                lambda: True,
+                lambda status: status.isInLockRange(),
+                timeout=5.0,
+                poll_interval=0.01,
+            )
+
+        assert result.confirmed
+        assert result.polls == 3
+        assert result.status is LOCKED
+        assert "confirmed=True" in str(result)
+
+    def test_send_and_confirm_learns_actuation_latency(self, device):
+        clock = iter(range(100))
+
+        def _fetch():
+            device._notifyStatusListeners(LOCKED)
+
+        with patch.object(device, "fetchMechStatus", side_effect=_fetch):
+            send_and_confirm(
+                device,
+                lambda: True,
+                lambda status: status.isInLockRange(),
+                poll_interval=0.01,
+                clock=lambda: next(clock) * 0.01,
+            )
+            # Started at 0, accepted at 1, polled at 3 after checking the deadline
+            assert device.actuationLatency == pytest.approx(0.02)
+
+            result = send_and_confirm(
+                device,
+                lambda: True,
+                lambda status: status.isInLockRange(),
+                poll_interval=0.01,
+                clock=lambda: next(clock) * 0.001,
+            )
+        assert result.actuationLatency == pytest.approx(0.002)
+        assert device.actuationLatency == pytest.approx(0.02 + 0.3 * (0.002 - 0.02))
+
+    def test_send_and_confirm_ignores_polls_after_push_grace(self, device):
+        device._subscribedTopics.append("topic")
+        device.recordActuation(0.5)
+
+        def _fetch():
+            device._notifyStatusListeners(LOCKED)
+
+        with patch.object(device, "fetchMechStatus", side_effect=_fetch):
+            result = send_and_confirm(
+                device,
+                lambda: True,
+                lambda status: status.isInLockRange(),
+                push_grace=0.05,
+            )
+
+        assert result.polls == 1
+        assert result.actuationLatency >= 0.05
+        # Bounded by the grace period rather than observed
+        assert device.actuationLatency == 0.5
+
+    def test_CommandConfirmation(self):
+        result = CommandConfirmation(False, False, None, 0.5)
+
+        assert not result
+        assert result.totalLatency is None
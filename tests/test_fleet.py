@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+
+"""Tests for `pysesame3` package."""
+
+import io
+import json
+import threading
+import time
+
+import pytest
+import requests_mock
+
+from pysesame3.auth import WebAPIAuth
+from pysesame3.chsesame2 import CHSesame2
+from pysesame3.chsesamebot import CHSesameBot
+from pysesame3.fleet import Fleet
+from pysesame3.helper import CHProductModel
+from pysesame3.registry import DeviceRegistry
+
+UUIDS = [
+    "126d3d66-9222-4e5a-bcde-0c6629d48d43",
+    "e0e56521-63d8-4da5-ba4b-c4a6a5e353f1",
+    "b7d5f2b1-9c0e-4f5a-8d3e-1a2b3c4d5e6f",
+]
+SECRET_KEY = "0b3e5f1665e143b59180c915fa4b06d9"
+
+
+@pytest.fixture
+def auth():
+    return WebAPIAuth(apikey="FAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKE")
+
+
+@pytest.fixture
+def fleet(auth):
+    fleet = Fleet(max_workers=4, history_tag="building")
+    fleet.add(
+        CHSesame2(auth, UUIDS[0], SECRET_KEY, initial_sync=False),
+        ["floor3", "door"],
+        "front",
+    )
+    fleet.add(CHSesame2(auth, UUIDS[1], SECRET_KEY, initial_sync=False), ["floor3"])
+    fleet.add(
+        CHSesameBot(auth, UUIDS[2], SECRET_KEY, initial_sync=False),
+        ["floor4", "door"],
+    )
+    return fleet
+
+
+class TestFleet:
+    def test_Fleet_raises_exception_on_invalid_max_workers(self):
+        with pytest.raises(ValueError):
+            Fleet(max_workers=0)
+
+    def test_Fleet_select(self, fleet):
+        assert len(fleet.select("floor3")) == 2
+        assert [d.getDeviceUUID() for d in fleet.select("floor3", "door")] == [
+            UUIDS[0].upper()
+        ]
+        assert len(fleet.select("door", model=CHProductModel.SesameBot1)) == 1
+        assert len(fleet.select("floor5")) == 0
+
+        selected = fleet.select("door")
+        front = selected.devices[0]
+        assert selected.getTags(front) == {"floor3", "door"}
+        assert selected.getHistoryTag(front) == "front"
+        assert selected.getHistoryTag(selected.devices[1]) == "building"
+
+        fleet.remove(front)
+        assert len(fleet) == 2
+        assert fleet.getTags(front) == set()
+        assert str(fleet) == "Fleet(devices=2)"
+
+    def test_Fleet_lock(self, fleet):
+        with requests_mock.Mocker() as mock:
+            mock.post(f"https://app.candyhouse.co/api/sesame2/{UUIDS[0]}/cmd")
+            mock.post(
+                f"https://app.candyhouse.co/api/sesame2/{UUIDS[1]}/cmd",
+                status_code=500,
+            )
+            outcomes = fleet.lock()
+
+            assert [o.device for o in outcomes] == fleet.devices
+            assert [o.success for o in outcomes] == [True, False, False]
+            assert [o.historyTag for o in outcomes] == ["front", "building", "building"]
+            assert outcomes[0].command == "lock"
+            assert outcomes[0].error is None
+            assert isinstance(outcomes[2].error, NotImplementedError)
+            assert all(o.latency >= 0 for o in outcomes)
+            assert "command=lock, success=True" in str(outcomes[0])
+
+            # The history tag is sent base64-encoded with the command
+            assert mock.call_count == 2
+            tags = {json.loads(r.text)["history"] for r in mock.request_history}
+            assert tags == {"ZnJvbnQ=", "YnVpbGRpbmc="}
+
+    def test_Fleet_click(self, fleet):
+        with requests_mock.Mocker() as mock:
+            mock.post(f"https://app.candyhouse.co/api/sesame2/{UUIDS[2]}/cmd")
+            outcomes = fleet.select("floor4").click("override")
+
+        assert [(o.success, o.historyTag) for o in outcomes] == [(True, "override")]
+        assert Fleet().click() == []
+
+    def test_Fleet_limits_concurrency(self, fleet):
+        lock = threading.Lock()
+        running = [0]
+        peak = [0]
+
+        def _command(device, tag):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.05)
+            with lock:
+                running[0] -= 1
+            return True
+
+        for i in range(10):
+            fleet.add(
+                CHSesame2(
+                    fleet.devices[0].authenticator,
+                    f"00000000-0000-0000-0000-{i:012d}",
+                    SECRET_KEY,
+                    initial_sync=False,
+                )
+            )
+        outcomes = fleet.run(_command)
+
+        assert len(outcomes) == 13
+        assert all(o.success and o.command == "_command" for o in outcomes)
+        assert 1 < peak[0] <= 4
+
+    def test_Fleet_fromRegistry(self, auth):
+        manifest = [
+            {
+                "uuid": UUIDS[0],
+                "secret_key": SECRET_KEY,
+                "model": "sesame_2",
+                "tags": "floor3 door",
+                "history_tag": "front",
+            },
+            {"uuid": UUIDS[1], "secret_key": SECRET_KEY, "model": "sesame_4"},
+        ]
+        registry = DeviceRegistry(auth)
+        registry.load(io.StringIO(json.dumps(manifest)), "json")
+        fleet = Fleet.fromRegistry(registry, history_tag="building")
+
+        assert [d.getDeviceUUID() for d in fleet.select("door")] == [UUIDS[0].upper()]
+        assert [fleet.getHistoryTag(d) for d in fleet] == ["front", "building"]
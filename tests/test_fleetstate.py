@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+
+"""Tests for `pysesame3` package."""
+
+import json
+
+import pytest
+
+from pysesame3.auth import WebAPIAuth
+from pysesame3.chsesame2 import CHSesame2
+from pysesame3.chsesamebot import CHSesameBot
+from pysesame3.const import CHSesame2ShadowStatus
+from pysesame3.fleetstate import FleetStateTable
+from pysesame3.helper import CHProductModel, CHSesame2MechStatus
+
+UUID = "126D3D66-9222-4E5A-BCDE-0C6629D48D43"
+BOT_UUID = "7A1E4DA7-5A69-4E5A-9F5B-3E1B4A2F9C10"
+SECRET_KEY = "0b3e5f1665e143b59180c915fa4b06d9"
+
+
+def _auth():
+    return WebAPIAuth(apikey="FAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKE")
+
+
+class TestFleetStateTable:
+    def test_FleetStateTable_applyMechst(self):
+        table = FleetStateTable()
+        row = table.add(UUID.lower(), SECRET_KEY)
+
+        assert len(table) == 1
+        assert UUID in table
+        assert not row.hasStatus()
+        assert row.getDeviceShadowStatus() is None
+        assert row.updatedAt is None
+
+        table.applyMechst(UUID, "60030080f3ff0002", updated_at=1000.0)
+        expected = CHSesame2MechStatus("60030080f3ff0002")
+        assert row.hasStatus()
+        assert row.deviceId == UUID
+        assert row.productModel == CHProductModel.SS2
+        assert row.getBatteryVoltage() == pytest.approx(expected.getBatteryVoltage())
+        assert row.getBatteryPercentage() == expected.getBatteryPercentage()
+        assert row.getPosition() == -13
+        assert row.isInLockRange()
+        assert not row.isInUnlockRange()
+        assert not row.isBatteryCritical()
+        assert row.getDeviceShadowStatus() == CHSesame2ShadowStatus.LockedWm
+        assert row.updatedAt == 1000.0
+
+        # Both ranges at once keep the previous lock state
+        table.applyMechst(UUID, bytes.fromhex("480200000000ff26"))
+        assert row.isInLockRange() and row.isInUnlockRange()
+        assert row.isBatteryCritical()
+        assert row.getDeviceShadowStatus() == CHSesame2ShadowStatus.LockedWm
+
+        assert "shadowStatus=CHSesame2ShadowStatus.LockedWm" in str(row)
+
+    def test_FleetStateTable_bot(self):
+        table = FleetStateTable()
+        row = table.add(BOT_UUID, SECRET_KEY, CHProductModel.SesameBot1)
+
+        table.applyMechst(BOT_UUID, "5503000007000104")
+        assert row.getPosition() == 7
+        assert row.isInUnlockRange()
+        assert row.getDeviceShadowStatus() == CHSesame2ShadowStatus.UnlockedWm
+
+    def test_FleetStateTable_raises_exception_on_invalid_input(self):
+        table = FleetStateTable()
+        table.add(UUID)
+
+        with pytest.raises(ValueError):
+            table.add(UUID)
+        with pytest.raises(ValueError):
+            table.add(BOT_UUID, "0b3e")
+        with pytest.raises(ValueError):
+            table.applyMechst(UUID, "6003")
+        with pytest.raises(KeyError):
+            table.view(BOT_UUID)
+
+        table.add(BOT_UUID, model=CHProductModel.WM2)
+        with pytest.raises(NotImplementedError):
+            table.applyMechst(BOT_UUID, "60030080f3ff0002")
+
+    def test_FleetStateTable_attach(self):
+        table = FleetStateTable()
+        device = CHSesame2(_auth(), UUID, SECRET_KEY, initial_sync=False)
+        table.attach(device)
+        row = table.view(UUID)
+
+        shadow = {"state": {"reported": {"mechst": "5c030503e3020004"}}}
+        device._iot_shadow_callback("topic", json.dumps(shadow).encode("utf-8"))
+        assert row.getPosition() == 739
+        assert row.getDeviceShadowStatus() == CHSesame2ShadowStatus.UnlockedWm
+
+        table.detach(device)
+        shadow = {"state": {"reported": {"mechst": "60030080f3ff0002"}}}
+        device._iot_shadow_callback("topic", json.dumps(shadow).encode("utf-8"))
+        assert row.getPosition() == 739
+
+    def test_DeviceRow_toDevice(self):
+        table = FleetStateTable()
+        table.add(UUID, SECRET_KEY, CHProductModel.SS4)
+        table.add(BOT_UUID, SECRET_KEY, CHProductModel.SesameBot1)
+        table.applyShadowStatus(UUID, CHSesame2ShadowStatus.LockedWm)
+
+        device = table.view(UUID).toDevice(_auth())
+        assert isinstance(device, CHSesame2)
+        assert device.getDeviceUUID() == UUID
+        assert device.getSecretKey() == bytes.fromhex(SECRET_KEY)
+        assert device.productModel == CHProductModel.SS4
+        assert device.getDeviceShadowStatus() == CHSesame2ShadowStatus.LockedWm
+
+        assert isinstance(table.view(BOT_UUID).toDevice(_auth()), CHSesameBot)
+        assert [row.deviceId for row in table] == [UUID, BOT_UUID]
+
+    def test_DeviceRow_toDevice_raises_exception_without_secret_key(self):
+        table = FleetStateTable()
+        row = table.add(UUID)
+        table.applyMechst(UUID, "60030080f3ff0002")
+
+        # Storing a status keeps the flag
+        assert row.hasStatus()
+        assert not row.hasSecretKey()
+        with pytest.raises(ValueError):
+            row.toDevice(_auth())
+        assert table.add(BOT_UUID, SECRET_KEY).hasSecretKey()
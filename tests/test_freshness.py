@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+
+"""Tests for `pysesame3` package."""
+
+import json
+from unittest.mock import MagicMock
+
+import boto3
+import pytest
+from awscrt import mqtt
+from moto import mock_cognitoidentity
+
+from pysesame3.auth import CognitoAuth, WebAPIAuth
+from pysesame3.chsesame2 import CHSesame2
+from pysesame3.cloud import AWSIoTPool
+from pysesame3.const import UpdateChannel
+from pysesame3.freshness import FreshnessManager
+from pysesame3.polling import PollingScheduler
+
+from .utils import load_fixture
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture()
+def cognito_auth():
+    with mock_cognitoidentity():
+        cognito_identity = boto3.client(
+            "cognito-identity", region_name="ap-northeast-1"
+        )
+        identity_pool_data = cognito_identity.create_identity_pool(
+            IdentityPoolName="test_identity_pool",
+            AllowUnauthenticatedIdentities=False,
+        )
+        auth = CognitoAuth(
+            apikey="FAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKE",
+            client_id=identity_pool_data["IdentityPoolId"],
+        )
+        auth.requests = 0
+
+        def _getMechStatus(device):
+            auth.requests += 1
+            return load_fixture("lock_get_locked.json")
+
+        auth.sesame_cloud.getMechStatus = _getMechStatus
+        yield auth
+
+
+@pytest.fixture()
+def clock():
+    return _Clock()
+
+
+@pytest.fixture()
+def manager(clock):
+    scheduler = PollingScheduler(interval=60.0, budget=10.0, clock=clock)
+    return FreshnessManager(scheduler, stale_after=300.0, clock=clock)
+
+
+def _device(auth, i=1):
+    return CHSesame2(
+        auth,
+        device_uuid="126d3d66-9222-4e5a-bcde-0c6629d48d4{}".format(i),
+        secret_key="0b3e5f1665e143b59180c915fa4b06d9",
+        initial_sync=False,
+    )
+
+
+def _push(device, mechst):
+    shadow = {"state": {"reported": {"mechst": mechst}}}
+    device._iot_shadow_callback("topic", json.dumps(shadow).encode("utf-8"))
+
+
+class TestFreshnessManager:
+    def test_FreshnessManager_falls_back_on_interruption(
+        self, cognito_auth, clock, manager
+    ):
+        devices = [_device(cognito_auth, i) for i in range(3)]
+        for device in devices:
+            manager.track(device)
+        manager.track(devices[0])
+        changes = []
+        manager.addFreshnessListener(
+            lambda device, channel: changes.append((device, channel))
+        )
+        aws_iot = cognito_auth.aws_iot
+
+        assert len(manager) == 3
+        manager.check()
+        assert changes == []
+
+        aws_iot._on_connection_interrupted(MagicMock(), MagicMock())
+        manager.check()
+        assert [channel for _, channel in changes] == [UpdateChannel.Poll] * 3
+        assert manager.getChannel(devices[0]) == UpdateChannel.Poll
+        assert len(manager.scheduler) == 3
+        assert manager.fallbacks == 3
+
+        # Polled while disconnected
+        clock.now += 60
+        assert len(manager.scheduler.runOnce()) == 3
+        assert cognito_auth.requests == 3
+
+        aws_iot._on_connection_resumed(
+            MagicMock(), mqtt.ConnectReturnCode.ACCEPTED, True
+        )
+        manager.check()
+        # One reconciliation fetch each, then back to push
+        assert cognito_auth.requests == 6
+        assert manager.reconciliations == 3
+        assert manager.getChannel(devices[0]) == UpdateChannel.Push
+        assert [channel for _, channel in changes[3:]] == [UpdateChannel.Push] * 3
+        clock.now += 1000
+        assert manager.scheduler.runOnce() == []
+
+    def test_FreshnessManager_reconciles_after_short_outages(
+        self, cognito_auth, manager
+    ):
+        device = _device(cognito_auth)
+        manager.track(device)
+        aws_iot = cognito_auth.aws_iot
+
+        # Interrupted and resumed between two checks
+        aws_iot._on_connection_interrupted(MagicMock(), MagicMock())
+        aws_iot._on_connection_resumed(
+            MagicMock(), mqtt.ConnectReturnCode.ACCEPTED, True
+        )
+        manager.check()
+
+        assert cognito_auth.requests == 1
+        assert manager.getChannel(device) == UpdateChannel.Push
+        manager.check()
+        assert cognito_auth.requests == 1
+
+    def test_FreshnessManager_reconciles_only_the_resumed_connection(
+        self, cognito_auth, manager
+    ):
+        pool = AWSIoTPool(cognito_auth, 2)
+        cognito_auth._aws_iot = pool
+        devices = [_device(cognito_auth, i) for i in range(8)]
+        for device in devices:
+            manager.track(device)
+        first, second = pool.shards
+        members = [d for d in devices if pool.getShard(d.getDeviceUUID()) is first]
+        assert 0 < len(members) < len(devices)
+
+        first._on_connection_interrupted(MagicMock(), MagicMock())
+        first._on_connection_resumed(MagicMock(), mqtt.ConnectReturnCode.ACCEPTED, True)
+        manager.check()
+
+        # The devices of the other connection did not miss any update
+        assert cognito_auth.requests == len(members)
+        assert manager.reconciliations == len(members)
+        assert manager.fallbacks == 0
+
+    def test_FreshnessManager_falls_back_on_silence(self, cognito_auth, clock, manager):
+        device = _device(cognito_auth)
+        manager.track(device)
+
+        clock.now += 200
+        _push(device, "60030080f3ff0002")
+        assert manager.getAge(device) == 0
+        clock.now += 299
+        manager.check()
+        assert manager.isFresh(device)
+        assert manager.getChannel(device) == UpdateChannel.Push
+
+        clock.now += 2
+        assert not manager.isFresh(device)
+        manager.check()
+        assert manager.getChannel(device) == UpdateChannel.Poll
+
+        # HTTP polls keep it fresh but do not prove push works
+        clock.now += 60
+        manager.scheduler.runOnce()
+        assert manager.isFresh(device)
+        assert manager.getChannel(device) == UpdateChannel.Poll
+
+        _push(device, "5c030503e3020004")
+        assert manager.getChannel(device) == UpdateChannel.Push
+        assert len(manager.scheduler) == 0
+
+        manager.untrack(device)
+        with pytest.raises(KeyError):
+            manager.getChannel(device)
+
+    def test_FreshnessManager_raises_exception_on_invalid_input(self, manager):
+        device = _device(WebAPIAuth(apikey="FAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKE"))
+
+        with pytest.raises(NotImplementedError):
+            manager.track(device)
+        with pytest.raises(TypeError):
+            manager.addFreshnessListener("listener")
+        with pytest.raises(ValueError):
+            FreshnessManager(stale_after=0)
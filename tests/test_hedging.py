@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+
+"""Tests for `pysesame3` package."""
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock
+
+import pytest
+
+from pysesame3.auth import WebAPIAuth
+from pysesame3.chsesame2 import CHSesame2
+from pysesame3.const import CHSesame2CMD
+from pysesame3.hedging import ReadHedger
+
+from .utils import load_fixture
+
+UUID = "126D3D66-9222-4E5A-BCDE-0C6629D48D43"
+
+
+class TestReadHedger:
+    def test_ReadHedger_getDelay(self):
+        hedger = ReadHedger(percentile=95, window=100, min_samples=10, initial_delay=2)
+
+        assert hedger.getDelay() == 2
+        for i in range(1, 101):
+            hedger.record(i / 1000)
+        assert hedger.getDelay() == pytest.approx(0.095)
+        # Only the most recent latencies are kept
+        for _ in range(100):
+            hedger.record(0.001)
+        assert hedger.getDelay() == 0.01
+
+    def test_ReadHedger_run(self):
+        hedger = ReadHedger(initial_delay=0.05)
+        release = threading.Event()
+        calls = []
+
+        def _read():
+            calls.append(None)
+            if len(calls) == 1:
+                release.wait(5)
+                return "slow"
+            return "fast"
+
+        assert hedger.run(lambda: "ok") == "ok"
+        assert hedger.hedges == 0
+
+        assert hedger.run(_read) == "fast"
+        release.set()
+        assert (hedger.requests, hedger.hedges, hedger.wins) == (2, 1, 1)
+        assert "hedges=1" in str(hedger)
+        hedger.close()
+
+    def test_ReadHedger_run_raises_exception_if_both_fail(self):
+        hedger = ReadHedger(initial_delay=0.01)
+        calls = []
+
+        def _read():
+            calls.append(None)
+            if len(calls) == 1:
+                threading.Event().wait(0.1)
+                raise RuntimeError("primary")
+            raise RuntimeError("hedge")
+
+        with hedger, pytest.raises(RuntimeError, match="primary"):
+            hedger.run(_read)
+        assert hedger.hedges == 1
+        assert hedger.wins == 0
+
+    def test_ReadHedger_run_does_not_queue_reads(self):
+        hedger = ReadHedger(initial_delay=10, max_hedges=2)
+        # Would never be reached if reads waited for a pool of threads
+        barrier = threading.Barrier(20, timeout=5)
+
+        def _read():
+            barrier.wait()
+            return "ok"
+
+        with ThreadPoolExecutor(max_workers=20) as executor:
+            results = list(executor.map(lambda _: hedger.run(_read), range(20)))
+
+        assert results == ["ok"] * 20
+        assert hedger.hedges == 0
+
+    def test_ReadHedger_run_bounds_reads(self):
+        hedger = ReadHedger(initial_delay=10, max_reads=2)
+        barrier = threading.Barrier(5, timeout=5)
+        threads = set()
+
+        def _read():
+            threads.add(threading.current_thread().name)
+            barrier.wait()
+            return "ok"
+
+        with ThreadPoolExecutor(max_workers=5) as executor:
+            results = list(executor.map(lambda _: hedger.run(_read), range(5)))
+
+        assert results == ["ok"] * 5
+        assert hedger.inline == 3
+        assert len([t for t in threads if t.startswith("pysesame3-hedging")]) == 2
+        assert "inline=3" in str(hedger)
+        hedger.close()
+
+    def test_ReadHedger_run_bounds_hedges(self):
+        hedger = ReadHedger(initial_delay=0.01, max_hedges=1)
+        release = threading.Event()
+
+        def _read():
+            release.wait(5)
+            return "ok"
+
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            futures = [executor.submit(hedger.run, _read) for _ in range(3)]
+            threading.Event().wait(0.2)
+            release.set()
+            assert [f.result() for f in futures] == ["ok"] * 3
+
+        assert (hedger.hedges, hedger.skipped) == (1, 2)
+        assert "skipped=2" in str(hedger)
+        hedger.close()
+
+    def test_ReadHedger_runAsync(self):
+        hedger = ReadHedger(initial_delay=0.05)
+        cancelled = []
+
+        async def _slow():
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.append(None)
+                raise
+            return "slow"
+
+        async def _fast():
+            return "fast"
+
+        reads = [_slow, _fast]
+
+        async def _run():
+            result = await hedger.runAsync(lambda: reads.pop(0)())
+            await asyncio.sleep(0)
+            return result
+
+        assert asyncio.run(_run()) == "fast"
+        assert cancelled == [None]
+        assert (hedger.hedges, hedger.wins) == (1, 1)
+
+    def test_ReadHedger_with_SesameCloud(self):
+        executor = ThreadPoolExecutor(max_workers=4)
+        hedger = ReadHedger(initial_delay=0.05, executor=executor)
+        auth = WebAPIAuth(apikey="FAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKE")
+        device = CHSesame2(
+            auth, UUID, "0b3e5f1665e143b59180c915fa4b06d9", initial_sync=False
+        )
+        cloud = auth.sesame_cloud
+        cloud.setHedger(hedger)
+        assert cloud.hedger is hedger
+        methods = []
+
+        def _requestAPI(method, url, json=None):
+            methods.append(method)
+            if len(methods) == 1:
+                # The first read is slow
+                threading.Event().wait(0.5)
+            response = MagicMock()
+            response.ok = True
+            response.json.return_value = load_fixture("lock_get_locked.json")
+            return response
+
+        cloud.requestAPI = _requestAPI
+        assert device.fetchMechStatus().isInLockRange()
+        assert (hedger.requests, hedger.hedges, hedger.wins) == (1, 1, 1)
+
+        hedger = ReadHedger(initial_delay=0, min_delay=0, executor=executor)
+        cloud.setHedger(hedger)
+        assert cloud.sendCmd(device, CHSesame2CMD.LOCK)
+        executor.shutdown(wait=True)
+
+        # Commands are never hedged
+        assert methods == ["GET", "GET", "POST"]
+        assert hedger.requests == 0
+
+    def test_ReadHedger_raises_exception_on_invalid_input(self):
+        with pytest.raises(ValueError):
+            ReadHedger(percentile=0)
+        with pytest.raises(ValueError):
+            ReadHedger(window=0)
+        with pytest.raises(ValueError):
+            ReadHedger(max_hedges=0)
+        with pytest.raises(ValueError):
+            ReadHedger(max_reads=0)
@@ -2,9 +2,14 @@
 
 """Tests for `pysesame3` package."""
 
+from unittest.mock import patch
+
 import pytest
 
 from pysesame3.helper import (
+    SESAME2_BATTERY_CURVE,
+    SESAMEBOT_BATTERY_CURVE,
+    BatteryCurve,
     CHProductModel,
     CHSesame2MechStatus,
     CHSesameBotMechStatus,
@@ -63,6 +68,77 @@ class TestCHProductModel:
     def test_CHProductModel_getByValue_returns_SS2(self):
         assert CHProductModel.getByValue(0) is CHProductModel.SS2
 
+    def test_CHProductModel_lookups_cover_every_model(self):
+        for model in CHProductModel:
+            assert CHProductModel.getByModel(model.deviceModel()) is model
+            assert CHProductModel.getByValue(model.productType()) is model
+
+    def test_CHProductModel_deviceFactory_is_cached(self):
+        from pysesame3.chsesame2 import CHSesame2
+        from pysesame3.chsesamebot import CHSesameBot
+
+        assert CHProductModel.SS2.deviceFactory() is CHSesame2
+        assert CHProductModel.SS4.deviceFactory() is CHSesame2
+        assert CHProductModel.SesameBot1.deviceFactory() is CHSesameBot
+
+        with patch("importlib.import_module") as import_module:
+            CHProductModel.SS2.deviceFactory()
+        import_module.assert_not_called()
+
+        with pytest.raises(NotImplementedError):
+            CHProductModel.WM2.deviceFactory()
+
+
+def _legacy_battery_percentage(voltage, voltages, percentages):
+    """The linear search `getBatteryPercentage` used to perform."""
+    if voltage >= voltages[0]:
+        return 100
+    if voltage <= voltages[-1]:
+        return 0
+    i = 0
+    while i < len(voltages) - 1:
+        if voltage > voltages[i] or voltage <= voltages[i + 1]:
+            i += 1
+        else:
+            f = (voltage - voltages[i + 1]) / (voltages[i] - voltages[i + 1])
+            f3 = percentages[i]
+            f4 = percentages[i + 1]
+            return int(f4 + (f * (f3 - f4)))
+    return 0
+
+
+class TestBatteryCurve:
+    @pytest.mark.parametrize(
+        "curve,voltages",
+        [
+            (
+                SESAME2_BATTERY_CURVE,
+                (6.0, 5.8, 5.7, 5.6, 5.4, 5.2, 5.1, 5.0, 4.8, 4.6),
+            ),
+            (
+                SESAMEBOT_BATTERY_CURVE,
+                (3.0, 2.9, 2.85, 2.8, 2.7, 2.6, 2.55, 2.5, 2.4, 2.3),
+            ),
+        ],
+    )
+    def test_BatteryCurve_matches_linear_search(self, curve, voltages):
+        percentages = (100.0, 50.0, 40.0, 32.0, 21.0, 13.0, 10.0, 7.0, 3.0, 0.0)
+
+        # Sweep the whole curve, including every knot and values outside of it
+        samples = [voltages[-1] - 1 + i * 0.0005 for i in range(int(4 / 0.0005))]
+        samples += list(voltages)
+        for voltage in samples:
+            assert curve.getPercentage(voltage) == _legacy_battery_percentage(
+                voltage, voltages, percentages
+            ), voltage
+
+    def test_BatteryCurve_raises_exception_on_invalid_table(self):
+        with pytest.raises(ValueError):
+            BatteryCurve((6.0, 5.0), (100.0,))
+
+        with pytest.raises(ValueError):
+            BatteryCurve((5.0, 6.0), (100.0, 0.0))
+
 
 class TestCHSesameProtocolMechStatus:
     def test_TestCHSesameProtocolMechStatus_raises_exception_on_emtry_arguments(self):
@@ -194,6 +270,41 @@ class TestCHSesame2MechStatus:
 
         assert status.getBatteryPrecentage() == status.getBatteryPercentage()
 
+    def test_CHSesame2MechStatus_classmethods(self):
+        raw = bytes.fromhex("5c030503e3020004")
+        for status in [
+            CHSesame2MechStatus.from_hex("5c030503e3020004"),
+            CHSesame2MechStatus.from_bytes(raw),
+            CHSesame2MechStatus.from_bytes(bytearray(raw)),
+            CHSesame2MechStatus.from_bytes(memoryview(b"\x00" + raw)[1:]),
+        ]:
+            assert isinstance(status, CHSesame2MechStatus)
+            assert str(status) == str(CHSesame2MechStatus("5c030503e3020004"))
+
+        status = CHSesame2MechStatus.from_webapi(
+            {
+                "batteryVoltage": 5.869794721407625,
+                "position": 11,
+                "CHSesame2Status": "locked",
+            }
+        )
+        assert (
+            str(status)
+            == "CHSesame2MechStatus(Battery=67% (5.87V), isInLockRange=True, isInUnlockRange=False, position=11)"
+        )
+
+    def test_CHSesame2MechStatus_uses_slots(self):
+        status = CHSesame2MechStatus.from_hex("5c030503e3020004")
+        assert not hasattr(status, "__dict__")
+        with pytest.raises(AttributeError):
+            status.unknown = 1
+
+    def test_CHSesame2MechStatus_raises_exception_on_short_data(self):
+        with pytest.raises(ValueError):
+            CHSesame2MechStatus("5c0305")
+        with pytest.raises(ValueError):
+            CHSesame2MechStatus.from_bytes(b"\x00")
+
 
 class TestCHSesameBotMechStatus:
     def test_CHSesameBotMechStatus_raises_exception_on_emtry_arguments(self):
@@ -248,6 +359,17 @@ class TestCHSesameBotMechStatus:
 
         assert status.getBatteryPrecentage() == status.getBatteryPercentage()
 
+    def test_CHSesameBotMechStatus_classmethods(self):
+        status = CHSesameBotMechStatus.from_hex("3003000000000102")
+        assert isinstance(status, CHSesameBotMechStatus)
+        assert status.getBatteryVoltage() == 2.8715542521994135
+        assert status.isInLockRange()
+        assert not hasattr(status, "__dict__")
+
+        status = CHSesameBotMechStatus.from_bytes(bytes.fromhex("5503000007000104"))
+        assert status.getMotorStatus() == 7
+        assert status.isInUnlockRange()
+
 
 class TestRegexHelper:
     def test_get_aws_region_raises_exception_with_unknown_str(self):
@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+
+"""Tests for `pysesame3` package."""
+
+import io
+import json
+
+import pytest
+import requests_mock
+
+from pysesame3.auth import WebAPIAuth
+from pysesame3.keypool import APIKeyPool
+from pysesame3.registry import DeviceRegistry
+
+from .utils import load_fixture
+
+UUIDS = [
+    "126D3D66-9222-4E5A-BCDE-0C6629D48D43",
+    "7A1E4DA7-5A69-4E5A-9F5B-3E1B4A2F9C10",
+    "C3B0F1E2-1D2C-4B5A-8F9E-0A1B2C3D4E5F",
+]
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _auth(i):
+    return WebAPIAuth(apikey="FAKE{}".format(i) * 8)
+
+
+def _url(device_uuid):
+    return "https://app.candyhouse.co/api/sesame2/{}".format(device_uuid)
+
+
+class TestAPIKeyPool:
+    def test_APIKeyPool_assign(self):
+        pool = APIKeyPool({"tokyo": _auth(1), "osaka": _auth(2)})
+
+        assert pool.names == ["tokyo", "osaka"]
+        assert pool.assign(UUIDS[0]) is pool.getAuthenticator("tokyo")
+        assert pool.assign(UUIDS[1]) is pool.getAuthenticator("osaka")
+        assert pool.assign(UUIDS[2], "osaka") is pool.getAuthenticator("osaka")
+        # Sticky
+        assert pool.assign(UUIDS[0].lower()) is pool.getAuthenticator("tokyo")
+        assert pool.getKeyName(UUIDS[2]) == "osaka"
+        assert pool.getKeyName("00000000-0000-0000-0000-000000000000") is None
+        assert [u.devices for u in pool.getUsage()] == [1, 2]
+
+        with pytest.raises(ValueError):
+            pool.assign(UUIDS[0], "osaka")
+        with pytest.raises(KeyError):
+            pool.assign("00000000-0000-0000-0000-000000000000", "nagoya")
+
+    def test_APIKeyPool_with_DeviceRegistry(self):
+        pool = APIKeyPool([_auth(1), _auth(2)])
+        manifest = [
+            {
+                "uuid": device_uuid,
+                "secret_key": "0b3e5f1665e143b59180c915fa4b06d9",
+                "model": "sesame_2",
+                "key_name": "1",
+            }
+            for device_uuid in UUIDS
+        ]
+        registry = DeviceRegistry.fromManifest(
+            pool, io.StringIO(json.dumps(manifest)), "json"
+        )
+
+        assert all(d.authenticator is pool.getAuthenticator("1") for d in registry)
+        assert registry.getMetadata(UUIDS[0]) == {"key_name": "1"}
+
+        # A duplicate is rejected before any key is assigned to it
+        with pytest.raises(ValueError, match="Duplicate device"):
+            registry.add(
+                UUIDS[0].lower(),
+                "0b3e5f1665e143b59180c915fa4b06d9",
+                "SS2",
+                key_name="0",
+            )
+        assert [u.devices for u in pool.getUsage()] == [0, 3]
+
+    def test_APIKeyPool_budgets(self):
+        clock = _Clock()
+        pool = APIKeyPool(
+            [_auth(1), _auth(2)], rate=1.0, burst=2, timeout=0, clock=clock
+        )
+        registry = DeviceRegistry(pool)
+        first = registry.add(UUIDS[0], "0b3e5f1665e143b59180c915fa4b06d9", "SS2")
+        second = registry.add(UUIDS[1], "0b3e5f1665e143b59180c915fa4b06d9", "SS2")
+        assert first.authenticator is not second.authenticator
+
+        with requests_mock.Mocker() as mock:
+            for device_uuid in UUIDS[:2]:
+                mock.get(_url(device_uuid), json=load_fixture("lock_get_locked.json"))
+
+            first.fetchMechStatus()
+            first.fetchMechStatus()
+            with pytest.raises(RuntimeError):
+                first.fetchMechStatus()
+            # The other key has its own budget
+            second.fetchMechStatus()
+            assert mock.call_count == 3
+
+            clock.now += 1
+            first.fetchMechStatus()
+
+        usage = pool.getUsage()
+        assert [u.requests for u in usage] == [3, 1]
+        assert "requests=3" in str(usage[0])
+
+    def test_APIKeyPool_backs_off_on_429(self):
+        clock = _Clock()
+        pool = APIKeyPool([_auth(1)], rate=1.0, burst=5, timeout=0, clock=clock)
+        device = DeviceRegistry(pool).add(
+            UUIDS[0], "0b3e5f1665e143b59180c915fa4b06d9", "SS2"
+        )
+
+        with requests_mock.Mocker() as mock:
+            mock.get(
+                _url(UUIDS[0]),
+                [
+                    {"status_code": 429, "headers": {"Retry-After": "30"}},
+                    {"json": load_fixture("lock_get_locked.json")},
+                ],
+            )
+            with pytest.raises(RuntimeError):
+                device.fetchMechStatus()
+            (usage,) = pool.getUsage()
+            assert usage.throttled == 1
+            assert usage.tokens == 0
+
+            clock.now += 29
+            with pytest.raises(RuntimeError):
+                device.fetchMechStatus()
+            assert mock.call_count == 1
+
+            clock.now += 2
+            assert device.fetchMechStatus().isInLockRange()
+
+    def test_APIKeyPool_raises_exception_on_invalid_input(self):
+        auth = _auth(1)
+
+        with pytest.raises(ValueError):
+            APIKeyPool([])
+        with pytest.raises(ValueError):
+            APIKeyPool([auth, auth])
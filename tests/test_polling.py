@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+
+"""Tests for `pysesame3` package."""
+
+import time
+import uuid
+
+import pytest
+
+from pysesame3.auth import WebAPIAuth
+from pysesame3.chsesame2 import CHSesame2
+from pysesame3.const import CHSesame2CMD
+from pysesame3.polling import PollingScheduler, TokenBucket
+
+from .utils import load_fixture
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class _Cloud:
+    """Answers status requests from a fixture, counting them."""
+
+    def __init__(self, auth):
+        self.fixture = "lock_get_locked.json"
+        self.requests = 0
+        auth.sesame_cloud.getMechStatus = self._getMechStatus
+        auth.sesame_cloud.sendCmd = lambda *_: True
+
+    def _getMechStatus(self, device):
+        self.requests += 1
+        return load_fixture(self.fixture)
+
+
+@pytest.fixture
+def auth():
+    return WebAPIAuth(apikey="FAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKE")
+
+
+def _devices(auth, count):
+    return [
+        CHSesame2(
+            auth,
+            device_uuid=str(uuid.UUID(int=i + 1)),
+            secret_key="0b3e5f1665e143b59180c915fa4b06d9",
+            initial_sync=False,
+        )
+        for i in range(count)
+    ]
+
+
+class TestTokenBucket:
+    def test_TokenBucket(self):
+        clock = _Clock()
+        bucket = TokenBucket(rate=2.0, capacity=2.0, clock=clock)
+
+        assert bucket.tryAcquire()
+        assert bucket.tryAcquire()
+        assert not bucket.tryAcquire()
+        assert bucket.getDelay() == pytest.approx(0.5)
+
+        clock.now += 0.5
+        assert bucket.tryAcquire()
+
+        # Throttled by the server
+        bucket.drain(10.0)
+        clock.now += 5.0
+        assert not bucket.tryAcquire()
+        assert bucket.getDelay() == pytest.approx(5.5)
+        clock.now += 5.5
+        assert bucket.tryAcquire()
+
+    def test_TokenBucket_raises_exception_on_invalid_input(self):
+        with pytest.raises(ValueError):
+            TokenBucket(rate=0)
+        with pytest.raises(ValueError):
+            TokenBucket(rate=1, capacity=0)
+
+
+class TestPollingScheduler:
+    def test_PollingScheduler_spreads_polls(self, auth):
+        clock = _Clock()
+        scheduler = PollingScheduler(interval=60.0, budget=100.0, clock=clock)
+        devices = _devices(auth, 50)
+        for device in devices:
+            scheduler.add(device)
+        scheduler.add(devices[0])
+
+        assert len(scheduler) == 50
+        offsets = sorted(scheduler.getNextPoll(d) for d in devices)
+        assert all(0 <= offset < 60 for offset in offsets)
+        assert len(set(offsets)) == 50
+        # No burst: at most a handful of devices in any 5 seconds
+        assert max(sum(1 for o in offsets if s <= o < s + 5) for s in range(60)) < 15
+
+    def test_PollingScheduler_adapts_intervals(self, auth):
+        clock = _Clock()
+        cloud = _Cloud(auth)
+        scheduler = PollingScheduler(
+            interval=60.0, min_interval=10.0, max_interval=100.0, clock=clock
+        )
+        (device,) = _devices(auth, 1)
+        scheduler.add(device)
+
+        clock.now += 60
+        assert scheduler.runOnce() == [device]
+        assert scheduler.runOnce() == []
+        # Idle: stretched
+        assert scheduler.getInterval(device) == 90.0
+
+        clock.now += 90
+        cloud.fixture = "lock_get_unlocked.json"
+        scheduler.runOnce()
+        # Activity: shortened
+        assert scheduler.getInterval(device) == 10.0
+
+        clock.now += 10
+        scheduler.runOnce()
+        assert scheduler.getInterval(device) == 15.0
+        for _ in range(10):
+            clock.now += scheduler.getNextPoll(device)
+            scheduler.runOnce()
+        assert scheduler.getInterval(device) == 100.0
+        assert scheduler.polls == cloud.requests == 13
+
+        # A status seen elsewhere also counts as activity
+        cloud.fixture = "lock_get_locked.json"
+        device.fetchMechStatus()
+        assert scheduler.getNextPoll(device) == 10.0
+
+        scheduler.remove(device)
+        clock.now += 1000
+        assert scheduler.runOnce() == []
+
+    def test_PollingScheduler_polls_sooner_with_commands(self, auth):
+        clock = _Clock()
+        _Cloud(auth)
+        scheduler = PollingScheduler(
+            interval=60.0, min_interval=10.0, max_interval=600.0, clock=clock
+        )
+        (device,) = _devices(auth, 1)
+        scheduler.add(device)
+        clock.now += 60
+        scheduler.runOnce()
+        assert scheduler.getNextPoll(device) == 90.0
+
+        assert scheduler.enqueue(device, CHSesame2CMD.LOCK).result(5)
+        assert scheduler.getNextPoll(device) == 10.0
+
+    def test_PollingScheduler_stays_within_budget(self, auth):
+        clock = _Clock()
+        cloud = _Cloud(auth)
+        scheduler = PollingScheduler(interval=60.0, budget=1.0, burst=2, clock=clock)
+        for device in _devices(auth, 10):
+            scheduler.add(device)
+
+        clock.now += 60
+        assert len(scheduler.runOnce()) == 2
+        assert scheduler.deferred == 1
+        clock.now += 1
+        assert len(scheduler.runOnce()) == 1
+        clock.now += 7
+        assert len(scheduler.runOnce()) == 2
+        assert cloud.requests == 5
+
+    def test_PollingScheduler_survives_failures(self, auth):
+        clock = _Clock()
+        scheduler = PollingScheduler(interval=60.0, clock=clock)
+        (device,) = _devices(auth, 1)
+
+        def _fail(_):
+            raise RuntimeError("HTTP 500")
+
+        auth.sesame_cloud.getMechStatus = _fail
+        scheduler.add(device)
+        clock.now += 60
+        scheduler.runOnce()
+
+        assert scheduler.failures == 1
+        assert scheduler.getInterval(device) == 60.0
+
+    def test_PollingScheduler_background(self, auth):
+        cloud = _Cloud(auth)
+        scheduler = PollingScheduler(
+            interval=0.1, min_interval=0.05, max_interval=0.2, budget=100.0
+        )
+        for device in _devices(auth, 3):
+            scheduler.add(device)
+
+        with scheduler:
+            deadline = time.monotonic() + 5
+            while cloud.requests < 6 and time.monotonic() < deadline:
+                time.sleep(0.01)
+        assert cloud.requests >= 6
+
+    def test_PollingScheduler_raises_exception_on_invalid_input(self):
+        with pytest.raises(ValueError):
+            PollingScheduler(interval=5.0, min_interval=10.0)
+        with pytest.raises(ValueError):
+            PollingScheduler(backoff=0.5)
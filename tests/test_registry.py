@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+
+"""Tests for `pysesame3` package."""
+
+import io
+import json
+
+import pytest
+
+from pysesame3.auth import WebAPIAuth
+from pysesame3.chsesame2 import CHSesame2
+from pysesame3.chsesamebot import CHSesameBot
+from pysesame3.helper import CHProductModel
+from pysesame3.registry import DeviceRegistry, parse_model
+
+MANIFEST = [
+    {
+        "uuid": "126d3d66-9222-4e5a-bcde-0c6629d48d43",
+        "secret_key": "0b3e5f1665e143b59180c915fa4b06d9",
+        "model": "sesame_2",
+        "name": "Front door",
+    },
+    {
+        "uuid": "e0e56521-63d8-4da5-ba4b-c4a6a5e353f1",
+        "secret_key": "0b3e5f1665e143b59180c915fa4b06d9",
+        "model": "SS4",
+        "name": "Back door",
+    },
+    {
+        "uuid": "b7d5f2b1-9c0e-4f5a-8d3e-1a2b3c4d5e6f",
+        "secret_key": "0b3e5f1665e143b59180c915fa4b06d9",
+        "model": 2,
+        "name": "Light switch",
+    },
+]
+
+
+@pytest.fixture
+def auth():
+    return WebAPIAuth(apikey="FAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKE")
+
+
+class TestDeviceRegistry:
+    def test_parse_model(self):
+        assert parse_model("sesame_4") is CHProductModel.SS4
+        assert parse_model("SesameBot1") is CHProductModel.SesameBot1
+        assert parse_model("0") is CHProductModel.SS2
+        assert parse_model(CHProductModel.SS2) is CHProductModel.SS2
+
+        with pytest.raises(NotImplementedError):
+            parse_model("sesame_99")
+
+    def _assert_manifest(self, registry):
+        assert len(registry) == 3
+        front = registry.get("126D3D66-9222-4E5A-BCDE-0C6629D48D43")
+        back = registry.get("e0e56521-63d8-4da5-ba4b-c4a6a5e353f1")
+        bot = registry.get("b7d5f2b1-9c0e-4f5a-8d3e-1a2b3c4d5e6f")
+
+        assert isinstance(front, CHSesame2)
+        assert front.productModel is CHProductModel.SS2
+        assert isinstance(back, CHSesame2)
+        assert back.productModel is CHProductModel.SS4
+        assert isinstance(bot, CHSesameBot)
+        assert front.lastMechStatus is None
+
+        assert registry.getMetadata(back.getDeviceUUID()) == {"name": "Back door"}
+        assert registry.getByModel(CHProductModel.SesameBot1) == [bot]
+        assert "b7d5f2b1-9c0e-4f5a-8d3e-1a2b3c4d5e6f" in registry
+        assert list(registry) == [front, back, bot]
+        assert str(registry) == "DeviceRegistry(devices=3)"
+
+    def test_DeviceRegistry_loads_json(self, auth, tmp_path):
+        path = tmp_path / "devices.json"
+        path.write_text(json.dumps(MANIFEST))
+
+        self._assert_manifest(DeviceRegistry.fromManifest(auth, path))
+
+    def test_DeviceRegistry_loads_csv(self, auth, tmp_path):
+        path = tmp_path / "devices.csv"
+        lines = ["uuid,secret_key,model,name"] + [
+            ",".join(str(e[k]) for k in ("uuid", "secret_key", "model", "name"))
+            for e in MANIFEST
+        ]
+        path.write_text("\n".join(lines) + "\n")
+
+        self._assert_manifest(DeviceRegistry.fromManifest(auth, str(path)))
+
+    def test_DeviceRegistry_raises_exception_on_invalid_manifest(self, auth):
+        registry = DeviceRegistry(auth)
+
+        with pytest.raises(ValueError):
+            registry.load(io.StringIO("[]"))
+        with pytest.raises(ValueError):
+            registry.load(io.StringIO("{}"), "json")
+        with pytest.raises(ValueError):
+            registry.load(io.StringIO(""), "yaml")
+        with pytest.raises(ValueError):
+            registry.load(io.StringIO('[{"uuid": "x"}]'), "json")
+        with pytest.raises(NotImplementedError):
+            registry.add(MANIFEST[0]["uuid"], MANIFEST[0]["secret_key"], "wm_2")
+
+        registry.load(io.StringIO(json.dumps(MANIFEST[:1])), "json")
+        with pytest.raises(ValueError):
+            registry.load(io.StringIO(json.dumps(MANIFEST[:1])), "json")
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+
+"""Tests for `pysesame3` package."""
+
+import io
+import json
+import threading
+
+import pytest
+
+from pysesame3.auth import WebAPIAuth
+from pysesame3.const import CHSesame2ShadowStatus
+from pysesame3.runner import ShardedRunner, shard_for, split_manifest
+
+from .utils import load_fixture
+
+ENTRIES = [
+    {
+        "uuid": "126D3D66-9222-4E5A-BCDE-0C6629D48D43",
+        "secret_key": "0b3e5f1665e143b59180c915fa4b06d9",
+        "model": "sesame_2",
+    },
+    {
+        "uuid": "7A1E4DA7-5A69-4E5A-9F5B-3E1B4A2F9C10",
+        "secret_key": "0b3e5f1665e143b59180c915fa4b06d9",
+        "model": "sesame_4",
+    },
+    {
+        "uuid": "C3B0F1E2-1D2C-4B5A-8F9E-0A1B2C3D4E5F",
+        "secret_key": "0b3e5f1665e143b59180c915fa4b06d9",
+        "model": "ssmbot_1",
+    },
+]
+
+
+def _offline_auth():
+    """An authenticator whose cloud answers without any network I/O."""
+    auth = WebAPIAuth(apikey="FAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKE")
+    auth.sesame_cloud.sendCmd = lambda *_: True
+    auth.sesame_cloud.getMechStatus = lambda _: load_fixture("lock_get_locked.json")
+    return auth
+
+
+def _hanging_auth():
+    auth = _offline_auth()
+    auth.sesame_cloud.getMechStatus = lambda _: threading.Event().wait(60)
+    return auth
+
+
+def _failing_auth():
+    raise ValueError("Invalid API Key")
+
+
+class TestSharding:
+    def test_shard_for(self):
+        uuid = ENTRIES[0]["uuid"]
+
+        assert shard_for(uuid, 4) == shard_for(uuid.lower(), 4)
+        assert all(0 <= shard_for(e["uuid"], 2) < 2 for e in ENTRIES)
+
+    def test_split_manifest(self):
+        split = split_manifest(ENTRIES, 2)
+
+        assert sorted(e["uuid"] for shard in split for e in shard) == sorted(
+            e["uuid"] for e in ENTRIES
+        )
+        for shard, entries in enumerate(split):
+            assert all(shard_for(e["uuid"], 2) == shard for e in entries)
+        with pytest.raises(ValueError):
+            split_manifest([{"model": "sesame_2"}], 2)
+
+
+class TestShardedRunner:
+    def test_ShardedRunner(self):
+        runner = ShardedRunner(
+            _offline_auth,
+            io.StringIO(json.dumps(ENTRIES)),
+            processes=2,
+            format="json",
+            subscribe=False,
+        )
+        assert sum(runner.getShardSizes()) == 3
+        events = []
+        received = threading.Event()
+
+        def _listener(event):
+            events.append(event)
+            received.set()
+
+        runner.addStatusListener(_listener)
+
+        with runner:
+            lock = runner.lock(ENTRIES[0]["uuid"], "test").result(30)
+            assert lock.success
+            assert lock.command == "lock"
+            assert lock.shard == runner.shardOf(ENTRIES[0]["uuid"])
+            assert lock.deviceId == ENTRIES[0]["uuid"]
+
+            click = runner.click(ENTRIES[0]["uuid"]).result(30)
+            assert not click.success
+            assert "NotImplementedError" in click.error
+            assert runner.click(ENTRIES[2]["uuid"]).result(30).success
+
+            unknown = runner.send("00000000-0000-0000-0000-000000000000", "lock")
+            assert "Unknown device" in unknown.result(30).error
+
+            fetch = runner.send(ENTRIES[1]["uuid"], "fetchMechStatus").result(30)
+            assert fetch.success
+            assert received.wait(30)
+
+        event = events[0]
+        assert event.deviceId == ENTRIES[1]["uuid"]
+        assert event.status.isInLockRange()
+        assert event.shadowStatus == CHSesame2ShadowStatus.LockedWm
+        with pytest.raises(RuntimeError):
+            runner.lock(ENTRIES[0]["uuid"])
+
+    def test_ShardedRunner_fails_commands_of_dead_workers(self):
+        runner = ShardedRunner(_hanging_auth, ENTRIES, processes=1, subscribe=False)
+
+        with runner:
+            pending = runner.send(ENTRIES[1]["uuid"], "fetchMechStatus")
+            runner._workers[0].terminate()
+
+            with pytest.raises(RuntimeError, match="exited with code"):
+                pending.result(30)
+            with pytest.raises(RuntimeError):
+                runner.lock(ENTRIES[0]["uuid"])
+
+    def test_ShardedRunner_raises_exception_on_failed_workers(self):
+        runner = ShardedRunner(_failing_auth, ENTRIES, processes=1)
+
+        with pytest.raises(RuntimeError) as err:
+            runner.start()
+        assert "Invalid API Key" in str(err.value)
+
+        with pytest.raises(ValueError):
+            ShardedRunner(_failing_auth, ENTRIES, processes=0)
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+
+"""Tests for `pysesame3` package."""
+
+import json
+import multiprocessing
+import threading
+from multiprocessing import shared_memory
+
+import pytest
+
+from pysesame3.auth import WebAPIAuth
+from pysesame3.chsesame2 import CHSesame2
+from pysesame3.const import CHSesame2ShadowStatus
+from pysesame3.fleetstate import FleetStateTable
+from pysesame3.helper import CHProductModel
+from pysesame3.sharedstate import SharedStatePublisher, SharedStateReader
+
+UUID = "126D3D66-9222-4E5A-BCDE-0C6629D48D43"
+BOT_UUID = "7A1E4DA7-5A69-4E5A-9F5B-3E1B4A2F9C10"
+SECRET_KEY = "0b3e5f1665e143b59180c915fa4b06d9"
+
+
+def _read_position(name, device_uuid):
+    with SharedStateReader(name) as reader:
+        return reader.get(device_uuid).position
+
+
+class TestSharedState:
+    def test_SharedStateReader_get(self):
+        table = FleetStateTable()
+        table.add(UUID, SECRET_KEY)
+        table.add(BOT_UUID, SECRET_KEY, CHProductModel.SesameBot1)
+
+        with SharedStatePublisher(table, capacity=4) as publisher:
+            with SharedStateReader(publisher.name) as reader:
+                # Nothing published yet
+                assert len(reader) == 0
+                assert UUID not in reader
+                with pytest.raises(KeyError):
+                    reader.get(UUID)
+
+                publisher.publishAll()
+                state = reader.get(UUID.lower())
+                assert state.deviceId == UUID
+                assert state.productModel == CHProductModel.SS2
+                assert state.updatedAt is None
+                assert state.shadowStatus is None
+
+                table.applyMechst(UUID, "60030080f3ff0002", updated_at=1000.0)
+                table.applyMechst(BOT_UUID, "5503000007000104")
+                # Not visible until published
+                assert reader.get(UUID).updatedAt is None
+                publisher.publish(UUID)
+                publisher.publish(BOT_UUID)
+
+                state = reader.get(UUID)
+                assert state.position == -13
+                assert state.isInLockRange and not state.isInUnlockRange
+                assert state.shadowStatus == CHSesame2ShadowStatus.LockedWm
+                assert state.updatedAt == 1000.0
+                assert state.batteryVoltage == pytest.approx(
+                    table.view(UUID).getBatteryVoltage()
+                )
+                assert state.sequence == 4
+                assert reader.get(BOT_UUID).position == 7
+                assert reader.devices() == [UUID, BOT_UUID]
+
+    def test_SharedStatePublisher_attach(self):
+        table = FleetStateTable()
+        device = CHSesame2(
+            WebAPIAuth(apikey="FAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKE"),
+            UUID,
+            SECRET_KEY,
+            initial_sync=False,
+        )
+
+        with SharedStatePublisher(table) as publisher:
+            publisher.attach(device)
+            shadow = {"state": {"reported": {"mechst": "5c030503e3020004"}}}
+            device._iot_shadow_callback("topic", json.dumps(shadow).encode("utf-8"))
+
+            ctx = multiprocessing.get_context("spawn")
+            with ctx.Pool(1) as pool:
+                assert pool.apply(_read_position, (publisher.name, UUID)) == 739
+
+            publisher.detach(device)
+
+    def test_SharedStateReader_never_returns_torn_records(self):
+        table = FleetStateTable()
+        table.add(UUID)
+        states = {-13: "60030080f3ff0002", 739: "5c030503e3020004"}
+
+        with SharedStatePublisher(table) as publisher:
+            publisher.publishAll()
+            reader = SharedStateReader(publisher.name)
+            stop = threading.Event()
+
+            def _write():
+                while not stop.is_set():
+                    for mechst in states.values():
+                        table.applyMechst(UUID, mechst)
+                        publisher.publish(UUID)
+
+            writer = threading.Thread(target=_write)
+            writer.start()
+            try:
+                for _ in range(2000):
+                    state = reader.get(UUID)
+                    if state.updatedAt is None:
+                        continue
+                    assert state.sequence % 2 == 0
+                    assert state.isInLockRange == (state.position == -13)
+            finally:
+                stop.set()
+                writer.join()
+                reader.close()
+
+    def test_SharedState_raises_exception_on_invalid_input(self):
+        table = FleetStateTable()
+        table.add(UUID)
+        table.add(BOT_UUID)
+
+        with pytest.raises(ValueError):
+            SharedStatePublisher(table, capacity=0)
+
+        with SharedStatePublisher(table, capacity=1) as publisher:
+            publisher.publish(UUID)
+            with pytest.raises(ValueError):
+                publisher.publishAll()
+
+        segment = shared_memory.SharedMemory(create=True, size=64)
+        try:
+            with pytest.raises(ValueError):
+                SharedStateReader(segment.name)
+        finally:
+            segment.close()
+            segment.unlink()
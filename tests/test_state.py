@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+
+"""Tests for `pysesame3` package."""
+
+import json
+import threading
+from unittest.mock import patch
+
+import pytest
+
+from pysesame3.auth import WebAPIAuth
+from pysesame3.chsesame2 import CHSesame2
+from pysesame3.cloud import SesameCloud
+from pysesame3.const import CHSesame2ShadowStatus, StateSource
+from pysesame3.helper import CHSesame2MechStatus
+from pysesame3.state import DeviceSnapshot, DeviceState
+
+from .utils import load_fixture
+
+
+class TestDeviceState:
+    def test_DeviceState_update(self):
+        clock = iter([1.0, 2.0])
+        state = DeviceState(clock=lambda: next(clock))
+        status = CHSesame2MechStatus("60030080f3ff0002")
+
+        assert state.snapshot == DeviceSnapshot()
+        previous, current = state.update(StateSource.HTTP, mechStatus=status)
+        assert previous.version == 0
+        assert current.version == state.version == 1
+        assert current.mechStatus is status
+        assert current.shadowStatus is None
+        assert current.source == StateSource.HTTP
+        assert current.observedAt == 1.0
+        assert current.receivedAt is not None
+
+        _, current = state.update(
+            StateSource.Command, shadowStatus=CHSesame2ShadowStatus.LockedWm
+        )
+        assert current.mechStatus is status
+        assert current.shadowStatus == CHSesame2ShadowStatus.LockedWm
+        assert current.version == 2
+
+        # Snapshots are immutable
+        with pytest.raises(AttributeError):
+            current.version = 3
+
+    def test_DeviceState_rejects_stale_writes(self):
+        state = DeviceState(clock=lambda: 10.0)
+        state.update(StateSource.IoT, shadowStatus=CHSesame2ShadowStatus.LockedWm)
+
+        assert (
+            state.update(
+                StateSource.HTTP,
+                shadowStatus=CHSesame2ShadowStatus.UnlockedWm,
+                observedAt=5.0,
+            )
+            is None
+        )
+        assert state.snapshot.shadowStatus == CHSesame2ShadowStatus.LockedWm
+        assert state.version == 1
+
+    def test_DeviceState_compareAndSwap(self):
+        state = DeviceState()
+        initial = state.snapshot
+        new = initial._replace(version=1)
+
+        assert state.compareAndSwap(initial, new)
+        assert not state.compareAndSwap(initial, initial._replace(version=2))
+        assert state.snapshot is new
+
+    def test_DeviceState_concurrent_writes(self):
+        state = DeviceState(clock=lambda: 0.0)
+        versions = []
+
+        def _write():
+            for _ in range(500):
+                versions.append(state.update(StateSource.IoT)[1].version)
+
+        threads = [threading.Thread(target=_write) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert state.version == 4000
+        assert sorted(versions) == list(range(1, 4001))
+
+
+class TestDeviceStateOfDevices:
+    @pytest.fixture
+    def device(self):
+        return CHSesame2(
+            WebAPIAuth(apikey="FAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKE"),
+            device_uuid="126d3d66-9222-4e5a-bcde-0c6629d48d43",
+            secret_key="0b3e5f1665e143b59180c915fa4b06d9",
+            initial_sync=False,
+        )
+
+    def test_slow_HTTP_response_does_not_overwrite_push(self, device):
+        topic = "$aws/things/sesame2/shadow/name/126D3D66-9222-4E5A-BCDE-0C6629D48D43/update/accepted"
+        unlocked = json.dumps(load_fixture("lock_shadow_unlocked.json")).encode()
+        listener = []
+        device.addStatusListener(lambda _, status: listener.append(status))
+
+        def _slow_response(_):
+            # The lock is unlocked and reported while the request is in flight
+            device._iot_shadow_callback(topic, unlocked)
+            return load_fixture("lock_get_locked.json")
+
+        with patch.object(SesameCloud, "getMechStatus", side_effect=_slow_response):
+            stale = device.fetchMechStatus()
+
+        assert stale.isInLockRange()
+        snapshot = device.snapshot
+        assert snapshot.source == StateSource.IoT
+        assert snapshot.shadowStatus == CHSesame2ShadowStatus.UnlockedWm
+        assert snapshot.mechStatus.isInUnlockRange()
+        assert device.lastMechStatus is snapshot.mechStatus
+        assert listener == [snapshot.mechStatus]
+        assert device.getDeviceShadowStatus() == CHSesame2ShadowStatus.UnlockedWm
+
+    def test_setDeviceShadowStatus_is_versioned(self, device):
+        device.setDeviceShadowStatus(CHSesame2ShadowStatus.LockedWm)
+
+        assert device.snapshot.source == StateSource.Command
+        assert device.state.version == 1
+        assert "shadowStatus=CHSesame2ShadowStatus.LockedWm" in str(device)
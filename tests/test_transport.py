@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+
+"""Tests for `pysesame3` package."""
+
+import asyncio
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import pytest
+import requests
+import requests_mock
+
+from pysesame3.auth import WebAPIAuth
+from pysesame3.chsesame2 import CHSesame2
+from pysesame3.const import CHSesame2CMD
+from pysesame3.transport import HTTP2Transport
+
+from .utils import load_fixture
+
+UUID = "126D3D66-9222-4E5A-BCDE-0C6629D48D43"
+URL = "https://app.candyhouse.co/api/sesame2/{}".format(UUID)
+
+
+def _locked(request):
+    return httpx.Response(200, json=load_fixture("lock_get_locked.json"))
+
+
+def _mock(transport, handler):
+    transport.clients = []
+
+    def _build(cls):
+        client = cls(transport=httpx.MockTransport(handler))
+        transport.clients.append(client)
+        return client
+
+    transport._buildClient = lambda: _build(httpx.Client)
+    transport._buildAsyncClient = lambda: _build(httpx.AsyncClient)
+    return transport
+
+
+@pytest.fixture()
+def device():
+    auth = WebAPIAuth(apikey="FAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKEFAKE")
+    return CHSesame2(auth, UUID, "0b3e5f1665e143b59180c915fa4b06d9", initial_sync=False)
+
+
+class TestHTTP2Transport:
+    def test_HTTP2Transport_send(self, device):
+        requested = []
+
+        def _handler(request):
+            requested.append(request)
+            if request.method == "POST":
+                return httpx.Response(200)
+            return _locked(request)
+
+        transport = _mock(HTTP2Transport(), _handler)
+        cloud = device.authenticator.sesame_cloud
+        cloud.setTransport(transport)
+        responses = []
+        cloud.addResponseListener(responses.append)
+
+        assert cloud.transport is transport
+        assert device.fetchMechStatus().isInLockRange()
+        assert cloud.sendCmd(device, CHSesame2CMD.UNLOCK, "Unit Test")
+
+        assert requested[0].headers["x-api-key"] == "FAKE" * 10
+        payload = json.loads(requested[1].content)
+        assert payload["cmd"] == int(CHSesame2CMD.UNLOCK)
+        assert requested[1].headers["content-type"] == "application/json"
+        assert all(isinstance(r, requests.Response) for r in responses)
+        assert transport.versions == {"HTTP/1.1": 2}
+        assert "fallbacks=0" in str(transport)
+
+        transport.close()
+
+    def test_HTTP2Transport_send_raises_exception_on_errors(self, device):
+        def _handler(request):
+            if request.url.path.endswith("/history"):
+                raise httpx.ConnectTimeout("timeout")
+            return httpx.Response(404)
+
+        cloud = device.authenticator.sesame_cloud
+        cloud.setTransport(_mock(HTTP2Transport(), _handler))
+
+        with pytest.raises(RuntimeError):
+            device.fetchMechStatus()
+        assert not cloud.sendCmd(device, CHSesame2CMD.LOCK)
+        with pytest.raises(requests.exceptions.Timeout):
+            cloud.getHistoryEntries(device)
+
+    def test_HTTP2Transport_sendAsync(self, device):
+        def _handler(request):
+            if request.method == "POST":
+                return httpx.Response(200)
+            return _locked(request)
+
+        transport = _mock(HTTP2Transport(), _handler)
+        cloud = device.authenticator.sesame_cloud
+        cloud.setTransport(transport)
+
+        async def _run():
+            async with transport:
+                return await asyncio.gather(
+                    *[cloud.getMechStatusAsync(device) for _ in range(5)],
+                    cloud.sendCmdAsync(device, CHSesame2CMD.LOCK),
+                )
+
+        results = asyncio.run(_run())
+
+        assert results[:5] == [load_fixture("lock_get_locked.json")] * 5
+        assert results[5] is True
+        assert transport.versions == {"HTTP/1.1": 6}
+
+    def test_HTTP2Transport_falls_back_to_http1(self, device):
+        calls = []
+
+        def _handler(request):
+            calls.append(request.method)
+            if len(calls) == 1:
+                raise httpx.RemoteProtocolError("GOAWAY")
+            return _locked(request)
+
+        transport = _mock(HTTP2Transport(), _handler)
+        cloud = device.authenticator.sesame_cloud
+        cloud.setTransport(transport)
+
+        assert transport.http2
+        # Idempotent requests are sent again
+        assert device.fetchMechStatus().isInLockRange()
+        assert calls == ["GET", "GET"]
+        assert not transport.http2
+        assert transport.fallbacks == 1
+        # The client of the failed connection is closed
+        assert [c.is_closed for c in transport.clients] == [True, False]
+
+    def test_HTTP2Transport_sendAsync_falls_back_to_http1(self, device):
+        calls = []
+
+        def _handler(request):
+            calls.append(request.method)
+            if len(calls) == 1:
+                raise httpx.RemoteProtocolError("GOAWAY")
+            return _locked(request)
+
+        transport = _mock(HTTP2Transport(), _handler)
+        cloud = device.authenticator.sesame_cloud
+        cloud.setTransport(transport)
+
+        async def _run():
+            async with transport:
+                return await cloud.getMechStatusAsync(device)
+
+        assert asyncio.run(_run()) == load_fixture("lock_get_locked.json")
+        assert transport.fallbacks == 1
+        # `aclose` also waits for the client of the failed connection
+        assert [c.is_closed for c in transport.clients] == [True, True]
+
+    def test_HTTP2Transport_keeps_replaced_clients_open_for_requests_in_flight(
+        self, device
+    ):
+        sent = threading.Event()
+        release = threading.Event()
+
+        def _handler(request):
+            if request.method == "POST":
+                sent.set()
+                release.wait(5)
+                return httpx.Response(200)
+            raise httpx.RemoteProtocolError("GOAWAY")
+
+        transport = _mock(HTTP2Transport(), _handler)
+        cloud = device.authenticator.sesame_cloud
+        cloud.setTransport(transport)
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            command = executor.submit(cloud.sendCmd, device, CHSesame2CMD.LOCK)
+            assert sent.wait(5)
+            with pytest.raises(requests.exceptions.ConnectionError):
+                cloud.getHistoryEntries(device)
+            assert transport.fallbacks == 1
+            # The command in flight is not aborted
+            assert not transport.clients[0].is_closed
+            release.set()
+            assert command.result()
+
+        assert transport.clients[0].is_closed
+
+    def test_HTTP2Transport_does_not_resend_commands(self, device):
+        calls = []
+
+        def _handler(request):
+            calls.append(request.method)
+            raise httpx.RemoteProtocolError("GOAWAY")
+
+        transport = _mock(HTTP2Transport(), _handler)
+        device.authenticator.sesame_cloud.setTransport(transport)
+
+        with pytest.raises(requests.exceptions.ConnectionError):
+            device.authenticator.sesame_cloud.sendCmd(device, CHSesame2CMD.LOCK)
+        assert calls == ["POST"]
+        assert transport.fallbacks == 1
+
+    def test_SesameCloud_requestAPIAsync_without_transport(self, device):
+        cloud = device.authenticator.sesame_cloud
+
+        with requests_mock.Mocker() as mock:
+            mock.get(URL, json=load_fixture("lock_get_locked.json"))
+            result = asyncio.run(cloud.getMechStatusAsync(device))
+
+        assert result == load_fixture("lock_get_locked.json")
+
+    def test_HTTP2Transport_raises_exception_on_invalid_input(self):
+        with pytest.raises(ValueError):
+            HTTP2Transport(http2=False, prior_knowledge=True)